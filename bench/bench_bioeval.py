@@ -0,0 +1,190 @@
+"""Benchmarks of the bioeval evaluation paths on synthetic corpora.
+
+Every benchmark is timed (best of `--repeat` runs) and profiled for peak
+memory with `tracemalloc` in a separate run. The results are written as JSON
+so that runs of different versions can be compared.
+
+Usage:
+
+    python bench/bench_bioeval.py --sizes 1000 100000 --output bench.json
+"""
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from bioeval import evaluate, evaluate_df, evaluate_spans, get_ncor
+from bioeval.spans import TagSet
+from bioeval.utils import df2chunkset, mock_corpus
+
+__author__ = 'Aleksandar Savkov'
+
+SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+
+# chunk length distributions: name -> (sampler(rng, n), mean length)
+LENGTHS = {
+    'short': (lambda rng, n: rng.geometric(0.6, n), 1 / 0.6),
+    'long': (lambda rng, n: rng.geometric(0.2, n), 1 / 0.2),
+    'uniform': (lambda rng, n: rng.integers(1, 9, n), 4.5),
+}
+
+LABELS = [4, 32]
+
+# fraction of correct chunks
+CORRECT = .8
+# probability of an outside token after a chunk
+P_OUTSIDE = .3
+
+# benchmarks of token tuple paths are skipped above this many tokens
+LEGACY_MAX = 10 ** 5
+
+
+def synthetic_tags(n, lengths='short', n_labels=4, seed=0):
+    """Generates aligned gold and guess tag arrays of about `n` tokens."""
+    sampler, mean = LENGTHS[lengths]
+    n_chunks = max(1, int(n / (mean + P_OUTSIDE)))
+    return mock_corpus(n_chunks, int(CORRECT * n_chunks), n_labels,
+                       chunk_len=sampler, p_outside=P_OUTSIDE, seed=seed,
+                       fmt='tags')
+
+
+def native_chunks(tags):
+    """Converts a tag array into the native set of token tuple chunks."""
+    tagset = TagSet()
+    ids = tagset.encode(tags)
+    starts = np.flatnonzero(tagset.starts[ids]).tolist() + [len(ids)]
+    tags = tags.tolist()
+    return {
+        tuple((i, tags[i]) for i in range(s, e))
+        for s, e in zip(starts[:-1], starts[1:])
+    }
+
+
+def _bench_evaluate(gold, guess):
+    go, ge = native_chunks(gold), native_chunks(guess)
+    return lambda: evaluate(go, ge, chunk_col=1)
+
+
+def _bench_get_ncor(gold, guess):
+    go, ge = native_chunks(gold), native_chunks(guess)
+    return lambda: get_ncor(go, ge)
+
+
+def _bench_df2chunkset(gold, guess):
+    df = pd.DataFrame({'chunktag': gold, 'guesstag': guess})
+    return lambda: df2chunkset(df)
+
+
+def _bench_evaluate_df(gold, guess):
+    df = pd.DataFrame({'chunktag': gold, 'guesstag': guess})
+    return lambda: evaluate_df(df)
+
+
+def _bench_evaluate_spans(gold, guess):
+    tagset = TagSet()
+    go = tagset.spans(tagset.encode(gold))
+    ge = tagset.spans(tagset.encode(guess))
+    return lambda: evaluate_spans(go, ge)
+
+
+# name -> (setup, is token tuple path)
+BENCHMARKS = {
+    'evaluate': (_bench_evaluate, True),
+    'get_ncor': (_bench_get_ncor, True),
+    'df2chunkset': (_bench_df2chunkset, True),
+    'evaluate_df': (_bench_evaluate_df, False),
+    'evaluate_spans': (_bench_evaluate_spans, False),
+}
+
+
+def measure(func, repeat):
+    """Best wall time of `repeat` runs and peak traced memory of one run."""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def run(sizes, benchmarks, lengths, labels, repeat, legacy_max):
+    results = []
+    for n in sizes:
+        for length in lengths:
+            for n_labels in labels:
+                gold, guess = synthetic_tags(n, length, n_labels)
+                for name in benchmarks:
+                    setup, legacy = BENCHMARKS[name]
+                    if legacy and n > legacy_max:
+                        continue
+                    seconds, peak = measure(setup(gold, guess), repeat)
+                    res = {
+                        'benchmark': name,
+                        'tokens': len(gold),
+                        'chunk_lengths': length,
+                        'labels': n_labels,
+                        'seconds': seconds,
+                        'tokens_per_second': len(gold) / seconds,
+                        'peak_bytes': peak,
+                    }
+                    results.append(res)
+                    print('%(benchmark)15s %(tokens)10d %(chunk_lengths)8s '
+                          '%(labels)4d %(seconds)10.4fs %(peak_bytes)12d B'
+                          % res, file=sys.stderr)
+    return results
+
+
+def _commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'describe', '--always', '--dirty'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--benchmarks', nargs='+', default=list(BENCHMARKS),
+                        choices=list(BENCHMARKS))
+    parser.add_argument('--lengths', nargs='+', default=list(LENGTHS),
+                        choices=list(LENGTHS))
+    parser.add_argument('--labels', type=int, nargs='+', default=LABELS)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--legacy-max', type=int, default=LEGACY_MAX)
+    parser.add_argument('--output', default='bench_results.json')
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.benchmarks, args.lengths, args.labels,
+                  args.repeat, args.legacy_max)
+    report = {
+        'meta': {
+            'commit': _commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as fh:
+        json.dump(report, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,34 @@
-from bioeval.core import evaluate, evaluate_df, get_ncor  # noqa: F401
+import sys
+import types
+
+from bioeval.core import evaluate, evaluate_df, evaluate_spans  # noqa: F401
+from bioeval.core import count_df, get_ncor, get_ncor_spans  # noqa: F401
+from bioeval.core import count_groups  # noqa: F401
+from bioeval.conll import count_conll, evaluate_conll  # noqa: F401
+from bioeval.online import ChunkEvaluator  # noqa: F401
+from bioeval.multi import evaluate_systems  # noqa: F401
+
+# package exports whose modules import numpy, loaded on first access
+_LAZY = {
+    'analyze_df': 'bioeval.analysis',
+    'analyze_tags': 'bioeval.analysis',
+    'RunCounts': 'bioeval.runs'
+}
+
+
+class _Package(types.ModuleType):
+    # a module __getattr__ needs Python 3.7, a module class works from 3.5
+
+    def __getattr__(self, name):
+        if name not in _LAZY:
+            raise AttributeError("module '%s' has no attribute '%s'" %
+                                 (self.__name__, name))
+        value = getattr(__import__(_LAZY[name], fromlist=[name]), name)
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(super(_Package, self).__dir__()) | set(_LAZY))
+
+
+sys.modules[__name__].__class__ = _Package
@@ -0,0 +1,238 @@
+import numpy as np
+
+from .spans import OUTSIDE_TAG, aligned_matches, encode_tags
+
+__author__ = 'Aleksandar Savkov'
+
+# error classes of a chunk
+CORRECT, TYPE, BOUNDARY, TYPE_BOUNDARY, MISSED, SPURIOUS = range(6)
+ERROR_NAMES = ('correct', 'type', 'boundary', 'type+boundary', 'missed',
+               'spurious')
+
+# matching mode -> span columns (start, end, type) that must be equal in a
+# pair of overlapping chunks
+MATCH_MODES = {
+    'exact': (0, 1, 2),
+    'boundary': (0, 1),
+    'type': (2,),
+    'partial': (),
+    'left': (0, 2),
+    'right': (1, 2),
+}
+
+
+def _as_spans(spans):
+    return np.asarray(spans, dtype=np.int64).reshape(-1, 3)
+
+
+def overlaps(gold_spans, guess_spans):
+    """Finds all pairs of overlapping gold and guess spans. The guess spans
+    are sorted once and the overlapping range of every gold span is found by
+    binary search, so the cost is O((n + m) log m) plus the number of pairs.
+    The spans of each side must not overlap each other, which holds for
+    spans extracted from a tag sequence.
+
+    :param gold_spans: gold span array
+    :type gold_spans: np.ndarray
+    :param guess_spans: guess span array
+    :type guess_spans: np.ndarray
+    :return: gold span indices and guess span indices of the pairs
+    :rtype: tuple
+    """
+    gold, guess = _as_spans(gold_spans), _as_spans(guess_spans)
+    order = np.argsort(guess[:, 0], kind='stable')
+    lo = np.searchsorted(guess[order, 1], gold[:, 0], 'right')
+    hi = np.searchsorted(guess[order, 0], gold[:, 1], 'left')
+    n = np.maximum(hi - lo, 0)
+    gold_idx = np.repeat(np.arange(len(gold)), n)
+    first = np.repeat(lo - (np.cumsum(n) - n), n)
+    guess_idx = order[first + np.arange(len(gold_idx))]
+    return gold_idx, guess_idx
+
+
+def relaxed_matches(gold_spans, guess_spans, mode='partial'):
+    """Marks the gold and guess chunks that have a matching chunk on the
+    other side. Only overlapping chunks can match, and in addition
+
+    * `exact`: the boundaries and the type are equal
+    * `boundary`: the boundaries are equal, the type may differ
+    * `type`: the type is equal
+    * `partial`: any overlap
+    * `left`: the start and the type are equal
+    * `right`: the end and the type are equal
+
+    :param gold_spans: gold span array
+    :type gold_spans: np.ndarray
+    :param guess_spans: guess span array
+    :type guess_spans: np.ndarray
+    :param mode: matching mode
+    :type mode: str
+    :return: boolean masks over the gold and the guess spans
+    :rtype: tuple
+    """
+    if mode not in MATCH_MODES:
+        raise ValueError('Unknown matching mode %s.' % mode)
+    gold, guess = _as_spans(gold_spans), _as_spans(guess_spans)
+    gi, gj = overlaps(gold, guess)
+    cols = list(MATCH_MODES[mode])
+    ok = np.all(gold[gi][:, cols] == guess[gj][:, cols], axis=1)
+    gold_matched = np.zeros(len(gold), dtype=bool)
+    gold_matched[gi[ok]] = True
+    guess_matched = np.zeros(len(guess), dtype=bool)
+    guess_matched[gj[ok]] = True
+    return gold_matched, guess_matched
+
+
+def _pair_errors(gold, guess):
+    same_bounds = (gold[:, 0] == guess[:, 0]) & (gold[:, 1] == guess[:, 1])
+    same_type = gold[:, 2] == guess[:, 2]
+    errors = np.full(len(gold), TYPE_BOUNDARY, dtype=np.int8)
+    errors[same_type] = BOUNDARY
+    errors[same_bounds] = TYPE
+    errors[same_bounds & same_type] = CORRECT
+    return errors
+
+
+class ChunkErrors(object):
+    """Classification of the gold and guess chunks of an evaluation.
+
+    Every gold chunk is correct, a type error (same boundaries, other type),
+    a boundary error (overlapping chunk of the same type), a type and
+    boundary error (overlapping chunk of another type) or missed (no
+    overlapping guess chunk). When a chunk overlaps several chunks of the
+    other side the least severe error is used. Guess chunks are classified
+    the same way, with spurious in place of missed.
+
+    The confusion matrix counts every gold chunk once under its own type and
+    the type of the guess chunk it overlaps most. The last row and column
+    stand for no chunk, i.e. they count spurious and missed chunks.
+
+    :param gold_spans: gold span array
+    :type gold_spans: np.ndarray
+    :param guess_spans: guess span array
+    :type guess_spans: np.ndarray
+    :param types: chunk type names indexed by type id
+    :type types: list
+    :param correct: mask of the gold chunks that count as correct, e.g. from
+        `aligned_matches`; chunks with equal spans outside the mask are
+        boundary errors. By default equal spans are correct.
+    :type correct: np.ndarray
+    """
+
+    __slots__ = ('types', 'gold_spans', 'guess_spans', 'gold_errors',
+                 'guess_errors', 'confusion')
+
+    def __init__(self, gold_spans, guess_spans, types=None, correct=None):
+        gold, guess = _as_spans(gold_spans), _as_spans(guess_spans)
+        if types is None:
+            n = int(max(gold[:, 2].max(initial=-1),
+                        guess[:, 2].max(initial=-1))) + 1
+            types = [str(x) for x in range(n)]
+        self.types = list(types)
+        self.gold_spans = gold
+        self.guess_spans = guess
+
+        gi, gj = overlaps(gold, guess)
+        errors = _pair_errors(gold[gi], guess[gj])
+        if correct is not None:
+            # equal spans with different tags inside, e.g. I- for E- tags
+            errors[(errors == CORRECT) & ~np.asarray(correct)[gi]] = BOUNDARY
+        self.gold_errors = np.full(len(gold), MISSED, dtype=np.int8)
+        np.minimum.at(self.gold_errors, gi, errors)
+        self.guess_errors = np.full(len(guess), SPURIOUS, dtype=np.int8)
+        np.minimum.at(self.guess_errors, gj, errors)
+
+        # the guess chunk with the largest overlap of every gold chunk
+        size = np.minimum(gold[gi, 1], guess[gj, 1]) - \
+            np.maximum(gold[gi, 0], guess[gj, 0])
+        order = np.lexsort((-size, gi))
+        best = np.ones(len(order), dtype=bool)
+        best[1:] = gi[order][1:] != gi[order][:-1]
+        gi, gj = gi[order][best], gj[order][best]
+
+        none = len(self.types)
+        missed = self.gold_errors == MISSED
+        spurious = self.guess_errors == SPURIOUS
+        rows = np.concatenate((gold[gi, 2], gold[missed, 2],
+                               np.full(spurious.sum(), none)))
+        cols = np.concatenate((guess[gj, 2], np.full(missed.sum(), none),
+                               guess[spurious, 2]))
+        self.confusion = np.bincount(
+            rows * (none + 1) + cols, minlength=(none + 1) ** 2
+        ).reshape(none + 1, none + 1)
+
+    @property
+    def labels(self):
+        """Row and column labels of the confusion matrix, with `O` for no
+        chunk.
+        :rtype: list
+        """
+        return self.types + [OUTSIDE_TAG]
+
+    def counts(self):
+        """Numbers of gold chunks by error class and of spurious guess
+        chunks.
+
+        :return: counts by error class name
+        :rtype: dict
+        """
+        gold = np.bincount(self.gold_errors, minlength=len(ERROR_NAMES))
+        guess = np.bincount(self.guess_errors, minlength=len(ERROR_NAMES))
+        res = dict(zip(ERROR_NAMES, gold.tolist()))
+        res['spurious'] = int(guess[SPURIOUS])
+        return res
+
+
+def analyze_spans(gold_spans, guess_spans, types=None):
+    """Classifies the errors of guess chunks against gold chunks given as
+    span arrays of `(start, end, type)` integer rows.
+
+    :param gold_spans: gold span array
+    :type gold_spans: np.ndarray
+    :param guess_spans: guess span array
+    :type guess_spans: np.ndarray
+    :param types: chunk type names indexed by type id
+    :type types: list
+    :return: error classes and confusion matrix
+    :rtype: ChunkErrors
+    """
+    return ChunkErrors(gold_spans, guess_spans, types)
+
+
+def analyze_tags(gold_tags, guess_tags):
+    """Classifies the errors of aligned gold and guess tag sequences.
+
+    :param gold_tags: gold tag sequence
+    :type gold_tags: list or np.ndarray
+    :param guess_tags: guess tag sequence
+    :type guess_tags: list or np.ndarray
+    :return: error classes and confusion matrix
+    :rtype: ChunkErrors
+    """
+    gold, guess, tagset = encode_tags(gold_tags, guess_tags)
+    gold_spans, guess_spans = tagset.spans(gold), tagset.spans(guess)
+    # correct like in `count_tags`: same tags over the whole chunk
+    correct = aligned_matches(gold, guess, gold_spans, tagset)
+    # keep only the types of actual chunks, e.g. not the empty type of `O`
+    used = np.unique(np.concatenate((gold_spans[:, 2], guess_spans[:, 2])))
+    lut = np.zeros(len(tagset.types), dtype=np.int64)
+    lut[used] = np.arange(len(used))
+    gold_spans[:, 2] = lut[gold_spans[:, 2]]
+    guess_spans[:, 2] = lut[guess_spans[:, 2]]
+    return ChunkErrors(gold_spans, guess_spans,
+                       [tagset.types[i] for i in used], correct)
+
+
+def analyze_df(df, chunkcol='chunktag', guesscol='guesstag'):
+    """Classifies the chunk errors of a `pandas` `DataFrame`.
+
+    :param df: dataframe
+    :type df: pd.DataFrame
+    :param chunkcol: the column name of the gold chunk tags
+    :type chunkcol: str
+    :param guesscol: the column name of the guess chunk tags
+    :type guesscol: str
+    :return: error classes and confusion matrix
+    :rtype: ChunkErrors
+    """
+    return analyze_tags(df[chunkcol].values, df[guesscol].values)
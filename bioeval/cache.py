@@ -0,0 +1,234 @@
+"""On-disk cache of gold chunk indexes.
+
+Entries are addressed by a hash of the gold tag column and the tagging
+scheme, so the same gold data always maps to the same entry, whichever file
+or dataframe it came from. Every entry is a directory with the gold tag ids
+and the gold span array as `.npy` files, opened as read-only memory maps,
+and the tag vocabulary as JSON. A warm evaluation hashes the gold column,
+maps the stored arrays and chunks only the guess side.
+
+The total size of the cache is capped. When a new entry takes it over the
+cap, the least recently used entries are removed. Entries are written to a
+temporary directory and renamed into place, so parallel workers can share a
+cache directory.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from .multi import GoldIndex
+
+__author__ = 'Aleksandar Savkov'
+
+# bumped whenever the layout of an entry changes
+CACHE_VERSION = 1
+# default size cap of a cache directory in bytes
+MAX_BYTES = 2 ** 30
+
+IDS_FILE = 'ids.npy'
+SPANS_FILE = 'spans.npy'
+TAGS_FILE = 'tags.json'
+
+
+def _scheme_key(scheme):
+    if scheme is None:
+        return 'none'
+    from .schemes import get_scheme
+
+    scheme = get_scheme(scheme)
+    return '%s:%d' % (scheme.name, scheme.strict)
+
+
+def gold_key(gold_tags, scheme=None):
+    """Content hash of a gold tag sequence and a tagging scheme. The tags
+    are hashed as one fixed-width unicode buffer, without a loop over the
+    tokens.
+
+    :param gold_tags: gold tag sequence
+    :type gold_tags: list or np.ndarray
+    :param scheme: tagging scheme name or object, or `None`
+    :type scheme: str or Scheme
+    :return: hexadecimal key
+    :rtype: str
+    """
+    tags = np.ascontiguousarray(np.asarray(gold_tags).astype(str))
+    h = hashlib.sha1()
+    h.update(('bioeval:%d:%s:%s:%d:' % (CACHE_VERSION, _scheme_key(scheme),
+                                        tags.dtype.str,
+                                        len(tags))).encode('utf-8'))
+    h.update(tags.view(np.uint8))
+    return h.hexdigest()
+
+
+def _entry_size(path):
+    return sum(os.path.getsize(os.path.join(path, x))
+               for x in os.listdir(path))
+
+
+class GoldCache(object):
+    """Directory of cached gold chunk indexes with a size cap and least
+    recently used eviction.
+
+    :param path: cache directory, created if missing
+    :type path: str
+    :param max_bytes: size cap of the cache in bytes
+    :type max_bytes: int
+    """
+
+    def __init__(self, path, max_bytes=MAX_BYTES):
+        self.path = os.path.expanduser(path)
+        self.max_bytes = max_bytes
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    def _entry(self, key):
+        return os.path.join(self.path, key)
+
+    def keys(self):
+        """Keys of the cached entries, least recently used first.
+
+        :return: entry keys
+        :rtype: list
+        """
+        entries = []
+        for key in os.listdir(self.path):
+            tags = os.path.join(self._entry(key), TAGS_FILE)
+            if key.startswith('.') or not os.path.exists(tags):
+                continue
+            entries.append((os.path.getmtime(tags), key))
+        return [key for _, key in sorted(entries)]
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __contains__(self, key):
+        return os.path.exists(os.path.join(self._entry(key), TAGS_FILE))
+
+    def size(self):
+        """Total size of the cached entries in bytes.
+
+        :return: size in bytes
+        :rtype: int
+        """
+        return sum(_entry_size(self._entry(key)) for key in self.keys())
+
+    def index(self, gold_tags, scheme=None):
+        """Returns the gold index of a gold tag sequence, from the cache if
+        it holds an entry for the tags and scheme, otherwise built and
+        stored.
+
+        :param gold_tags: gold tag sequence
+        :type gold_tags: list or np.ndarray
+        :param scheme: tagging scheme name or object, or `None`
+        :type scheme: str or Scheme
+        :return: gold index
+        :rtype: GoldIndex
+        """
+        key = gold_key(gold_tags, scheme)
+        index = self.load(key, scheme)
+        if index is None:
+            index = GoldIndex(gold_tags, scheme)
+            self.store(key, index)
+        return index
+
+    def load(self, key, scheme=None):
+        """Opens a cached entry and marks it as recently used.
+
+        :param key: entry key
+        :type key: str
+        :param scheme: tagging scheme of the entry
+        :type scheme: str or Scheme
+        :return: gold index or `None` if there is no entry
+        :rtype: GoldIndex
+        """
+        path = self._entry(key)
+        try:
+            with open(os.path.join(path, TAGS_FILE), 'r') as fh:
+                tags = json.load(fh)
+            ids = np.load(os.path.join(path, IDS_FILE), mmap_mode='r')
+            spans = np.load(os.path.join(path, SPANS_FILE), mmap_mode='r')
+        except (IOError, OSError, ValueError):
+            # missing, evicted meanwhile or half-written
+            return None
+        self._touch(key)
+        return GoldIndex.from_arrays(tags, ids, spans, scheme)
+
+    def _touch(self, key):
+        now = time.time()
+        try:
+            os.utime(os.path.join(self._entry(key), TAGS_FILE), (now, now))
+        except OSError:
+            pass
+
+    def store(self, key, index):
+        """Writes a gold index to the cache and evicts the least recently
+        used entries if the cache grows over its size cap.
+
+        :param key: entry key
+        :type key: str
+        :param index: gold index
+        :type index: GoldIndex
+        """
+        tmp = tempfile.mkdtemp(prefix='.', dir=self.path)
+        try:
+            ids = np.asarray(index.ids)
+            np.save(os.path.join(tmp, IDS_FILE),
+                    ids.astype(np.min_scalar_type(len(index.tagset))))
+            np.save(os.path.join(tmp, SPANS_FILE), np.asarray(index.spans))
+            with open(os.path.join(tmp, TAGS_FILE), 'w') as fh:
+                json.dump(index.tagset.tags, fh)
+            os.rename(tmp, self._entry(key))
+        except OSError:
+            # another process stored the same entry first
+            shutil.rmtree(tmp, ignore_errors=True)
+            if key not in self:
+                raise
+        self._touch(key)
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        """Removes the least recently used entries until the cache fits its
+        size cap.
+
+        :param keep: key of an entry that is never removed
+        :type keep: str
+        :return: keys of the removed entries
+        :rtype: list
+        """
+        keys = self.keys()
+        sizes = {key: _entry_size(self._entry(key)) for key in keys}
+        total = sum(sizes.values())
+        removed = []
+        for key in keys:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self._entry(key), ignore_errors=True)
+            total -= sizes[key]
+            removed.append(key)
+        return removed
+
+    def clear(self):
+        """Removes all entries.
+        """
+        for key in self.keys():
+            shutil.rmtree(self._entry(key), ignore_errors=True)
+
+
+def get_cache(cache):
+    """Returns a `GoldCache` for a directory path, or the argument itself.
+
+    :param cache: cache directory or object
+    :type cache: str or GoldCache
+    :return: gold cache
+    :rtype: GoldCache
+    """
+    if isinstance(cache, GoldCache):
+        return cache
+    return GoldCache(cache)
@@ -0,0 +1,185 @@
+"""Command line evaluator of CoNLL-formatted files. Every file is read line
+by line and scored on its own; many files are spread over a pool of worker
+processes. The results are written as JSON or CSV.
+"""
+import argparse
+import csv
+import glob
+import json
+import sys
+
+__author__ = 'Aleksandar Savkov'
+
+FIELDS = ['file', 'label', 'correct', 'gold', 'guess', 'precision', 'recall',
+          'fscore']
+
+# file name of the rows pooled over all input files
+ALL_FILES = '*'
+
+
+def expand_paths(patterns):
+    """Expands glob patterns into a list of file paths. Patterns without
+    matches are kept as they are, so that missing files are reported.
+
+    :param patterns: file paths or glob patterns
+    :type patterns: list
+    :return: file paths
+    :rtype: list
+    """
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        paths.extend(matches or [pattern])
+    return paths
+
+
+def count_file(fp, chunkcol=-2, guesscol=-1, delimiter=None,
+               boundary='-X-', scheme=None):
+    """Counts the chunks of a CoNLL-formatted file with the streaming reader.
+
+    :param fp: file path
+    :type fp: str
+    :return: chunk counts
+    :rtype: ChunkStream
+    """
+    from .conll import count_conll
+
+    with open(fp, 'r') as fh:
+        return count_conll(fh, chunkcol, guesscol, delimiter, boundary,
+                           scheme)
+
+
+def _rows(name, counts, by_type, do_round):
+    fields = ('label', 'correct', 'gold', 'guess', 'precision', 'recall',
+              'fscore')
+    rows = []
+    for row in counts.rows(do_round, by_type):
+        itm = {'file': name}
+        itm.update(zip(fields, row))
+        rows.append(itm)
+    return rows
+
+
+def evaluate_files(paths, chunkcol=-2, guesscol=-1, delimiter=None,
+                   boundary='-X-', scheme=None, n_jobs=1, by_type=False,
+                   do_round=True):
+    """Evaluates many CoNLL-formatted files, in a pool of worker processes
+    if `n_jobs` is not 1.
+
+    :param paths: file paths
+    :type paths: list
+    :param n_jobs: number of worker processes, all CPUs if `None`
+    :type n_jobs: int
+    :param by_type: add a row for every chunk type
+    :type by_type: bool
+    :param do_round: round the results to the second digit
+    :type do_round: bool
+    :return: one result row per file (and chunk type), plus the rows pooled
+        over all files when there is more than one
+    :rtype: list
+    """
+    args = [[x] * len(paths) for x in (chunkcol, guesscol, delimiter,
+                                       boundary, scheme)]
+    if n_jobs == 1 or len(paths) < 2:
+        counts = list(map(count_file, paths, *args))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=n_jobs) as ex:
+            counts = list(ex.map(count_file, paths, *args))
+    rows = []
+    for fp, c in zip(paths, counts):
+        rows.extend(_rows(fp, c, by_type, do_round))
+    if len(paths) > 1:
+        from .counts import ChunkCounts
+
+        total = ChunkCounts()
+        for c in counts:
+            total.update(c)
+        rows.extend(_rows(ALL_FILES, total, by_type, do_round))
+    return rows
+
+
+def write_rows(rows, fh, fmt='json'):
+    """Writes result rows as JSON or CSV.
+
+    :param rows: result rows
+    :type rows: list
+    :param fh: output file object
+    :type fh: file
+    :param fmt: `json` or `csv`
+    :type fmt: str
+    """
+    if fmt == 'json':
+        json.dump(rows, fh, indent=2)
+        fh.write('\n')
+    else:
+        writer = csv.DictWriter(fh, FIELDS, lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    """Console entry point.
+    """
+    parser = argparse.ArgumentParser(
+        prog='bioeval',
+        description='evaluate chunk annotation in CoNLL-formatted files'
+    )
+    parser.add_argument('files', nargs='+',
+                        help='input files or glob patterns')
+    parser.add_argument('-g', '--gold-col', type=int, default=-2,
+                        help='gold tag column index (default: -2)')
+    parser.add_argument('-p', '--guess-col', type=int, default=-1,
+                        help='guess tag column index (default: -1)')
+    parser.add_argument('-d', '--delimiter', default=None,
+                        help='column delimiter (default: any whitespace)')
+    parser.add_argument('-b', '--boundary', default='-X-',
+                        help='sentence boundary marker (default: -X-)')
+    parser.add_argument('-s', '--scheme', default=None,
+                        choices=['bio', 'iob1', 'bioes', 'bilou'],
+                        help='tagging scheme (default: B/O/S tags start '
+                             'chunks)')
+    parser.add_argument('--strict', action='store_true',
+                        help='fail on ill-formed tag sequences')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes, 0 for all CPUs')
+    parser.add_argument('-t', '--by-type', action='store_true',
+                        help='add results by chunk type')
+    parser.add_argument('-f', '--format', default='json',
+                        choices=['json', 'csv'], help='output format')
+    parser.add_argument('-o', '--output', default=None,
+                        help='output file (default: standard output)')
+    parser.add_argument('--no-round', action='store_true',
+                        help='do not round the scores')
+    args = parser.parse_args(argv)
+    if args.strict and args.scheme is None:
+        parser.error('--strict needs --scheme')
+
+    scheme = args.scheme
+    if args.strict:
+        from .schemes import Scheme
+
+        scheme = Scheme(scheme, strict=True)
+    delimiter = args.delimiter
+    if delimiter == '\\t':
+        delimiter = '\t'
+
+    try:
+        rows = evaluate_files(expand_paths(args.files), args.gold_col,
+                              args.guess_col, delimiter, args.boundary,
+                              scheme, args.jobs or None, args.by_type,
+                              not args.no_round)
+    except (OSError, ValueError, IndexError) as e:
+        sys.stderr.write('bioeval: %s\n' % e)
+        return 1
+    if args.output:
+        with open(args.output, 'w') as fh:
+            write_rows(rows, fh, args.format)
+    else:
+        write_rows(rows, sys.stdout, args.format)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
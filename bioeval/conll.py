@@ -0,0 +1,189 @@
+from .counts import ChunkCounts
+from .profiling import stage
+from .utils import OUTSIDE_TAG, START_PREFIXES
+
+__author__ = 'Aleksandar Savkov'
+
+# sentence boundary marker in the first column (as in conlleval)
+BOUNDARY = '-X-'
+
+
+def is_boundary(row, boundary=BOUNDARY):
+    """Tells whether a split CoNLL line separates sentences, i.e. it is
+    empty or starts with the boundary marker.
+
+    :param row: columns of the line
+    :type row: list
+    :param boundary: sentence boundary marker in the first column
+    :type boundary: str
+    :rtype: bool
+    """
+    return not row or not row[0] or row[0] == boundary
+
+
+class ChunkStream(ChunkCounts):
+    """Streaming chunk counter. Tags are fed one token at a time and only the
+    state of the currently open gold chunk is kept, so the memory does not
+    depend on the length of the input.
+
+    Chunks start on tags with a B/O/S prefix, like in `evaluate_df`, and on
+    the first token of every sentence. A gold chunk is correct when the guess
+    has the same tags over the whole chunk and closes a chunk at the same
+    token. The last open chunk is counted on `boundary`.
+
+    With a tagging scheme (see `bioeval.schemes`) chunk starts are decoded
+    from the previous and the current tag of each side instead, and a gold
+    chunk is correct when the guess has a chunk of the same type with the
+    same boundaries, like in conlleval.
+
+    :param scheme: tagging scheme name or object
+    :type scheme: str or Scheme
+    """
+
+    __slots__ = ('_fresh', '_match', '_type', '_scheme', '_prev')
+
+    def __init__(self, scheme=None):
+        super(ChunkStream, self).__init__()
+        self._fresh = True
+        self._match = False
+        self._type = None
+        if scheme is not None:
+            from .schemes import get_scheme
+            scheme = get_scheme(scheme)
+        self._scheme = scheme
+        self._prev = (None, None)
+
+    def feed(self, gold_tag, guess_tag):
+        """Adds a token to the stream.
+
+        :param gold_tag: gold chunk tag
+        :type gold_tag: str
+        :param guess_tag: guess chunk tag
+        :type guess_tag: str
+        """
+        if self._scheme is None:
+            gold_start = self._fresh or gold_tag[0] in START_PREFIXES
+            guess_start = self._fresh or guess_tag[0] in START_PREFIXES
+        else:
+            gold_prev, guess_prev = self._prev
+            gold_start = self._scheme.is_boundary(gold_prev, gold_tag)
+            guess_start = self._scheme.is_boundary(guess_prev, guess_tag)
+            self._prev = (gold_tag, guess_tag)
+        self._fresh = False
+        self.tag_total[gold_tag] = self.tag_total.get(gold_tag, 0) + 1
+        if gold_tag == guess_tag:
+            self.tag_correct[gold_tag] = self.tag_correct.get(gold_tag, 0) + 1
+        if gold_start:
+            if self._match and guess_start:
+                self.correct[self._type] = self.correct.get(self._type, 0) + 1
+            if gold_tag != OUTSIDE_TAG:
+                self._type = gold_tag.partition('-')[2]
+                self.gold[self._type] = self.gold.get(self._type, 0) + 1
+                if self._scheme is None:
+                    self._match = gold_tag == guess_tag
+                else:
+                    self._match = guess_start and \
+                        guess_tag != OUTSIDE_TAG and \
+                        guess_tag.partition('-')[2] == self._type
+            else:
+                self._match = False
+        elif self._match:
+            if self._scheme is None:
+                self._match = gold_tag == guess_tag
+            else:
+                self._match = not guess_start
+        if guess_start and guess_tag != OUTSIDE_TAG:
+            typ = guess_tag.partition('-')[2]
+            self.guess[typ] = self.guess.get(typ, 0) + 1
+
+    def boundary(self):
+        """Closes the open chunks at a sentence boundary or the end of the
+        input.
+        """
+        if self._scheme is not None:
+            for prev in self._prev:
+                self._scheme.is_boundary(prev, None)
+            self._prev = (None, None)
+        if self._match:
+            self.correct[self._type] = self.correct.get(self._type, 0) + 1
+        self._match = False
+        self._fresh = True
+
+
+def count_conll(lines, chunkcol=-2, guesscol=-1, delimiter=None,
+                boundary=BOUNDARY, scheme=None, stream=None):
+    """Counts the correct, gold and guess chunks in CoNLL-formatted lines.
+    Empty lines and lines starting with the boundary marker separate
+    sentences.
+
+    :param lines: iterable of lines, e.g. an open file
+    :type lines: iterable
+    :param chunkcol: gold tag column index
+    :type chunkcol: int
+    :param guesscol: guess tag column index
+    :type guesscol: int
+    :param delimiter: column delimiter, any whitespace by default
+    :type delimiter: str
+    :param boundary: sentence boundary marker in the first column
+    :type boundary: str
+    :param scheme: tagging scheme name or object
+    :type scheme: str or Scheme
+    :param stream: stream to feed the tags to, a new `ChunkStream` with the
+        scheme if `None`
+    :type stream: ChunkStream
+    :return: chunk counts by type
+    :rtype: ChunkStream
+    """
+    if stream is None:
+        stream = ChunkStream(scheme)
+    with stage('count_conll') as st:
+        for line in lines:
+            row = line.rstrip('\r\n').split(delimiter)
+            if is_boundary(row, boundary):
+                stream.boundary()
+                continue
+            stream.feed(row[chunkcol], row[guesscol])
+        stream.boundary()
+        st.update(tokens=sum(stream.tag_total.values()),
+                  chunks=sum(stream.gold.values()) +
+                  sum(stream.guess.values()))
+    return stream
+
+
+def evaluate_conll(fp, chunkcol=-2, guesscol=-1, delimiter=None,
+                   do_round=True, boundary=BOUNDARY, n_jobs=1, scheme=None):
+    """Evaluates a CoNLL-formatted file in a single pass with constant memory.
+
+    Every line holds the columns of one token, the last two being the gold
+    and the guess tag by default. Sentences are separated by empty lines.
+
+    :param fp: file path
+    :type fp: str
+    :param chunkcol: gold tag column index
+    :type chunkcol: int
+    :param guesscol: guess tag column index
+    :type guesscol: int
+    :param delimiter: column delimiter, any whitespace by default
+    :type delimiter: str
+    :param do_round: round the result to the second digit
+    :type do_round: bool
+    :param boundary: sentence boundary marker in the first column
+    :type boundary: str
+    :param n_jobs: number of worker processes, all CPUs if `None`
+    :type n_jobs: int
+    :param scheme: tagging scheme name or object, only with `n_jobs=1`
+    :type scheme: str or Scheme
+    :return: f-score, precision, recall
+    :rtype: tuple
+    """
+    if n_jobs != 1:
+        if scheme is not None:
+            raise ValueError('Tagging schemes need n_jobs=1.')
+        from .parallel import count_conll_parallel
+        counts = count_conll_parallel(fp, chunkcol, guesscol, delimiter,
+                                      boundary, n_jobs=n_jobs)
+        return counts.scores(do_round)
+    with open(fp, 'r') as fh:
+        stream = count_conll(fh, chunkcol, guesscol, delimiter, boundary,
+                             scheme)
+    return stream.scores(do_round)
@@ -0,0 +1,287 @@
+"""Python implementation of the CoNLL-2000 evaluation script
+`prl/conll_eval.pl` (conlleval, version 2004-01-26) with the same options,
+chunking rules and output formats.
+"""
+import argparse
+import re
+import sys
+
+from .counts import ChunkCounts
+
+__author__ = 'Aleksandar Savkov'
+
+BOUNDARY = '-X-'
+
+_TAG = re.compile(r'^([^-]*)-(.*)$')
+
+
+def _split_tag(tag):
+    m = _TAG.match(tag)
+    prefix, typ = m.groups() if m else (tag, '')
+    # perl treats a type of '0' as false
+    return prefix, typ if typ != '0' else ''
+
+
+def end_of_chunk(prev_tag, tag, prev_type, typ):
+    """Checks if a chunk ended between the previous and the current token.
+
+    :param prev_tag: previous chunk tag prefix
+    :type prev_tag: str
+    :param tag: current chunk tag prefix
+    :type tag: str
+    :param prev_type: previous chunk type
+    :type prev_type: str
+    :param typ: current chunk type
+    :type typ: str
+    :return: chunk end
+    :rtype: bool
+    """
+    return (
+        (prev_tag, tag) in (('B', 'B'), ('B', 'O'), ('I', 'B'), ('I', 'O'),
+                            ('E', 'E'), ('E', 'I'), ('E', 'O')) or
+        (prev_tag not in ('O', '.') and prev_type != typ) or
+        prev_tag in (']', '[')
+    )
+
+
+def start_of_chunk(prev_tag, tag, prev_type, typ):
+    """Checks if a chunk started between the previous and the current token.
+
+    :param prev_tag: previous chunk tag prefix
+    :type prev_tag: str
+    :param tag: current chunk tag prefix
+    :type tag: str
+    :param prev_type: previous chunk type
+    :type prev_type: str
+    :param typ: current chunk type
+    :type typ: str
+    :return: chunk start
+    :rtype: bool
+    """
+    return (
+        (prev_tag, tag) in (('B', 'B'), ('I', 'B'), ('O', 'B'), ('O', 'I'),
+                            ('E', 'E'), ('E', 'I'), ('O', 'E')) or
+        (tag not in ('O', '.') and prev_type != typ) or
+        tag in ('[', ']')
+    )
+
+
+class ConllevalCounts(ChunkCounts):
+    """Chunk counts by type and token counts of a conlleval run.
+    """
+
+    __slots__ = ('tokens', 'correct_tags')
+
+    def __init__(self, correct=None, gold=None, guess=None, tokens=0,
+                 correct_tags=0):
+        super(ConllevalCounts, self).__init__(correct, gold, guess)
+        self.tokens = tokens
+        self.correct_tags = correct_tags
+
+    @property
+    def accuracy(self):
+        """Token accuracy in percent.
+        :rtype: float
+        """
+        if not self.tokens:
+            return 0.0
+        return 100 * self.correct_tags / float(self.tokens)
+
+
+def _count(counts, key):
+    counts[key] = counts.get(key, 0) + 1
+
+
+def count_conlleval(lines, delimiter=' ', otag='O', raw=False,
+                    boundary=BOUNDARY):
+    """Counts chunks and tokens in CoNLL-formatted lines exactly like
+    conlleval. The last two columns hold the gold and the guess tag.
+
+    :param lines: iterable of lines, e.g. an open file
+    :type lines: iterable
+    :param delimiter: field delimiter regular expression (`-d`)
+    :type delimiter: str
+    :param otag: alternative outside tag (`-o`)
+    :type otag: str
+    :param raw: accept raw tags without B- and I- prefixes (`-r`)
+    :type raw: bool
+    :param boundary: sentence boundary marker in the first column
+    :type boundary: str
+    :return: counts
+    :rtype: ConllevalCounts
+    """
+    res = ConllevalCounts()
+    split = re.compile(delimiter)
+    n_features = -1
+    in_correct = False
+    last_correct, last_correct_type = 'O', ''
+    last_guessed, last_guessed_type = 'O', ''
+
+    for line in lines:
+        if line.endswith('\n'):
+            line = line[:-1]
+        features = split.split(line) if line else []
+        while features and features[-1] == '':
+            features.pop()
+        if n_features < 0:
+            n_features = len(features) - 1
+        elif n_features != len(features) - 1 and features:
+            raise ValueError('unexpected number of features: %d (%d)' %
+                             (len(features), n_features + 1))
+        if not features or features[0] == boundary:
+            features = [boundary, 'O', 'O']
+        if len(features) < 2:
+            raise ValueError('unexpected number of features in line %s' %
+                             line)
+        if raw:
+            for i in (-1, -2):
+                if features[i] == otag:
+                    features[i] = 'O'
+                if features[i] != 'O':
+                    features[i] = 'B-%s' % features[i]
+
+        guessed, guessed_type = _split_tag(features[-1])
+        correct, correct_type = _split_tag(features[-2])
+        first_item = features[0]
+        if first_item == boundary:
+            guessed = 'O'
+
+        correct_end = end_of_chunk(last_correct, correct, last_correct_type,
+                                   correct_type)
+        guessed_end = end_of_chunk(last_guessed, guessed, last_guessed_type,
+                                   guessed_type)
+        correct_start = start_of_chunk(last_correct, correct,
+                                       last_correct_type, correct_type)
+        guessed_start = start_of_chunk(last_guessed, guessed,
+                                       last_guessed_type, guessed_type)
+
+        if in_correct:
+            if correct_end and guessed_end and \
+                    last_guessed_type == last_correct_type:
+                in_correct = False
+                _count(res.correct, last_correct_type)
+            elif correct_end != guessed_end or guessed_type != correct_type:
+                in_correct = False
+
+        if correct_start and guessed_start and guessed_type == correct_type:
+            in_correct = True
+
+        if correct_start:
+            _count(res.gold, correct_type)
+        if guessed_start:
+            _count(res.guess, guessed_type)
+        if first_item != boundary:
+            if correct == guessed and guessed_type == correct_type:
+                res.correct_tags += 1
+            res.tokens += 1
+
+        last_guessed, last_guessed_type = guessed, guessed_type
+        last_correct, last_correct_type = correct, correct_type
+
+    if in_correct:
+        _count(res.correct, last_correct_type)
+
+    return res
+
+
+def _prf(correct, gold, guess):
+    # same operation order as conlleval for identical rounding
+    precision = 100 * correct / float(guess) if guess > 0 else 0.0
+    recall = 100 * correct / float(gold) if gold > 0 else 0.0
+    if precision + recall > 0:
+        fb1 = 2 * precision * recall / (precision + recall)
+    else:
+        fb1 = 0.0
+    return precision, recall, fb1
+
+
+def _sorted_types(counts):
+    # like conlleval, which lists the empty type once per hash it occurs in
+    types = []
+    last = None
+    for t in sorted(list(counts.gold) + list(counts.guess)):
+        if not last or last != t:
+            types.append(t)
+        last = t
+    return types
+
+
+def report(counts, latex=False):
+    """Formats conlleval counts like the output of conlleval.
+
+    :param counts: counts
+    :type counts: ConllevalCounts
+    :param latex: LaTeX table output (`-l`)
+    :type latex: bool
+    :return: report
+    :rtype: str
+    """
+    correct, gold, guess = counts.total
+    precision, recall, fb1 = _prf(correct, gold, guess)
+    types = _sorted_types(counts)
+    out = []
+    if not latex:
+        out.append('processed %d tokens with %d phrases; '
+                   'found: %d phrases; correct: %d.\n' %
+                   (counts.tokens, gold, guess, correct))
+        if counts.tokens > 0:
+            out.append('accuracy: %6.2f%%; precision: %6.2f%%; '
+                       'recall: %6.2f%%; FB1: %6.2f\n' %
+                       (counts.accuracy, precision, recall, fb1))
+        for t in types:
+            nguess = counts.guess.get(t, 0)
+            out.append('%17s: precision: %6.2f%%; recall: %6.2f%%; '
+                       'FB1: %6.2f  %d\n' %
+                       ((t,) + _prf(counts.correct.get(t, 0),
+                                    counts.gold.get(t, 0), nguess) +
+                        (nguess,)))
+    else:
+        out.append('        & Precision &  Recall  & F$_{\\beta=1} '
+                   '\\\\\\hline')
+        for t in types:
+            out.append('\n%-7s &  %6.2f\\%% & %6.2f\\%% & %6.2f \\\\' %
+                       ((t,) + _prf(counts.correct.get(t, 0),
+                                    counts.gold.get(t, 0),
+                                    counts.guess.get(t, 0))))
+        out.append('\\hline\n')
+        out.append('Overall &  %6.2f\\%% & %6.2f\\%% & %6.2f \\\\\\hline\n' %
+                   (precision, recall, fb1))
+    return ''.join(out)
+
+
+def main(argv=None):
+    """Console entry point with the command line of conlleval.
+    """
+    parser = argparse.ArgumentParser(
+        prog='conlleval',
+        description='evaluate result of processing CoNLL-2000 shared task'
+    )
+    parser.add_argument('-l', dest='latex', action='store_true',
+                        help='generate LaTeX output')
+    parser.add_argument('-r', dest='raw', action='store_true',
+                        help='accept raw result tags')
+    parser.add_argument('-d', dest='delimiter', default=' ',
+                        help='alternative delimiter tag')
+    parser.add_argument('-o', dest='otag', default='O',
+                        help='alternative outside tag')
+    parser.add_argument('file', nargs='?',
+                        help='input file, standard input by default')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.file:
+            with open(args.file, 'r') as fh:
+                counts = count_conlleval(fh, args.delimiter, args.otag,
+                                         args.raw)
+        else:
+            counts = count_conlleval(sys.stdin, args.delimiter, args.otag,
+                                     args.raw)
+    except ValueError as e:
+        sys.stderr.write('conlleval: %s\n' % e)
+        return 1
+    sys.stdout.write(report(counts, args.latex))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,286 @@
+from .utils import AccuracyResults, chunk_scores
+
+__author__ = 'Aleksandar Savkov'
+
+
+class ChunkCounts(object):
+    """Numbers of correct, gold and guess chunks by chunk type. Counts are
+    plain integers, so results over parts of a corpus can be added up
+    exactly.
+
+    The numbers of all and of correctly tagged tokens by gold tag are kept
+    next to the chunk counts, when the counting pass provides them.
+    """
+
+    __slots__ = ('correct', 'gold', 'guess', 'tag_correct', 'tag_total')
+
+    def __init__(self, correct=None, gold=None, guess=None, tag_correct=None,
+                 tag_total=None):
+        self.correct = dict(correct or {})
+        self.gold = dict(gold or {})
+        self.guess = dict(guess or {})
+        self.tag_correct = dict(tag_correct or {})
+        self.tag_total = dict(tag_total or {})
+
+    @classmethod
+    def from_spans(cls, types, gold_spans, guess_spans, correct):
+        """Counts chunks by type from span arrays.
+
+        :param types: chunk type names indexed by type id
+        :type types: list
+        :param gold_spans: gold span array
+        :type gold_spans: np.ndarray
+        :param guess_spans: guess span array
+        :type guess_spans: np.ndarray
+        :param correct: boolean mask of the correct gold spans
+        :type correct: np.ndarray
+        :return: chunk counts
+        :rtype: ChunkCounts
+        """
+        import numpy as np
+
+        n = len(types)
+        counts = [
+            np.bincount(x, minlength=n).tolist()
+            for x in (gold_spans[correct, 2], gold_spans[:, 2],
+                      guess_spans[:, 2])
+        ]
+        return cls(*[{t: c for t, c in zip(types, x) if c}
+                     for x in counts])
+
+    def add_tags(self, tags, gold_ids, guess_ids):
+        """Counts all and correctly tagged tokens by gold tag in aligned tag
+        id arrays.
+
+        :param tags: tags indexed by tag id
+        :type tags: list
+        :param gold_ids: gold tag ids
+        :type gold_ids: np.ndarray
+        :param guess_ids: guess tag ids
+        :type guess_ids: np.ndarray
+        """
+        import numpy as np
+
+        n = len(tags)
+        total = np.bincount(gold_ids, minlength=n).tolist()
+        correct = np.bincount(gold_ids[gold_ids == guess_ids],
+                              minlength=n).tolist()
+        for mine, theirs in ((self.tag_total, total),
+                             (self.tag_correct, correct)):
+            for k, v in zip(tags, theirs):
+                if v:
+                    mine[k] = mine.get(k, 0) + v
+
+    @property
+    def total(self):
+        """Overall numbers of correct, gold and guess chunks.
+        :rtype: tuple
+        """
+        return sum(self.correct.values()), sum(self.gold.values()), \
+            sum(self.guess.values())
+
+    def update(self, other):
+        """Adds the counts of another object to this one.
+
+        :param other: chunk counts
+        :type other: ChunkCounts
+        """
+        for mine, theirs in ((self.correct, other.correct),
+                             (self.gold, other.gold),
+                             (self.guess, other.guess),
+                             (self.tag_correct, other.tag_correct),
+                             (self.tag_total, other.tag_total)):
+            for k, v in theirs.items():
+                mine[k] = mine.get(k, 0) + v
+
+    def __add__(self, other):
+        res = ChunkCounts(self.correct, self.gold, self.guess,
+                          self.tag_correct, self.tag_total)
+        res.update(other)
+        return res
+
+    def __eq__(self, other):
+        return (self.correct, self.gold, self.guess) == \
+            (other.correct, other.gold, other.guess)
+
+    def __repr__(self):
+        return 'ChunkCounts(correct=%s, gold=%s, guess=%s)' % self.total
+
+    def scores(self, do_round=True):
+        """Calculates the overall f-score, precision and recall.
+
+        :param do_round: round the result to the second digit
+        :type do_round: bool
+        :return: f-score, precision, recall
+        :rtype: tuple
+        """
+        return chunk_scores(*self.total, do_round=do_round)
+
+    def results(self, do_round=True):
+        """Precision, recall and f-score by chunk type and in total.
+
+        :param do_round: round the results to the second digit
+        :type do_round: bool
+        :return: results by chunk type
+        :rtype: AccuracyResults
+        """
+        res = AccuracyResults()
+        res.from_counts(self.correct, self.gold, self.guess, do_round)
+        return res
+
+    def rows(self, do_round=True, by_type=True):
+        """Counts and scores by chunk type and in total, one row per label
+        in the order of `results`.
+
+        :param do_round: round the scores to the second digit
+        :type do_round: bool
+        :param by_type: add a row for every chunk type, otherwise only the
+            total
+        :type by_type: bool
+        :return: (label, correct, gold, guess, precision, recall, fscore)
+            rows
+        :rtype: list
+        """
+        res = self.results(do_round)
+        rows = []
+        for label, itm in res.items():
+            if label == res.total:
+                correct, gold, guess = self.total
+            elif not by_type:
+                continue
+            else:
+                correct = self.correct.get(label, 0)
+                gold = self.gold.get(label, 0)
+                guess = self.guess.get(label, 0)
+            rows.append((label, correct, gold, guess, itm['precision'],
+                         itm['recall'], itm['fscore']))
+        return rows
+
+    def compact_results(self, do_round=True):
+        """Precision, recall and f-score by chunk type and in total, backed
+        by a count array (see `bioeval.results`).
+
+        :param do_round: round the results to the second digit
+        :type do_round: bool
+        :return: results by chunk type
+        :rtype: CompactResults
+        """
+        from .results import CompactResults
+
+        return CompactResults.from_counts(self, do_round)
+
+    def tag_results(self, do_round=True):
+        """Token accuracy by gold tag and in total.
+
+        :param do_round: round the results to the second digit
+        :type do_round: bool
+        :return: accuracy, number of all and of correct tokens by tag
+        :rtype: AccuracyResults
+        """
+        res = AccuracyResults()
+        res.from_tag_counts(self.tag_correct, self.tag_total, do_round)
+        return res
+
+
+class GroupCounts(object):
+    """Numbers of correct, gold and guess chunks of every group of tokens,
+    e.g. every document or sentence, held in one integer array of shape
+    (groups, 3). The rows can be used as they are for bootstrap intervals
+    and paired tests (see `bioeval.significance`), summed over shards, or
+    ranked to find the worst documents.
+
+    :param labels: group ids, one per row
+    :type labels: np.ndarray
+    :param counts: count array of shape (groups, 3)
+    :type counts: np.ndarray
+    """
+
+    __slots__ = ('labels', 'counts')
+
+    def __init__(self, labels, counts):
+        import numpy as np
+
+        self.labels = np.asarray(labels)
+        self.counts = np.asarray(counts, dtype=np.int64).reshape(-1, 3)
+
+    @classmethod
+    def from_spans(cls, labels, starts, gold_spans, guess_spans, correct):
+        """Counts chunks by group from span arrays. Chunks must not cross
+        group boundaries.
+
+        :param labels: group ids, one per group
+        :type labels: np.ndarray
+        :param starts: boolean mask of the first tokens of the groups
+        :type starts: np.ndarray
+        :param gold_spans: gold span array
+        :type gold_spans: np.ndarray
+        :param guess_spans: guess span array
+        :type guess_spans: np.ndarray
+        :param correct: boolean mask of the correct gold spans
+        :type correct: np.ndarray
+        :return: group counts
+        :rtype: GroupCounts
+        """
+        import numpy as np
+
+        group = np.cumsum(starts) - 1
+        n = len(labels)
+        return cls(labels, np.stack([
+            np.bincount(group[x], minlength=n)
+            for x in (gold_spans[correct, 0], gold_spans[:, 0],
+                      guess_spans[:, 0])
+        ], axis=1))
+
+    def __len__(self):
+        return len(self.counts)
+
+    @property
+    def total(self):
+        """Overall numbers of correct, gold and guess chunks.
+        :rtype: tuple
+        """
+        return tuple(int(x) for x in self.counts.sum(axis=0))
+
+    def scores(self):
+        """F-score, precision and recall of every group.
+
+        :return: f-score, precision and recall arrays of shape (groups,)
+        :rtype: tuple
+        """
+        from .significance import fscores
+
+        return fscores(self.counts)
+
+    def worst(self, n=10):
+        """Groups with the lowest f-scores, among the groups with any gold or
+        guess chunks. Ties go to the groups with more gold chunks.
+
+        :param n: number of groups
+        :type n: int
+        :return: positions of the groups, worst first
+        :rtype: np.ndarray
+        """
+        import numpy as np
+
+        f1 = self.scores()[0]
+        rows = np.flatnonzero(self.counts[:, 1:].sum(axis=1) > 0)
+        order = np.lexsort((-self.counts[rows, 1], f1[rows]))
+        return rows[order[:n]]
+
+    def to_frame(self, do_round=True):
+        """Table of the counts and scores of every group.
+
+        :param do_round: round the scores to the second digit
+        :type do_round: bool
+        :return: one row per group
+        :rtype: pd.DataFrame
+        """
+        import pandas as pd
+
+        f1, pr, re = self.scores()
+        df = pd.DataFrame({
+            'group': self.labels, 'correct': self.counts[:, 0],
+            'gold': self.counts[:, 1], 'guess': self.counts[:, 2],
+            'precision': pr, 'recall': re, 'fscore': f1
+        })
+        return df.round(2) if do_round else df
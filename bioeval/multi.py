@@ -0,0 +1,175 @@
+from .conll import BOUNDARY, is_boundary
+from .counts import ChunkCounts
+
+__author__ = 'Aleksandar Savkov'
+
+
+class GoldIndex(object):
+    """Gold chunks extracted once and scored against any number of aligned
+    guess sequences. Only the guess side is encoded and chunked for every
+    system.
+
+    :param gold_tags: gold tag sequence
+    :type gold_tags: list or np.ndarray
+    :param scheme: tagging scheme name or `bioeval.schemes.Scheme`; by
+        default chunks start on B, O and S tags
+    :type scheme: str or Scheme
+    """
+
+    def __init__(self, gold_tags, scheme=None):
+        from .spans import TagSet
+
+        scheme = _get_scheme(scheme)
+        tagset = TagSet()
+        ids = tagset.encode(gold_tags)
+        if scheme is not None:
+            spans = tagset.spans(ids, scheme.boundaries(ids, tagset))
+        elif len(ids) and not tagset.starts[ids[0]]:
+            raise ValueError('Invalid chunktag on first token.')
+        else:
+            spans = tagset.spans(ids)
+        self._set(tagset, ids, spans, scheme)
+
+    @classmethod
+    def from_arrays(cls, tags, ids, spans, scheme=None):
+        """Restores an index from its tag vocabulary, gold tag ids and gold
+        span array, e.g. memory maps of a `bioeval.cache.GoldCache` entry.
+
+        :param tags: tag vocabulary
+        :type tags: list
+        :param ids: gold tag ids
+        :type ids: np.ndarray
+        :param spans: gold span array
+        :type spans: np.ndarray
+        :param scheme: tagging scheme the spans were decoded with
+        :type scheme: str or Scheme
+        :return: gold index
+        :rtype: GoldIndex
+        """
+        from .spans import TagSet
+
+        index = cls.__new__(cls)
+        index._set(TagSet(tags), ids, spans, _get_scheme(scheme))
+        return index
+
+    def _set(self, tagset, ids, spans, scheme):
+        self.tagset = tagset
+        self.ids = ids
+        self.spans = spans
+        self.scheme = scheme
+        self._gold = self._by_type(spans[:, 2])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _by_type(self, type_ids):
+        import numpy as np
+
+        types = self.tagset.types
+        counts = np.bincount(type_ids, minlength=len(types)).tolist()
+        return {t: c for t, c in zip(types, counts) if c}
+
+    def count(self, guess_tags):
+        """Counts the correct, gold and guess chunks of a guess sequence.
+
+        :param guess_tags: guess tag sequence aligned with the gold
+        :type guess_tags: list or np.ndarray
+        :return: chunk counts
+        :rtype: ChunkCounts
+        """
+        from .spans import aligned_matches, match_spans
+
+        tagset = self.tagset
+        guess = tagset.encode(guess_tags)
+        if len(guess) != len(self.ids):
+            raise ValueError('Non-matching number of tags %s!=%s.' %
+                             (len(self.ids), len(guess)))
+        if self.scheme is not None:
+            guess_spans = tagset.spans(guess,
+                                       self.scheme.boundaries(guess, tagset))
+            correct = match_spans(self.spans, guess_spans)
+        else:
+            if len(guess) and not tagset.starts[guess[0]]:
+                raise ValueError('Invalid guesstag on first token.')
+            guess_spans = tagset.spans(guess)
+            correct = aligned_matches(self.ids, guess, self.spans, tagset)
+        counts = ChunkCounts(self._by_type(self.spans[correct, 2]),
+                             self._gold, self._by_type(guess_spans[:, 2]))
+        counts.add_tags(tagset.tags, self.ids, guess)
+        return counts
+
+
+def _get_scheme(scheme):
+    if scheme is None:
+        return None
+    from .schemes import get_scheme
+
+    return get_scheme(scheme)
+
+
+def read_tags(fp, col=-1, delimiter=None, boundary=BOUNDARY):
+    """Reads one tag column of a CoNLL-formatted file, skipping empty lines
+    and sentence boundary lines.
+
+    :param fp: file path
+    :type fp: str
+    :param col: tag column index
+    :type col: int
+    :param delimiter: column delimiter, any whitespace by default
+    :type delimiter: str
+    :param boundary: sentence boundary marker in the first column
+    :type boundary: str
+    :return: tags
+    :rtype: list
+    """
+    with open(fp, 'r') as fh:
+        rows = (line.rstrip('\r\n').split(delimiter) for line in fh)
+        return [row[col] for row in rows if not is_boundary(row, boundary)]
+
+
+def evaluate_systems(df, chunkcol='chunktag', guesses=('guesstag',),
+                     guesscol=-1, delimiter=None, do_round=True, scheme=None,
+                     cache=None):
+    """Evaluates many systems against the same gold column. The gold chunks
+    are extracted once, so the cost grows only with the number and size of
+    the guess sequences.
+
+    :param df: dataframe with the gold column
+    :type df: pd.DataFrame
+    :param chunkcol: the column name of the gold chunk tags
+    :type chunkcol: str
+    :param guesses: guess column names or CoNLL file paths
+    :type guesses: list
+    :param guesscol: guess tag column index in the files
+    :type guesscol: int
+    :param delimiter: column delimiter of the files
+    :type delimiter: str
+    :param do_round: round the results to the second digit
+    :type do_round: bool
+    :param scheme: tagging scheme name or `bioeval.schemes.Scheme`
+    :type scheme: str or Scheme
+    :param cache: directory or `bioeval.cache.GoldCache` of gold chunk
+        indexes
+    :type cache: str or GoldCache
+    :return: one row per system and chunk type (and `Total`) with the
+        counts, precision, recall and f-score
+    :rtype: pd.DataFrame
+    """
+    import pandas as pd
+
+    if cache is not None:
+        from .cache import get_cache
+        index = get_cache(cache).index(df[chunkcol].values, scheme)
+    else:
+        index = GoldIndex(df[chunkcol].values, scheme)
+    rows = []
+    for system in guesses:
+        if system in df.columns:
+            tags = df[system].values
+        else:
+            tags = read_tags(system, guesscol, delimiter)
+        rows.extend((system,) + row
+                    for row in index.count(tags).rows(do_round))
+    return pd.DataFrame(rows, columns=['system', 'label', 'correct', 'gold',
+                                       'guess', 'precision', 'recall',
+                                       'fscore'])
@@ -0,0 +1,282 @@
+import time
+
+from collections import deque
+
+from .conll import ChunkStream
+from .counts import ChunkCounts
+from .utils import chunk_scores
+
+__author__ = 'Aleksandar Savkov'
+
+
+def _is_batch(tags):
+    # an empty input is an empty batch, not an empty sentence
+    return len(tags) == 0 or not isinstance(tags[0], str)
+
+
+def _as_batch(gold_tags, guess_tags):
+    # checks every sentence before any is counted
+    if not _is_batch(gold_tags):
+        gold_tags, guess_tags = [gold_tags], [guess_tags]
+    if len(gold_tags) != len(guess_tags):
+        raise ValueError('Non-matching number of sentences %s!=%s.' %
+                         (len(gold_tags), len(guess_tags)))
+    for gold_sent, guess_sent in zip(gold_tags, guess_tags):
+        if len(gold_sent) != len(guess_sent):
+            raise ValueError('Non-matching number of tags %s!=%s.' %
+                             (len(gold_sent), len(guess_sent)))
+    return gold_tags, guess_tags
+
+
+class ChunkEvaluator(object):
+    """Stateful chunk evaluator for scoring during training. Sentences are
+    added with `update` as they come and only the running counts are kept,
+    so the cost of an update is proportional to the new data.
+
+    Every sentence is chunked on its own, i.e. chunks never continue across
+    sentences. Evaluators of data-parallel workers can be combined with
+    `merge`.
+
+    Example:
+
+    ev = ChunkEvaluator()
+    for gold, guess in batches:
+        ev.update(gold, guess)
+    f1, pr, re = ev.result()
+    """
+
+    __slots__ = ('_counts', 'sentences', 'tokens')
+
+    def __init__(self):
+        self._counts = ChunkStream()
+        self.sentences = 0
+        self.tokens = 0
+
+    def update(self, gold_tags, guess_tags):
+        """Adds a sentence or a batch of sentences.
+
+        :param gold_tags: gold tags of a sentence or a list of sentences
+        :type gold_tags: list
+        :param guess_tags: guess tags of a sentence or a list of sentences
+        :type guess_tags: list
+        """
+        gold_tags, guess_tags = _as_batch(gold_tags, guess_tags)
+        counts = self._counts
+        for gold_sent, guess_sent in zip(gold_tags, guess_tags):
+            for gold_tag, guess_tag in zip(gold_sent, guess_sent):
+                counts.feed(gold_tag, guess_tag)
+            counts.boundary()
+            self.sentences += 1
+            self.tokens += len(gold_sent)
+
+    @property
+    def counts(self):
+        """Chunk counts by type of all sentences so far.
+        :rtype: ChunkCounts
+        """
+        return self._counts
+
+    def result(self, do_round=True):
+        """Calculates the f-score, precision and recall of all sentences so
+        far.
+
+        :param do_round: round the result to the second digit
+        :type do_round: bool
+        :return: f-score, precision, recall
+        :rtype: tuple
+        """
+        return self._counts.scores(do_round)
+
+    def results(self, do_round=True):
+        """Precision, recall and f-score by chunk type and in total.
+
+        :param do_round: round the results to the second digit
+        :type do_round: bool
+        :return: results by chunk type
+        :rtype: AccuracyResults
+        """
+        return self._counts.results(do_round)
+
+    def reset(self):
+        """Drops all counts, e.g. at the start of an epoch.
+        """
+        self._counts = ChunkStream()
+        self.sentences = 0
+        self.tokens = 0
+
+    def merge(self, other):
+        """Adds the counts of another evaluator to this one.
+
+        :param other: evaluator, e.g. of another worker
+        :type other: ChunkEvaluator
+        :return: this evaluator
+        :rtype: ChunkEvaluator
+        """
+        self._counts.update(other.counts)
+        self.sentences += other.sentences
+        self.tokens += other.tokens
+        return self
+
+
+class WindowedEvaluator(object):
+    """Chunk evaluator over a sliding window of the most recent sentences,
+    e.g. the last `size` sentences or the sentences of the last `seconds`
+    seconds, for drift detection in production monitoring.
+
+    The count triples (correct, gold, guess) of every sentence in the
+    window are kept in a ring buffer, next to their running sums in total
+    and by chunk type. A new sentence is added to the sums and an evicted
+    one is subtracted, so the window scores are updated at a constant cost
+    per sentence, whatever the size of the window.
+
+    Example:
+
+    ev = WindowedEvaluator(size=1000, seconds=600)
+    for gold, guess in traffic:
+        ev.update(gold, guess)
+        f1, pr, re = ev.result()
+
+    :param size: maximum number of sentences in the window
+    :type size: int
+    :param seconds: maximum age of the sentences in the window
+    :type seconds: float
+    :param clock: time source of the sentences without a timestamp
+    :type clock: callable
+    """
+
+    __slots__ = ('size', 'seconds', 'clock', '_window', '_sums', '_total',
+                 'tokens')
+
+    def __init__(self, size=None, seconds=None, clock=time.time):
+        if size is None and seconds is None:
+            raise ValueError('A window needs a size or a number of seconds.')
+        self.size = size
+        self.seconds = seconds
+        self.clock = clock
+        self.reset()
+
+    def __len__(self):
+        return len(self._window)
+
+    def update(self, gold_tags, guess_tags, timestamp=None):
+        """Adds a sentence or a batch of sentences to the window.
+
+        :param gold_tags: gold tags of a sentence or a list of sentences
+        :type gold_tags: list
+        :param guess_tags: guess tags of a sentence or a list of sentences
+        :type guess_tags: list
+        :param timestamp: arrival time, the clock time if `None`
+        :type timestamp: float
+        """
+        gold_tags, guess_tags = _as_batch(gold_tags, guess_tags)
+        for gold_sent, guess_sent in zip(gold_tags, guess_tags):
+            counts = ChunkStream()
+            for gold_tag, guess_tag in zip(gold_sent, guess_sent):
+                counts.feed(gold_tag, guess_tag)
+            counts.boundary()
+            self.add(counts, len(gold_sent), timestamp)
+
+    def add(self, counts, tokens=0, timestamp=None):
+        """Adds the counts of a sentence scored elsewhere, e.g. by
+        `bioeval.service.count_batch`.
+
+        :param counts: chunk counts of the sentence
+        :type counts: ChunkCounts
+        :param tokens: number of tokens of the sentence
+        :type tokens: int
+        :param timestamp: arrival time, the clock time if `None`
+        :type timestamp: float
+        """
+        if timestamp is None:
+            timestamp = self.clock()
+        entry = (timestamp, tokens, dict(counts.correct), dict(counts.gold),
+                 dict(counts.guess))
+        self._window.append(entry)
+        for i, (sums, x) in enumerate(zip(self._sums, entry[2:])):
+            for k, c in x.items():
+                sums[k] = sums.get(k, 0) + c
+                self._total[i] += c
+        self.tokens += tokens
+        if self.size is not None and len(self._window) > self.size:
+            self._pop()
+        self.expire(timestamp)
+
+    def _pop(self):
+        entry = self._window.popleft()
+        for i, (sums, x) in enumerate(zip(self._sums, entry[2:])):
+            for k, c in x.items():
+                n = sums[k] - c
+                if n:
+                    sums[k] = n
+                else:
+                    del sums[k]
+                self._total[i] -= c
+        self.tokens -= entry[1]
+
+    def expire(self, now=None):
+        """Evicts the sentences older than the time window.
+
+        :param now: current time, the clock time if `None`
+        :type now: float
+        """
+        if self.seconds is None:
+            return
+        if now is None:
+            now = self.clock()
+        limit = now - self.seconds
+        window = self._window
+        while window and window[0][0] <= limit:
+            self._pop()
+
+    @property
+    def counts(self):
+        """Chunk counts by type of the sentences in the window.
+        :rtype: ChunkCounts
+        """
+        self.expire()
+        return ChunkCounts(*[dict(x) for x in self._sums])
+
+    def result(self, do_round=True):
+        """Calculates the f-score, precision and recall of the window.
+
+        :param do_round: round the result to the second digit
+        :type do_round: bool
+        :return: f-score, precision, recall
+        :rtype: tuple
+        """
+        self.expire()
+        return chunk_scores(*self._total, do_round=do_round)
+
+    def label_result(self, label, do_round=True):
+        """Calculates the f-score, precision and recall of one chunk type in
+        the window.
+
+        :param label: chunk type
+        :type label: str
+        :param do_round: round the result to the second digit
+        :type do_round: bool
+        :return: f-score, precision, recall
+        :rtype: tuple
+        """
+        self.expire()
+        return chunk_scores(*[x.get(label, 0) for x in self._sums],
+                            do_round=do_round)
+
+    def results(self, do_round=True):
+        """Precision, recall and f-score by chunk type and in total of the
+        window.
+
+        :param do_round: round the results to the second digit
+        :type do_round: bool
+        :return: results by chunk type
+        :rtype: AccuracyResults
+        """
+        return self.counts.results(do_round)
+
+    def reset(self):
+        """Empties the window.
+        """
+        self._window = deque()
+        self._sums = ({}, {}, {})
+        self._total = [0, 0, 0]
+        self.tokens = 0
@@ -0,0 +1,174 @@
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+from .conll import BOUNDARY, count_conll, is_boundary
+from .core import count_tags
+from .counts import ChunkCounts
+from .spans import START_PREFIXES
+
+__author__ = 'Aleksandar Savkov'
+
+# shards per worker process, more shards balance uneven shards better
+SHARDS_PER_JOB = 4
+
+
+def _n_jobs(n_jobs):
+    return n_jobs or os.cpu_count() or 1
+
+
+def _merge(parts):
+    counts = ChunkCounts()
+    for part in parts:
+        counts.update(part)
+    return counts
+
+
+def _is_split(gold_tag, guess_tag):
+    # both sides open a new chunk on this token
+    return gold_tag[0] in START_PREFIXES and guess_tag[0] in START_PREFIXES
+
+
+def df_shards(gold_tags, guess_tags, n_shards):
+    """Splits aligned tag sequences into shards at tokens where both the gold
+    and the guess side open a new chunk, so no chunk crosses a shard.
+
+    :param gold_tags: gold tag sequence
+    :type gold_tags: np.ndarray
+    :param guess_tags: guess tag sequence
+    :type guess_tags: np.ndarray
+    :param n_shards: maximum number of shards
+    :type n_shards: int
+    :return: shard boundaries as (start, end) pairs
+    :rtype: list
+    """
+    n = len(gold_tags)
+    step = max(1, -(-n // n_shards))
+    cuts = [0]
+    for i in range(step, n, step):
+        i = max(i, cuts[-1] + 1)
+        while i < n and not _is_split(gold_tags[i], guess_tags[i]):
+            i += 1
+        if i < n:
+            cuts.append(i)
+    cuts.append(n)
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+def count_df_parallel(df, chunkcol='chunktag', guesscol='guesstag',
+                      n_jobs=None):
+    """Counts chunks of a `pandas` `DataFrame` like `count_df` in a pool of
+    worker processes. The counts are identical to the serial ones.
+
+    :param df: dataframe
+    :type df: pd.DataFrame
+    :param chunkcol: the column name of the gold chunk tags
+    :type chunkcol: str
+    :param guesscol: the column name of the guess chunk tags
+    :type guesscol: str
+    :param n_jobs: number of worker processes, all CPUs if `None`
+    :type n_jobs: int
+    :return: chunk counts
+    :rtype: ChunkCounts
+    """
+    n_jobs = _n_jobs(n_jobs)
+    gold, guess = df[chunkcol].values, df[guesscol].values
+    shards = df_shards(gold, guess, n_jobs * SHARDS_PER_JOB)
+    with ProcessPoolExecutor(max_workers=n_jobs) as ex:
+        return _merge(ex.map(count_tags,
+                             [gold[s:e] for s, e in shards],
+                             [guess[s:e] for s, e in shards]))
+
+
+def _is_split_line(line, chunkcol, guesscol, delimiter, boundary):
+    row = line.split(delimiter)
+    if is_boundary(row, boundary):
+        return True
+    return _is_split(row[chunkcol], row[guesscol])
+
+
+def file_shards(fp, n_shards, chunkcol=-2, guesscol=-1, delimiter=None,
+                boundary=BOUNDARY, encoding='utf-8'):
+    """Splits a CoNLL-formatted file into byte ranges that start at a
+    sentence boundary or at a token where both the gold and the guess side
+    open a new chunk.
+
+    :param fp: file path
+    :type fp: str
+    :param n_shards: maximum number of shards
+    :type n_shards: int
+    :return: shard boundaries as (start, end) byte offsets
+    :rtype: list
+    """
+    size = os.path.getsize(fp)
+    step = max(1, -(-size // n_shards))
+    cuts = [0]
+    with open(fp, 'rb') as fh:
+        for offset in range(step, size, step):
+            if offset <= cuts[-1]:
+                continue
+            fh.seek(offset - 1)
+            # move to the start of the next line
+            fh.readline()
+            pos = fh.tell()
+            for line in iter(fh.readline, b''):
+                line = line.decode(encoding).rstrip('\r\n')
+                if _is_split_line(line, chunkcol, guesscol, delimiter,
+                                  boundary):
+                    break
+                pos = fh.tell()
+            if pos < size:
+                cuts.append(pos)
+    cuts.append(size)
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+def _read_range(fp, start, end, encoding):
+    with open(fp, 'rb') as fh:
+        fh.seek(start)
+        pos = start
+        for line in fh:
+            if pos >= end:
+                break
+            pos += len(line)
+            yield line.decode(encoding)
+
+
+def _count_range(fp, start, end, chunkcol, guesscol, delimiter, boundary,
+                 encoding):
+    lines = _read_range(fp, start, end, encoding)
+    return count_conll(lines, chunkcol, guesscol, delimiter, boundary)
+
+
+def count_conll_parallel(fp, chunkcol=-2, guesscol=-1, delimiter=None,
+                         boundary=BOUNDARY, n_jobs=None, encoding='utf-8'):
+    """Counts chunks of a CoNLL-formatted file like `count_conll` in a pool
+    of worker processes. Every worker streams its own byte range of the
+    file, and the counts are identical to the serial ones.
+
+    :param fp: file path
+    :type fp: str
+    :param chunkcol: gold tag column index
+    :type chunkcol: int
+    :param guesscol: guess tag column index
+    :type guesscol: int
+    :param delimiter: column delimiter, any whitespace by default
+    :type delimiter: str
+    :param boundary: sentence boundary marker in the first column
+    :type boundary: str
+    :param n_jobs: number of worker processes, all CPUs if `None`
+    :type n_jobs: int
+    :param encoding: file encoding
+    :type encoding: str
+    :return: chunk counts
+    :rtype: ChunkCounts
+    """
+    n_jobs = _n_jobs(n_jobs)
+    shards = file_shards(fp, n_jobs * SHARDS_PER_JOB, chunkcol, guesscol,
+                         delimiter, boundary, encoding)
+    n = len(shards)
+    with ProcessPoolExecutor(max_workers=n_jobs) as ex:
+        parts = ex.map(_count_range, [fp] * n, *zip(*shards),
+                       [chunkcol] * n, [guesscol] * n, [delimiter] * n,
+                       [boundary] * n, [encoding] * n)
+        return _merge(parts)
@@ -0,0 +1,231 @@
+"""Optional instrumentation of the evaluation pipeline.
+
+The evaluation functions wrap their stages (e.g. `df2chunkset`, `get_ncor`,
+span extraction and matching) in `stage` blocks. When no hook is registered
+`stage` returns a shared object that does nothing, so the instrumentation
+costs one function call per stage and nothing per token. When hooks are
+registered every stage emits one record, a flat dict ready for a metrics
+pipeline:
+
+    {'stage': 'get_ncor', 'start': 1700000000.0, 'seconds': 0.012,
+     'depth': 0, 'tokens': 47377, 'chunks': 41120,
+     'tokens_per_second': 3948083.3, 'peak_memory': 1048576}
+
+`tokens` and `chunks` are present for the stages that know them, and
+`peak_memory` (bytes allocated at the peak of the stage, above its start)
+while `tracemalloc` is tracing.
+
+Example:
+
+with Profile(memory=True) as prof:
+    evaluate_df(df, vectorized=False)
+print(prof.summary())
+"""
+import threading
+import time
+
+__author__ = 'Aleksandar Savkov'
+
+_hooks = []
+_local = threading.local()
+
+
+def add_hook(hook):
+    """Registers a callable that receives every stage record.
+
+    :param hook: callable taking a record dict
+    :type hook: callable
+    :return: the hook
+    :rtype: callable
+    """
+    _hooks.append(hook)
+    return hook
+
+
+def remove_hook(hook):
+    """Unregisters a hook added with `add_hook`.
+
+    :param hook: registered hook
+    :type hook: callable
+    """
+    _hooks.remove(hook)
+
+
+class _NullStage(object):
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def update(self, **fields):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def _tracemalloc():
+    import tracemalloc
+
+    return tracemalloc if tracemalloc.is_tracing() else None
+
+
+class _Stage(object):
+
+    __slots__ = ('name', 'fields', 'start', 'clock', 'memory', 'peak',
+                 'parent')
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+    def update(self, **fields):
+        self.fields.update(fields)
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1] if stack else None
+        stack.append(self)
+        tracemalloc = _tracemalloc()
+        if tracemalloc is not None:
+            current, peak = tracemalloc.get_traced_memory()
+            if self.parent is not None:
+                self.parent.peak = max(self.parent.peak, peak)
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            self.memory, self.peak = current, current
+        else:
+            self.memory = None
+        self.start = time.time()
+        self.clock = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.clock
+        _local.stack.pop()
+        record = {'stage': self.name, 'start': self.start,
+                  'seconds': seconds, 'depth': len(_local.stack)}
+        record.update(self.fields)
+        if exc[0] is not None:
+            record['error'] = exc[0].__name__
+        if 'tokens' in self.fields and seconds > 0:
+            record['tokens_per_second'] = self.fields['tokens'] / seconds
+        tracemalloc = _tracemalloc()
+        if tracemalloc is not None and self.memory is not None:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            record['peak_memory'] = self.peak - self.memory
+            if self.parent is not None and self.parent.memory is not None:
+                self.parent.peak = max(self.parent.peak, self.peak)
+        for hook in list(_hooks):
+            hook(record)
+        return False
+
+
+def stage(name, **fields):
+    """Context manager timing a stage of the pipeline. Counts known only at
+    the end of the stage can be added with `update`.
+
+    Example:
+
+    with stage('match', tokens=len(gold)) as st:
+        correct = match_spans(gold_spans, guess_spans)
+        st.update(chunks=len(gold_spans) + len(guess_spans))
+
+    :param name: stage name
+    :type name: str
+    :param fields: extra record fields, e.g. `tokens` or `chunks`
+    :type fields: dict
+    :return: stage context manager, a shared no-op one without hooks
+    :rtype: object
+    """
+    if not _hooks:
+        return _NULL_STAGE
+    return _Stage(name, fields)
+
+
+class Profile(object):
+    """Context manager collecting the stage records emitted by the code it
+    wraps.
+
+    :param memory: trace memory allocations with `tracemalloc` to record
+        the peak memory of every stage; this slows the code down
+    :type memory: bool
+    :param hook: callable that also receives every record, e.g. to forward
+        it to a metrics pipeline
+    :type hook: callable
+    """
+
+    def __init__(self, memory=False, hook=None):
+        self.memory = memory
+        self.hook = hook
+        self.records = []
+        self.seconds = 0.0
+        self._tracing = False
+        self._clock = None
+
+    def __enter__(self):
+        self.records = []
+        if self.memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._tracing = True
+        add_hook(self._add)
+        self._clock = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self._clock
+        remove_hook(self._add)
+        if self._tracing:
+            import tracemalloc
+            tracemalloc.stop()
+            self._tracing = False
+        return False
+
+    def _add(self, record):
+        self.records.append(record)
+        if self.hook is not None:
+            self.hook(record)
+
+    def summary(self):
+        """Totals of the records by stage: number of calls, wall time,
+        tokens, chunks and throughput, and the largest peak memory.
+
+        :return: totals by stage name, in order of first appearance
+        :rtype: dict
+        """
+        res = {}
+        for record in self.records:
+            itm = res.setdefault(record['stage'], {'calls': 0,
+                                                   'seconds': 0.0})
+            itm['calls'] += 1
+            itm['seconds'] += record['seconds']
+            for k in ('tokens', 'chunks'):
+                if k in record:
+                    itm[k] = itm.get(k, 0) + record[k]
+            if 'peak_memory' in record:
+                itm['peak_memory'] = max(itm.get('peak_memory', 0),
+                                         record['peak_memory'])
+        for itm in res.values():
+            if 'tokens' in itm and itm['seconds'] > 0:
+                itm['tokens_per_second'] = itm['tokens'] / itm['seconds']
+        return res
+
+    def write(self, fh):
+        """Writes the records as JSON lines.
+
+        :param fh: output file object
+        :type fh: file
+        """
+        import json
+
+        for record in self.records:
+            fh.write(json.dumps(record))
+            fh.write('\n')
@@ -0,0 +1,308 @@
+import numpy as np
+
+from .counts import ChunkCounts
+from .significance import fscores
+from .utils import AccuracyResults
+
+__author__ = 'Aleksandar Savkov'
+
+# correct, gold and guess chunks of one label
+COUNT_DTYPE = np.dtype([('correct', np.int64), ('gold', np.int64),
+                        ('guess', np.int64)])
+CSV_FIELDS = ('label',) + COUNT_DTYPE.names + ('precision', 'recall',
+                                               'fscore')
+
+
+def _matrix(counts):
+    return counts.view(np.int64).reshape(-1, 3)
+
+
+class CompactResults(object):
+    """Precision, recall and f-score by label and in total, stored as counts
+    in one NumPy structured array (`COUNT_DTYPE`) with a sorted label array
+    as its index. The scores are computed from the counts when they are
+    read, so a result takes 24 bytes per label, and results are merged by
+    adding their count arrays. Results built from the same label array
+    share it.
+
+    Reads work like `AccuracyResults`, e.g. `res['NP']['fscore']`,
+    `res[res.total]`, `keys()` or `items()`, and `to_dict` converts to an
+    `AccuracyResults` object.
+
+    :param labels: label of every count row
+    :type labels: list or np.ndarray
+    :param counts: correct, gold and guess counts of every label, as a
+        structured array or an array of shape (labels, 3)
+    :type counts: np.ndarray
+    :param do_round: round the scores to the second digit
+    :type do_round: bool
+    """
+
+    __slots__ = ('labels', 'counts', 'do_round')
+
+    _total_name = AccuracyResults._total_name
+
+    def __init__(self, labels, counts, do_round=True):
+        if not isinstance(labels, np.ndarray) or labels.dtype.kind != 'U':
+            labels = np.asarray(labels, dtype=str)
+        if labels.ndim != 1:
+            labels = labels.reshape(-1)
+        counts = np.asarray(counts)
+        if counts.dtype != COUNT_DTYPE:
+            counts = np.ascontiguousarray(counts, dtype=np.int64) \
+                .reshape(-1, 3).view(COUNT_DTYPE).reshape(-1)
+        if len(labels) != len(counts):
+            raise ValueError('Non-matching number of labels %s!=%s.' %
+                             (len(labels), len(counts)))
+        if len(labels) > 1 and not (labels[1:] > labels[:-1]).all():
+            labels, inv = np.unique(labels, return_inverse=True)
+            merged = np.zeros((len(labels), 3), dtype=np.int64)
+            np.add.at(merged, inv.reshape(-1), _matrix(counts))
+            counts = merged.view(COUNT_DTYPE).reshape(-1)
+        self.labels = labels
+        self.counts = counts
+        self.do_round = do_round
+
+    @classmethod
+    def from_counts(cls, counts, do_round=True):
+        """Results of chunk counts by type.
+
+        :param counts: chunk counts
+        :type counts: ChunkCounts
+        :param do_round: round the scores to the second digit
+        :type do_round: bool
+        :return: results
+        :rtype: CompactResults
+        """
+        labels = sorted(set(counts.gold) | set(counts.guess))
+        return cls(labels, [(counts.correct.get(k, 0), counts.gold.get(k, 0),
+                             counts.guess.get(k, 0)) for k in labels],
+                   do_round)
+
+    @property
+    def total(self):
+        """Name of total accuracy key in the results dictionary.
+        :return: total results key
+        :rtype: str
+        """
+        return self._total_name
+
+    @property
+    def nbytes(self):
+        """Memory held by the count and label arrays.
+        :rtype: int
+        """
+        return self.counts.nbytes + self.labels.nbytes
+
+    def totals(self):
+        """Overall numbers of correct, gold and guess chunks.
+
+        :rtype: tuple
+        """
+        return tuple(int(x) for x in _matrix(self.counts).sum(axis=0))
+
+    def scores(self):
+        """F-score, precision and recall of every label, in label order.
+
+        :return: f-score, precision and recall arrays
+        :rtype: tuple
+        """
+        res = fscores(_matrix(self.counts))
+        if self.do_round:
+            res = tuple(np.round(x, 2) for x in res)
+        return res
+
+    def _row(self, label):
+        if label == self._total_name:
+            return None
+        i = int(np.searchsorted(self.labels, label))
+        if i == len(self.labels) or self.labels[i] != label:
+            raise KeyError(label)
+        return i
+
+    def _item(self, row):
+        counts = self.totals() if row is None else _matrix(self.counts)[row]
+        f1, pre, rec = (float(x) for x in fscores(counts))
+        if self.do_round:
+            f1, pre, rec = round(f1, 2), round(pre, 2), round(rec, 2)
+        return {'precision': pre, 'recall': rec, 'fscore': f1}
+
+    def __getitem__(self, label):
+        return self._item(self._row(label))
+
+    def get(self, label, default=None):
+        try:
+            return self[label]
+        except KeyError:
+            return default
+
+    def __contains__(self, label):
+        try:
+            self._row(label)
+        except KeyError:
+            return False
+        return True
+
+    def __len__(self):
+        return len(self.labels) + 1
+
+    def keys(self):
+        """Labels in order followed by the total key.
+
+        :rtype: list
+        """
+        return self.labels.tolist() + [self._total_name]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def values(self):
+        return [self[k] for k in self.keys()]
+
+    def items(self):
+        """(label, scores) pairs, computed in one vectorized pass.
+
+        :rtype: list
+        """
+        f1, pre, rec = (x.tolist() for x in self.scores())
+        res = [(k, {'precision': p, 'recall': r, 'fscore': f})
+               for k, f, p, r in zip(self.labels.tolist(), f1, pre, rec)]
+        res.append((self._total_name, self._item(None)))
+        return res
+
+    def __eq__(self, other):
+        if not isinstance(other, CompactResults):
+            return NotImplemented
+        return np.array_equal(self.labels, other.labels) and \
+            np.array_equal(self.counts, other.counts)
+
+    def __ne__(self, other):
+        res = self.__eq__(other)
+        return res if res is NotImplemented else not res
+
+    def __add__(self, other):
+        if not isinstance(other, CompactResults):
+            return NotImplemented
+        if self.labels is other.labels or \
+                np.array_equal(self.labels, other.labels):
+            counts = _matrix(self.counts) + _matrix(other.counts)
+            return CompactResults(self.labels, counts, self.do_round)
+        return merge_results([self, other])
+
+    def __radd__(self, other):
+        # makes sum() start from 0
+        if other == 0:
+            return self
+        return NotImplemented
+
+    def to_counts(self):
+        """Chunk counts by label.
+
+        :rtype: ChunkCounts
+        """
+        labels = self.labels.tolist()
+        return ChunkCounts(*[{k: c for k, c in zip(labels, x) if c}
+                             for x in _matrix(self.counts).T.tolist()])
+
+    def to_dict(self):
+        """Converts to an `AccuracyResults` dict.
+
+        :rtype: AccuracyResults
+        """
+        res = AccuracyResults()
+        res.update(self.items())
+        return res
+
+    def to_json(self):
+        """Serialises the counts and scores of every label and the total as
+        JSON, readable by `from_json`.
+
+        :rtype: str
+        """
+        import json
+
+        matrix = _matrix(self.counts).tolist() + [list(self.totals())]
+        res = {}
+        for (k, itm), row in zip(self.items(), matrix):
+            itm.update(zip(COUNT_DTYPE.names, row))
+            res[k] = itm
+        return json.dumps(res)
+
+    @classmethod
+    def from_json(cls, s, do_round=True):
+        """Restores results serialised by `to_json`.
+
+        :param s: JSON string
+        :type s: str
+        :param do_round: round the scores to the second digit
+        :type do_round: bool
+        :rtype: CompactResults
+        """
+        import json
+
+        obj = json.loads(s)
+        obj.pop(cls._total_name, None)
+        labels = sorted(obj)
+        return cls(labels, [[obj[k][x] for x in COUNT_DTYPE.names]
+                            for k in labels], do_round)
+
+    def to_csv(self, fh):
+        """Writes the counts and scores of every label and the total as CSV.
+
+        :param fh: output file object
+        :type fh: file
+        """
+        import csv
+
+        writer = csv.writer(fh, lineterminator='\n')
+        writer.writerow(CSV_FIELDS)
+        matrix = _matrix(self.counts).tolist() + [list(self.totals())]
+        for (k, itm), row in zip(self.items(), matrix):
+            writer.writerow([k] + row + [itm['precision'], itm['recall'],
+                                         itm['fscore']])
+
+    def to_latex(self):
+        """Formats the results as the LaTeX table of `conlleval -l`.
+
+        :rtype: str
+        """
+        from .conlleval import report
+
+        return report(self.to_counts(), latex=True)
+
+    def __str__(self):
+        return str(self.to_dict())
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def merge_results(results, do_round=None):
+    """Adds up the counts of many results in one vectorized pass. Labels
+    missing from a result count as zero.
+
+    :param results: results to merge
+    :type results: list
+    :param do_round: round the scores of the merged results, like the first
+        result if `None`
+    :type do_round: bool
+    :return: merged results
+    :rtype: CompactResults
+    """
+    results = list(results)
+    if do_round is None:
+        do_round = results[0].do_round if results else True
+    if not results:
+        return CompactResults([], np.zeros((0, 3), dtype=np.int64), do_round)
+    first = results[0].labels
+    if all(r.labels is first or np.array_equal(r.labels, first)
+           for r in results):
+        merged = np.sum([_matrix(r.counts) for r in results], axis=0)
+        return CompactResults(first, merged, do_round)
+    labels, inv = np.unique(np.concatenate([r.labels for r in results]),
+                            return_inverse=True)
+    inv = inv.reshape(-1)
+    counts = np.concatenate([_matrix(r.counts) for r in results])
+    merged = np.stack([np.bincount(inv, counts[:, i], len(labels))
+                       for i in range(3)], axis=1).astype(np.int64)
+    return CompactResults(labels, merged, do_round)
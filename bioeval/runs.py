@@ -0,0 +1,148 @@
+import numpy as np
+
+from .counts import ChunkCounts
+from .significance import fscores
+
+__author__ = 'Aleksandar Savkov'
+
+METRICS = ('fscore', 'precision', 'recall')
+
+
+class RunCounts(object):
+    """Chunk counts of many evaluation runs, e.g. cross-validation folds or
+    training seeds, held in one integer array of shape (runs, labels, 3)
+    with the correct, gold and guess counts of every run and label.
+
+    All statistics are computed on the whole array at once. Micro scores
+    pool the counts of the labels of a run, macro scores average the scores
+    of the labels that occur in the run. Pooled scores are computed from the
+    counts summed over all runs.
+
+    :param counts: count array of shape (runs, labels, 3)
+    :type counts: np.ndarray
+    :param labels: chunk type names of the second axis
+    :type labels: list
+    """
+
+    __slots__ = ('counts', 'labels')
+
+    def __init__(self, counts, labels):
+        counts = np.asarray(counts, dtype=np.int64)
+        # without labels the size does not tell the number of runs
+        runs = len(counts) if not len(labels) else -1
+        self.counts = counts.reshape(runs, len(labels), 3)
+        self.labels = list(labels)
+
+    @classmethod
+    def from_counts(cls, runs):
+        """Collects the counts of many runs.
+
+        :param runs: chunk counts of every run
+        :type runs: list
+        :return: run counts
+        :rtype: RunCounts
+        """
+        runs = list(runs)
+        if not runs:
+            raise ValueError('No runs to collect.')
+        labels = sorted(set().union(*[set(r.gold) | set(r.guess)
+                                      for r in runs]))
+        return cls([[(r.correct.get(k, 0), r.gold.get(k, 0),
+                      r.guess.get(k, 0)) for k in labels] for r in runs],
+                   labels)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def micro(self):
+        """Micro-averaged f-score, precision and recall of every run.
+
+        :return: f-score, precision and recall arrays of shape (runs,)
+        :rtype: tuple
+        """
+        return fscores(self.counts.sum(axis=1))
+
+    def macro(self):
+        """Macro-averaged f-score, precision and recall of every run over
+        the labels with gold or guess chunks in the run.
+
+        :return: f-score, precision and recall arrays of shape (runs,)
+        :rtype: tuple
+        """
+        present = self.counts[..., 1:].sum(axis=2) > 0
+        n = np.maximum(present.sum(axis=1), 1)
+        return tuple((x * present).sum(axis=1) / n
+                     for x in fscores(self.counts))
+
+    def by_label(self):
+        """F-score, precision and recall of every run and label.
+
+        :return: f-score, precision and recall arrays of shape
+            (runs, labels)
+        :rtype: tuple
+        """
+        return fscores(self.counts)
+
+    def pooled(self, average='micro'):
+        """F-score, precision and recall of the counts summed over all runs.
+
+        :param average: `micro` or `macro`
+        :type average: str
+        :return: f-score, precision, recall
+        :rtype: tuple
+        """
+        pooled = RunCounts(self.counts.sum(axis=0), self.labels)
+        return tuple(float(x[0]) for x in pooled._scores(average))
+
+    def _scores(self, average):
+        if average == 'micro':
+            return self.micro()
+        if average == 'macro':
+            return self.macro()
+        raise ValueError('Unknown average %s.' % average)
+
+    def stats(self, average='micro', ddof=0):
+        """Mean, standard deviation, minimum and maximum over the runs and
+        the pooled value of the f-score, precision and recall.
+
+        :param average: `micro` or `macro`
+        :type average: str
+        :param ddof: delta degrees of freedom of the standard deviation
+        :type ddof: int
+        :return: statistics by metric name
+        :rtype: dict
+        """
+        scores = np.stack(self._scores(average))
+        pooled = self.pooled(average)
+        std = scores.std(axis=1, ddof=ddof) if len(self) > ddof \
+            else np.zeros(len(METRICS))
+        return {
+            m: {
+                'mean': float(scores[i].mean()),
+                'std': float(std[i]),
+                'min': float(scores[i].min()),
+                'max': float(scores[i].max()),
+                'pooled': pooled[i]
+            } for i, m in enumerate(METRICS)
+        }
+
+    def total(self):
+        """Counts summed over all runs.
+
+        :return: chunk counts
+        :rtype: ChunkCounts
+        """
+        pooled = self.counts.sum(axis=0).T.tolist()
+        return ChunkCounts(*[{k: c for k, c in zip(self.labels, x) if c}
+                             for x in pooled])
+
+    def results(self, do_round=True):
+        """Precision, recall and f-score by label and in total of the counts
+        summed over all runs.
+
+        :param do_round: round the results to the second digit
+        :type do_round: bool
+        :return: results by chunk type
+        :rtype: AccuracyResults
+        """
+        return self.total().results(do_round)
@@ -0,0 +1,237 @@
+import numpy as np
+
+from .spans import OUTSIDE_TAG, TagSet
+
+__author__ = 'Aleksandar Savkov'
+
+# tag prefix codes, X stands for a prefix that is not part of the scheme
+B, I, E, S, O, X = range(6)
+
+# scheme name -> tag prefix -> prefix code
+PREFIXES = {
+    'bio': {'B': B, 'I': I},
+    'iob1': {'B': B, 'I': I},
+    'bioes': {'B': B, 'I': I, 'E': E, 'S': S},
+    'bilou': {'B': B, 'I': I, 'L': E, 'U': S},
+}
+
+ALIASES = {
+    'iob2': 'bio',
+    'beiso': 'bioes',
+    'iobes': 'bioes',
+}
+
+
+def _bio(prev, cur, same):
+    if cur in (B, O):
+        return True, True
+    if cur == I:
+        if prev in (B, I) and same:
+            return False, True
+        return True, False
+    return True, False
+
+
+def _iob1(prev, cur, same):
+    inside = prev in (B, I) and same
+    if cur == O:
+        return True, True
+    if cur == I:
+        return not inside, True
+    if cur == B:
+        return True, inside
+    return True, False
+
+
+def _bioes(prev, cur, same):
+    closed = prev in (E, S, O)
+    if cur in (B, S, O):
+        return True, closed
+    if cur in (I, E):
+        if prev in (B, I) and same:
+            return False, True
+        return True, False
+    return True, False
+
+
+# scheme name -> transition rule (prev prefix, prefix, same type) ->
+# (opens a chunk or is outside, valid)
+RULES = {
+    'bio': _bio,
+    'iob1': _iob1,
+    'bioes': _bioes,
+    'bilou': _bioes,
+}
+
+
+def _compile(rule):
+    boundary = np.zeros((6, 6, 2), dtype=bool)
+    valid = np.zeros((6, 6, 2), dtype=bool)
+    for prev in range(6):
+        for cur in range(6):
+            for same in (0, 1):
+                boundary[prev, cur, same], valid[prev, cur, same] = \
+                    rule(prev, cur, bool(same))
+    return boundary, valid
+
+
+class Scheme(object):
+    """Decoder of a chunk tagging scheme: BIO (IOB2), IOB1, BIOES (BEISO)
+    or BILOU.
+
+    Tags are split once per vocabulary entry into an integer prefix code and
+    a type id, and every token is decoded with a lookup in a transition
+    table compiled from the rules of the scheme. A token opens a new chunk
+    depending on the prefix of the previous and the current tag and on
+    whether their types are equal, e.g. in BIO `I-NP` after `B-VP` opens a
+    new chunk.
+
+    In strict mode ill-formed transitions raise a `ValueError`. In repair
+    mode they open a new chunk, like in conlleval, and chunks that are not
+    closed properly end where the next chunk starts.
+
+    :param name: scheme name
+    :type name: str
+    :param strict: raise on ill-formed tag sequences
+    :type strict: bool
+    """
+
+    __slots__ = ('name', 'strict', '_prefixes', '_boundary', '_valid',
+                 '_codes', '_cache')
+
+    def __init__(self, name='bio', strict=False):
+        name = ALIASES.get(name.lower(), name.lower())
+        if name not in RULES:
+            raise ValueError('Unknown tagging scheme %s.' % name)
+        self.name = name
+        self.strict = strict
+        self._prefixes = PREFIXES[name]
+        self._boundary, self._valid = _compile(RULES[name])
+        self._codes = (None, 0, None)
+        self._cache = {}
+
+    def __repr__(self):
+        return 'Scheme(%r, strict=%r)' % (self.name, self.strict)
+
+    def _prefix(self, tag):
+        if tag == OUTSIDE_TAG:
+            return O
+        prefix, sep, _ = tag.partition('-')
+        return self._prefixes.get(prefix, X) if sep else X
+
+    def _tag_codes(self, tagset):
+        owner, n, codes = self._codes
+        if owner is not tagset or n != len(tagset):
+            codes = (
+                np.array([self._prefix(t) for t in tagset.tags],
+                         dtype=np.int64),
+                tagset.type_ids
+            )
+            self._codes = (tagset, len(tagset), codes)
+        return codes
+
+    def boundaries(self, ids, tagset, breaks=None):
+        """Marks the tokens that open a new chunk or are outside of any
+        chunk.
+
+        :param ids: tag ids
+        :type ids: np.ndarray
+        :param tagset: tag vocabulary of the ids
+        :type tagset: TagSet
+        :param breaks: mask of tokens that always open a chunk, e.g. the
+            first tokens of sentences
+        :type breaks: np.ndarray
+        :return: boolean mask over the tokens
+        :rtype: np.ndarray
+        """
+        prefixes, type_ids = self._tag_codes(tagset)
+        cur, typ = prefixes[ids], type_ids[ids]
+        prev = np.empty_like(cur)
+        prev[:1] = O
+        prev[1:] = cur[:-1]
+        if breaks is not None:
+            prev[breaks] = O
+        same = np.zeros(len(typ), dtype=np.int64)
+        same[1:] = typ[1:] == typ[:-1]
+        if self.strict:
+            valid = self._valid[prev, cur, same]
+            # chunks must be closed at the end and before every break
+            last = np.zeros(len(cur), dtype=bool)
+            last[-1:] = True
+            if breaks is not None:
+                last[:-1] |= breaks[1:]
+            valid[last] &= self._valid[cur[last], O, 0]
+            if not valid.all():
+                pos = int(np.argmin(valid))
+                raise ValueError('Ill-formed %s tag %s at token %d.' %
+                                 (self.name, tagset.tags[ids[pos]], pos))
+        return self._boundary[prev, cur, same]
+
+    def is_boundary(self, prev_tag, tag):
+        """Checks if a token opens a new chunk or is outside of any chunk,
+        given the tag of the previous token in the sentence.
+
+        :param prev_tag: previous tag, `None` at the start of a sentence
+        :type prev_tag: str
+        :param tag: current tag, `None` at the end of a sentence
+        :type tag: str
+        :return: chunk boundary
+        :rtype: bool
+        """
+        prev, prev_type = self._code(prev_tag)
+        cur, typ = self._code(tag)
+        same = int(prev_type == typ)
+        if self.strict and not self._valid[prev, cur, same]:
+            raise ValueError('Ill-formed %s transition %s -> %s.' %
+                             (self.name, prev_tag, tag))
+        return bool(self._boundary[prev, cur, same])
+
+    def _code(self, tag):
+        if tag is None:
+            return O, None
+        code = self._cache.get(tag)
+        if code is None:
+            code = self._prefix(tag), tag.partition('-')[2]
+            self._cache[tag] = code
+        return code
+
+
+def get_scheme(scheme):
+    """Returns a `Scheme` for a scheme name, or the argument itself.
+
+    :param scheme: scheme name or object, or `None`
+    :type scheme: str or Scheme
+    :return: scheme or `None`
+    :rtype: Scheme
+    """
+    if scheme is None or isinstance(scheme, Scheme):
+        return scheme
+    return Scheme(scheme)
+
+
+def decode_tags(gold_tags, guess_tags, scheme, breaks=None):
+    """Encodes aligned gold and guess tag sequences with a shared `TagSet`
+    and decodes their chunk boundaries with a tagging scheme.
+
+    :param gold_tags: gold tag sequence
+    :type gold_tags: list or np.ndarray
+    :param guess_tags: guess tag sequence
+    :type guess_tags: list or np.ndarray
+    :param scheme: scheme name or object
+    :type scheme: str or Scheme
+    :param breaks: mask of tokens that always open a chunk, e.g. the first
+        tokens of sentences
+    :type breaks: np.ndarray
+    :return: gold tag ids, guess tag ids, tag vocabulary, gold boundaries
+        and guess boundaries
+    :rtype: tuple
+    """
+    scheme = get_scheme(scheme)
+    tagset = TagSet()
+    gold = tagset.encode(gold_tags)
+    guess = tagset.encode(guess_tags)
+    if len(gold) != len(guess):
+        raise ValueError('Non-matching number of tags %s!=%s.' %
+                         (len(gold), len(guess)))
+    return gold, guess, tagset, scheme.boundaries(gold, tagset, breaks), \
+        scheme.boundaries(guess, tagset, breaks)
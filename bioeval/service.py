@@ -0,0 +1,695 @@
+"""Asynchronous evaluation service for monitoring taggers online.
+
+`EvalService` runs inside an asyncio event loop. Producers submit aligned
+(gold, guess) sentence pairs to a named stream and await the counts of their
+sentence. Pending sentences are collected into micro-batches, of at most
+`max_batch` sentences or whatever arrived within `max_delay` seconds, and
+every batch is chunked and scored in one vectorized pass in an executor, so
+the event loop is never blocked by the scoring. Running counts are kept for
+every stream.
+
+`EvalServer` exposes a service over TCP with one JSON object per line, and
+answers `GET /health` and `GET /metrics` requests with JSON, e.g. for a load
+balancer or a monitoring probe. `EvalClient` is the asynchronous client of
+the server and `LocalClient` offers the same API in-process, without a
+network.
+
+Example:
+
+service = EvalService()
+await service.start()
+client = LocalClient(service)
+counts = await client.score('tagger-a', ['B-NP', 'I-NP'], ['B-NP', 'O'])
+print(await client.metrics())
+await service.stop()
+"""
+import asyncio
+import json
+import time
+
+from itertools import chain
+
+import numpy as np
+
+from .counts import ChunkCounts
+from .online import WindowedEvaluator
+from .spans import TagSet, aligned_matches, match_spans
+
+__author__ = 'Aleksandar Savkov'
+
+# default maximum number of sentences in a batch
+MAX_BATCH = 256
+# default time in seconds a batch waits for more sentences
+MAX_DELAY = 0.005
+# default TCP port of the server
+PORT = 8765
+# maximum size of a request line in bytes
+LINE_LIMIT = 2 ** 24
+
+# asyncio.get_running_loop needs Python 3.7
+_running_loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)
+
+
+def count_batch(gold_sents, guess_sents, scheme=None):
+    """Counts the chunks of every sentence of a batch in one pass. The
+    sentences are concatenated and chunks are cut at the sentence starts.
+
+    :param gold_sents: gold tags of every sentence
+    :type gold_sents: list
+    :param guess_sents: guess tags of every sentence
+    :type guess_sents: list
+    :param scheme: tagging scheme object or `None`
+    :type scheme: Scheme
+    :return: chunk counts of every sentence
+    :rtype: list
+    """
+    lengths = np.array([len(x) for x in gold_sents], dtype=np.int64)
+    for n, guess in zip(lengths.tolist(), guess_sents):
+        if n != len(guess):
+            raise ValueError('Non-matching number of tags %s!=%s.' %
+                             (n, len(guess)))
+    if not lengths.sum():
+        return [ChunkCounts() for _ in gold_sents]
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    tagset = TagSet()
+    gold = tagset.encode(list(chain.from_iterable(gold_sents)))
+    guess = tagset.encode(list(chain.from_iterable(guess_sents)))
+    breaks = np.zeros(len(gold), dtype=bool)
+    breaks[offsets[:-1][lengths > 0]] = True
+    if scheme is None:
+        gold_spans = tagset.spans(gold, breaks)
+        guess_spans = tagset.spans(guess, breaks)
+        correct = aligned_matches(gold, guess, gold_spans, tagset, breaks)
+    else:
+        gold_spans = tagset.spans(gold, scheme.boundaries(gold, tagset,
+                                                          breaks))
+        guess_spans = tagset.spans(guess, scheme.boundaries(guess, tagset,
+                                                            breaks))
+        correct = match_spans(gold_spans, guess_spans)
+
+    nsent = len(lengths)
+    types, tags = tagset.types, tagset.tags
+
+    def _by_sentence(sent, ids, k):
+        return np.bincount(sent * k + ids, minlength=nsent * k) \
+            .reshape(nsent, k).tolist()
+
+    def _span_counts(spans):
+        sent = np.searchsorted(offsets, spans[:, 0], 'right') - 1
+        return _by_sentence(sent, spans[:, 2], len(types))
+
+    token_sent = np.repeat(np.arange(nsent), lengths)
+    same = gold == guess
+    tables = [
+        (types, _span_counts(gold_spans[correct])),
+        (types, _span_counts(gold_spans)),
+        (types, _span_counts(guess_spans)),
+        (tags, _by_sentence(token_sent[same], gold[same], len(tags))),
+        (tags, _by_sentence(token_sent, gold, len(tags)))
+    ]
+    return [ChunkCounts(*[{k: c for k, c in zip(names, rows[i]) if c}
+                          for names, rows in tables])
+            for i in range(nsent)]
+
+
+def counts_to_json(counts):
+    """Serialises chunk counts as a JSON-compatible dict.
+
+    :param counts: chunk counts
+    :type counts: ChunkCounts
+    :return: dict of the count dicts
+    :rtype: dict
+    """
+    return {k: getattr(counts, k) for k in ChunkCounts.__slots__}
+
+
+def counts_from_json(obj):
+    """Restores chunk counts serialised by `counts_to_json`.
+
+    :param obj: dict of the count dicts
+    :type obj: dict
+    :return: chunk counts
+    :rtype: ChunkCounts
+    """
+    return ChunkCounts(**obj)
+
+
+class _Stream(object):
+
+    __slots__ = ('counts', 'sentences', 'tokens', 'window')
+
+    def __init__(self, window_size=None, window_seconds=None):
+        self.counts = ChunkCounts()
+        self.sentences = 0
+        self.tokens = 0
+        if window_size is None and window_seconds is None:
+            self.window = None
+        else:
+            self.window = WindowedEvaluator(window_size, window_seconds)
+
+
+class EvalService(object):
+    """Micro-batching chunk evaluator with running counts by stream.
+
+    :param scheme: tagging scheme name or `bioeval.schemes.Scheme`; by
+        default chunks start on B, O and S tags
+    :type scheme: str or Scheme
+    :param max_batch: maximum number of sentences scored at once
+    :type max_batch: int
+    :param max_delay: time in seconds a batch waits for more sentences
+    :type max_delay: float
+    :param executor: executor of the scoring, the default executor of the
+        event loop if `None`
+    :type executor: concurrent.futures.Executor
+    :param window_size: also score the last `window_size` sentences of
+        every stream
+    :type window_size: int
+    :param window_seconds: also score the sentences of the last
+        `window_seconds` seconds of every stream
+    :type window_seconds: float
+    """
+
+    def __init__(self, scheme=None, max_batch=MAX_BATCH, max_delay=MAX_DELAY,
+                 executor=None, window_size=None, window_seconds=None):
+        if scheme is not None:
+            from .schemes import get_scheme
+            scheme = get_scheme(scheme)
+        self.scheme = scheme
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.executor = executor
+        self.window_size = window_size
+        self.window_seconds = window_seconds
+        self.streams = {}
+        self.batches = 0
+        self.sentences = 0
+        self.tokens = 0
+        self.errors = 0
+        self.busy = 0.0
+        self._queue = None
+        self._task = None
+        self._started = None
+
+    @property
+    def running(self):
+        """Whether the service accepts sentences.
+        :rtype: bool
+        """
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """Starts the batching task in the running event loop.
+        """
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.ensure_future(self._run())
+            self._started = time.time()
+
+    async def stop(self):
+        """Scores the pending sentences and stops the batching task.
+        """
+        if self._task is None:
+            return
+        if not self._task.done():
+            await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def score(self, stream, gold_tags, guess_tags):
+        """Scores a sentence and adds its counts to a stream.
+
+        :param stream: stream name, e.g. a producer or model id
+        :type stream: str
+        :param gold_tags: gold tags of the sentence
+        :type gold_tags: list
+        :param guess_tags: guess tags of the sentence
+        :type guess_tags: list
+        :return: chunk counts of the sentence
+        :rtype: ChunkCounts
+        """
+        if not self.running:
+            raise RuntimeError('The evaluation service is not running.')
+        if not isinstance(stream, str):
+            raise ValueError('Stream names are strings, not %s.' %
+                             type(stream).__name__)
+        if len(gold_tags) != len(guess_tags):
+            raise ValueError('Non-matching number of tags %s!=%s.' %
+                             (len(gold_tags), len(guess_tags)))
+        future = _running_loop().create_future()
+        self._queue.put_nowait((stream, gold_tags, guess_tags, future))
+        return await future
+
+    async def _run(self):
+        loop = _running_loop()
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(),
+                                                        timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                results = await self._count(batch)
+                self._apply(batch, results)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _count(self, batch):
+        loop = _running_loop()
+        start = time.time()
+        try:
+            return await loop.run_in_executor(
+                self.executor, count_batch, [x[1] for x in batch],
+                [x[2] for x in batch], self.scheme
+            )
+        except Exception as e:
+            if len(batch) == 1:
+                return [e]
+        finally:
+            self.busy += time.time() - start
+        # score one by one, so that only the bad sentences fail
+        results = []
+        for item in batch:
+            results.extend(await self._count([item]))
+        return results
+
+    def _apply(self, batch, results):
+        self.batches += 1
+        for item, res in zip(batch, results):
+            future = item[3]
+            try:
+                if isinstance(res, Exception):
+                    raise res
+                self._add(item[0], item[1], res)
+            except Exception as e:
+                # one bad sentence must not stop the batching loop
+                self.errors += 1
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            if not future.done():
+                future.set_result(res)
+
+    def _add(self, stream, gold_tags, res):
+        st = self.streams.get(stream)
+        if st is None:
+            st = self.streams[stream] = _Stream(self.window_size,
+                                                self.window_seconds)
+        st.counts.update(res)
+        if st.window is not None:
+            st.window.add(res, len(gold_tags))
+        st.sentences += 1
+        st.tokens += len(gold_tags)
+        self.sentences += 1
+        self.tokens += len(gold_tags)
+
+    def counts(self, stream=None):
+        """Running counts of a stream, or of all streams.
+
+        :param stream: stream name, all streams if `None`
+        :type stream: str
+        :return: chunk counts
+        :rtype: ChunkCounts
+        """
+        if stream is not None:
+            st = self.streams.get(stream)
+            return st.counts + ChunkCounts() if st else ChunkCounts()
+        total = ChunkCounts()
+        for st in self.streams.values():
+            total.update(st.counts)
+        return total
+
+    def health(self):
+        """Liveness of the service.
+
+        :return: status, uptime in seconds and number of pending sentences
+        :rtype: dict
+        """
+        return {
+            'status': 'ok' if self.running else 'stopped',
+            'uptime': time.time() - self._started if self._started else 0.0,
+            'pending': self._queue.qsize() if self._queue else 0
+        }
+
+    def metrics(self, do_round=True):
+        """Throughput of the service and running (and window) scores of
+        every stream.
+
+        :param do_round: round the scores to the second digit
+        :type do_round: bool
+        :return: service and stream metrics
+        :rtype: dict
+        """
+        res = self.health()
+        res.update({
+            'batches': self.batches,
+            'sentences': self.sentences,
+            'tokens': self.tokens,
+            'errors': self.errors,
+            'mean_batch': self.sentences / self.batches if self.batches
+            else 0.0,
+            'busy': self.busy,
+            'streams': {}
+        })
+        for name, st in self.streams.items():
+            f1, pr, re = st.counts.scores(do_round)
+            correct, gold, guess = st.counts.total
+            res['streams'][name] = {
+                'sentences': st.sentences, 'tokens': st.tokens,
+                'correct': correct, 'gold': gold, 'guess': guess,
+                'precision': pr, 'recall': re, 'fscore': f1
+            }
+            if st.window is not None:
+                f1, pr, re = st.window.result(do_round)
+                res['streams'][name]['window'] = {
+                    'sentences': len(st.window), 'tokens': st.window.tokens,
+                    'precision': pr, 'recall': re, 'fscore': f1
+                }
+        return res
+
+
+class LocalClient(object):
+    """In-process client of an `EvalService` with the API of `EvalClient`,
+    e.g. for tests or for producers running in the same event loop.
+
+    :param service: evaluation service
+    :type service: EvalService
+    """
+
+    def __init__(self, service):
+        self.service = service
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def score(self, stream, gold_tags, guess_tags):
+        """Scores a sentence, see `EvalService.score`.
+
+        :return: chunk counts of the sentence
+        :rtype: ChunkCounts
+        """
+        return await self.service.score(stream, list(gold_tags),
+                                        list(guess_tags))
+
+    async def counts(self, stream=None):
+        """Running counts of a stream, or of all streams.
+
+        :rtype: ChunkCounts
+        """
+        return self.service.counts(stream)
+
+    async def health(self):
+        """Liveness of the service.
+
+        :rtype: dict
+        """
+        return self.service.health()
+
+    async def metrics(self):
+        """Throughput of the service and scores of every stream.
+
+        :rtype: dict
+        """
+        return self.service.metrics()
+
+    async def close(self):
+        """Nothing to release in-process.
+        """
+
+
+def _http_response(status, obj):
+    body = json.dumps(obj).encode('utf-8')
+    head = 'HTTP/1.0 %s\r\nContent-Type: application/json\r\n' \
+           'Content-Length: %d\r\n\r\n' % (status, len(body))
+    return head.encode('ascii') + body
+
+
+class EvalServer(object):
+    """TCP front end of an `EvalService`.
+
+    Requests and responses are JSON objects, one per line. A request has an
+    `id`, an `op` (`score`, `counts`, `health` or `metrics`) and the
+    arguments of the operation; the response echoes the `id` with either a
+    `result` or an `error`. Requests of a connection are handled
+    concurrently, so a client can pipeline sentences into one batch.
+
+    Connections that start with an HTTP `GET` line are answered once with
+    the health (`/health`) or the metrics (`/metrics`) of the service.
+
+    :param service: evaluation service
+    :type service: EvalService
+    :param host: host name or address to listen on
+    :type host: str
+    :param port: port to listen on, any free port if 0
+    :type port: int
+    """
+
+    def __init__(self, service, host='127.0.0.1', port=PORT):
+        self.service = service
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        """Starts the service and listens for connections.
+        """
+        await self.service.start()
+        self._server = await asyncio.start_server(
+            self._handle, self.host, self.port, limit=LINE_LIMIT
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Stops listening and stops the service.
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        await self.service.stop()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def _handle(self, reader, writer):
+        lock = asyncio.Lock()
+        tasks = []
+        error = None
+        try:
+            line = await reader.readline()
+            if line.startswith(b'GET '):
+                await self._http(line, reader, writer)
+                return
+            while line:
+                tasks.append(asyncio.ensure_future(
+                    self._reply(line, writer, lock)))
+                line = await reader.readline()
+        except (ValueError, asyncio.LimitOverrunError) as e:
+            # the line is over the stream limit, the rest cannot be read
+            error = {'id': None, 'error': 'Request too long: %s' % e}
+        if tasks:
+            await asyncio.wait(tasks)
+        if error is not None:
+            writer.write(json.dumps(error).encode('utf-8') + b'\n')
+            async with lock:
+                try:
+                    await writer.drain()
+                except OSError:
+                    pass
+        writer.close()
+
+    async def _http(self, line, reader, writer):
+        while (await reader.readline()).strip():
+            pass
+        path = line.split()[1].decode('ascii', 'replace')
+        if path == '/health':
+            writer.write(_http_response('200 OK', self.service.health()))
+        elif path == '/metrics':
+            writer.write(_http_response('200 OK', self.service.metrics()))
+        else:
+            writer.write(_http_response('404 Not Found',
+                                        {'error': 'Unknown path %s.' % path}))
+        await writer.drain()
+        writer.close()
+
+    async def _call(self, req):
+        op = req.get('op')
+        service = self.service
+        if op == 'score':
+            return counts_to_json(await service.score(
+                req['stream'], req['gold'], req['guess']))
+        if op == 'counts':
+            return counts_to_json(service.counts(req.get('stream')))
+        if op == 'health':
+            return service.health()
+        if op == 'metrics':
+            return service.metrics()
+        raise ValueError('Unknown operation %s.' % op)
+
+    async def _reply(self, line, writer, lock):
+        req = {}
+        try:
+            req = json.loads(line.decode('utf-8'))
+            res = {'id': req.get('id'), 'result': await self._call(req)}
+        except (AttributeError, KeyError, TypeError, ValueError,
+                RuntimeError) as e:
+            res = {'id': req.get('id') if isinstance(req, dict) else None,
+                   'error': str(e)}
+        writer.write(json.dumps(res).encode('utf-8') + b'\n')
+        async with lock:
+            await writer.drain()
+
+
+class EvalClient(object):
+    """Asynchronous client of an `EvalServer`. Calls can be awaited
+    concurrently; they share one connection and are matched to their
+    responses by id.
+
+    :param host: server host name or address
+    :type host: str
+    :param port: server port
+    :type port: int
+    """
+
+    def __init__(self, host='127.0.0.1', port=PORT):
+        self.host = host
+        self.port = port
+        self._reader = None
+        self._writer = None
+        self._task = None
+        self._lock = None
+        self._pending = {}
+        self._next_id = 0
+
+    async def connect(self):
+        """Opens the connection to the server.
+        """
+        self._reader, self._writer = await asyncio.open_connection(
+            self.host, self.port, limit=LINE_LIMIT
+        )
+        self._lock = asyncio.Lock()
+        self._task = asyncio.ensure_future(self._read())
+
+    async def close(self):
+        """Closes the connection.
+        """
+        if self._writer is not None:
+            self._writer.close()
+            await self._task
+            self._writer = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _read(self):
+        error = ConnectionError('Connection closed.')
+        while True:
+            try:
+                line = await self._reader.readline()
+            except (OSError, ValueError):
+                line = b''
+            if not line:
+                break
+            try:
+                res = json.loads(line.decode('utf-8'))
+                future = self._pending.pop(res['id'], None)
+            except (KeyError, TypeError, ValueError) as e:
+                error = ValueError('Malformed response: %s' % e)
+                self._writer.close()
+                break
+            if future is None or future.done():
+                continue
+            if 'error' in res:
+                future.set_exception(ValueError(res['error']))
+            else:
+                future.set_result(res.get('result'))
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending = {}
+
+    async def _call(self, op, **kwargs):
+        if self._writer is None:
+            raise RuntimeError('The client is not connected.')
+        if self._task.done():
+            raise ConnectionError('Connection closed.')
+        self._next_id += 1
+        kwargs.update(id=self._next_id, op=op)
+        future = _running_loop().create_future()
+        self._pending[self._next_id] = future
+        self._writer.write(json.dumps(kwargs).encode('utf-8') + b'\n')
+        async with self._lock:
+            await self._writer.drain()
+        return await future
+
+    async def score(self, stream, gold_tags, guess_tags):
+        """Scores a sentence, see `EvalService.score`.
+
+        :param stream: stream name
+        :type stream: str
+        :param gold_tags: gold tags of the sentence
+        :type gold_tags: list
+        :param guess_tags: guess tags of the sentence
+        :type guess_tags: list
+        :return: chunk counts of the sentence
+        :rtype: ChunkCounts
+        """
+        return counts_from_json(await self._call(
+            'score', stream=stream, gold=list(gold_tags),
+            guess=list(guess_tags)))
+
+    async def counts(self, stream=None):
+        """Running counts of a stream, or of all streams.
+
+        :param stream: stream name, all streams if `None`
+        :type stream: str
+        :rtype: ChunkCounts
+        """
+        return counts_from_json(await self._call('counts', stream=stream))
+
+    async def health(self):
+        """Liveness of the service.
+
+        :rtype: dict
+        """
+        return await self._call('health')
+
+    async def metrics(self):
+        """Throughput of the service and scores of every stream.
+
+        :rtype: dict
+        """
+        return await self._call('metrics')
@@ -0,0 +1,196 @@
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+
+from .conll import BOUNDARY, ChunkStream, count_conll
+
+__author__ = 'Aleksandar Savkov'
+
+# number of resamples generated from one seed, the unit of work of a worker
+BLOCK_SIZE = 1000
+# maximum number of elements in a resampling matrix held in memory
+MAX_ELEMENTS = 2 ** 22
+
+
+class _SentenceStream(ChunkStream):
+    # chunk stream that also keeps the counts of every non-empty sentence
+
+    __slots__ = ('rows', '_last')
+
+    def __init__(self):
+        super(_SentenceStream, self).__init__()
+        self.rows = []
+        self._last = (0, 0, 0)
+
+    def boundary(self):
+        empty = self._fresh
+        super(_SentenceStream, self).boundary()
+        if not empty:
+            total = self.total
+            self.rows.append([x - y for x, y in zip(total, self._last)])
+            self._last = total
+
+
+def sentence_counts(sentences):
+    """Counts the correct, gold and guess chunks of every sentence. Empty
+    sentences are skipped, like in `conll_sentence_counts`.
+
+    :param sentences: iterable of (gold tags, guess tags) pairs
+    :type sentences: iterable
+    :return: count array of shape (n, 3)
+    :rtype: np.ndarray
+    """
+    stream = _SentenceStream()
+    for gold_tags, guess_tags in sentences:
+        for gold_tag, guess_tag in zip(gold_tags, guess_tags):
+            stream.feed(gold_tag, guess_tag)
+        stream.boundary()
+    return np.array(stream.rows, dtype=np.int64).reshape(-1, 3)
+
+
+def conll_sentence_counts(lines, chunkcol=-2, guesscol=-1, delimiter=None,
+                          boundary=BOUNDARY):
+    """Counts the correct, gold and guess chunks of every sentence in
+    CoNLL-formatted lines, read like in `bioeval.conll.count_conll`.
+
+    :param lines: iterable of lines, e.g. an open file
+    :type lines: iterable
+    :param chunkcol: gold tag column index
+    :type chunkcol: int
+    :param guesscol: guess tag column index
+    :type guesscol: int
+    :param delimiter: column delimiter, any whitespace by default
+    :type delimiter: str
+    :param boundary: sentence boundary marker in the first column
+    :type boundary: str
+    :return: count array of shape (n, 3)
+    :rtype: np.ndarray
+    """
+    stream = count_conll(lines, chunkcol, guesscol, delimiter, boundary,
+                         stream=_SentenceStream())
+    return np.array(stream.rows, dtype=np.int64).reshape(-1, 3)
+
+
+def fscores(counts):
+    """Calculates f-score, precision and recall for an array of summed
+    counts.
+
+    :param counts: count array of shape (..., 3)
+    :type counts: np.ndarray
+    :return: f-score, precision and recall arrays
+    :rtype: tuple
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    correct, gold, guess = counts[..., 0], counts[..., 1], counts[..., 2]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(guess > 0, correct / guess, 0.0)
+        recall = np.where(gold > 0, correct / gold, 0.0)
+        f1 = np.where(precision + recall > 0,
+                      2 * precision * recall / (precision + recall), 0.0)
+    return 100 * f1, 100 * precision, 100 * recall
+
+
+def _blocks(n_resamples, seed):
+    sizes = [BLOCK_SIZE] * (n_resamples // BLOCK_SIZE)
+    if n_resamples % BLOCK_SIZE:
+        sizes.append(n_resamples % BLOCK_SIZE)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    return sizes, seeds
+
+
+def _run(func, counts, n_resamples, seed, n_jobs):
+    sizes, seeds = _blocks(n_resamples, seed)
+    n = len(sizes)
+    if n_jobs == 1:
+        parts = map(func, [counts] * n, sizes, seeds)
+        return np.concatenate(list(parts))
+    with ProcessPoolExecutor(max_workers=n_jobs) as ex:
+        parts = ex.map(func, [counts] * n, sizes, seeds)
+        return np.concatenate(list(parts))
+
+
+def _bootstrap_block(counts, size, seed):
+    rng = np.random.default_rng(seed)
+    m = len(counts)
+    batch = max(1, MAX_ELEMENTS // max(m, 1))
+    res = []
+    for i in range(0, size, batch):
+        n = min(batch, size - i)
+        # sentence weights of every resample as counts of the drawn indices
+        idx = rng.integers(0, m, (n, m)) + m * np.arange(n)[:, None]
+        weights = np.bincount(idx.ravel(), minlength=n * m).reshape(n, m)
+        res.append(fscores(weights @ counts)[0])
+    return np.concatenate(res)
+
+
+def bootstrap(counts, n_resamples=1000, alpha=0.05, seed=None, n_jobs=1):
+    """Bootstrap confidence interval of the f-score. Sentences are resampled
+    with replacement as integer weights over the per-sentence count vectors,
+    so a batch of resamples costs a single matrix product.
+
+    :param counts: per-sentence count array of shape (n, 3)
+    :type counts: np.ndarray
+    :param n_resamples: number of resamples
+    :type n_resamples: int
+    :param alpha: significance level of the interval
+    :type alpha: float
+    :param seed: random seed
+    :type seed: int
+    :param n_jobs: number of worker processes, all CPUs if `None`
+    :type n_jobs: int
+    :return: f-score, lower and upper bound of the interval
+    :rtype: tuple
+    """
+    counts = np.asarray(counts, dtype=np.int64).reshape(-1, 3)
+    if not len(counts):
+        raise ValueError('Bootstrap needs the counts of at least one '
+                         'sentence.')
+    f1s = _run(_bootstrap_block, counts, n_resamples, seed, n_jobs)
+    low, high = np.percentile(f1s, [50 * alpha, 100 - 50 * alpha])
+    return float(fscores(counts.sum(axis=0))[0]), float(low), float(high)
+
+
+def _permutation_block(counts, size, seed):
+    rng = np.random.default_rng(seed)
+    m = len(counts)
+    a, b = counts[:, 0], counts[:, 1]
+    delta = (b - a).astype(np.float64)
+    total_a, total_b = a.sum(axis=0), b.sum(axis=0)
+    batch = max(1, MAX_ELEMENTS // max(m, 1))
+    res = []
+    for i in range(0, size, batch):
+        swap = rng.random((min(batch, size - i), m)) < 0.5
+        moved = swap @ delta
+        res.append(np.abs(fscores(total_a + moved)[0] -
+                          fscores(total_b - moved)[0]))
+    return np.concatenate(res)
+
+
+def paired_test(counts_a, counts_b, n_resamples=10000, seed=None, n_jobs=1):
+    """Paired approximate randomization test of the f-score difference of
+    two systems on the same sentences. Every resample swaps the outputs of
+    the systems on a random subset of sentences.
+
+    :param counts_a: per-sentence count array of the first system
+    :type counts_a: np.ndarray
+    :param counts_b: per-sentence count array of the second system
+    :type counts_b: np.ndarray
+    :param n_resamples: number of resamples
+    :type n_resamples: int
+    :param seed: random seed
+    :type seed: int
+    :param n_jobs: number of worker processes, all CPUs if `None`
+    :type n_jobs: int
+    :return: f-score difference (b - a) and p-value
+    :rtype: tuple
+    """
+    counts_a = np.asarray(counts_a, dtype=np.int64).reshape(-1, 3)
+    counts_b = np.asarray(counts_b, dtype=np.int64).reshape(-1, 3)
+    if counts_a.shape != counts_b.shape:
+        raise ValueError('Non-matching number of sentences %s!=%s.' %
+                         (len(counts_a), len(counts_b)))
+    diff = fscores(counts_b.sum(axis=0))[0] - fscores(counts_a.sum(axis=0))[0]
+    stats = _run(_permutation_block, np.stack((counts_a, counts_b), axis=1),
+                 n_resamples, seed, n_jobs)
+    p_value = (np.sum(stats >= abs(diff) - 1e-9) + 1.0) / (n_resamples + 1)
+    return float(diff), float(p_value)
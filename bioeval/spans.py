@@ -0,0 +1,308 @@
+import numpy as np
+
+from .utils import OUTSIDE_TAG, START_PREFIXES
+
+__author__ = 'Aleksandar Savkov'
+
+
+class TagSet(object):
+    """Vocabulary of chunk tags used to encode tag sequences as integer
+    arrays. The vocabulary grows as new tags are encoded, so the same object
+    can be shared by the gold and the guess side of an evaluation.
+
+    Per-tag properties (chunk start, outside, chunk type) are computed once
+    on the vocabulary and broadcast to the tokens through the tag ids.
+    """
+
+    def __init__(self, tags=()):
+        self.tags = []
+        self._index = {}
+        self._props = None
+        for tag in tags:
+            self.add(tag)
+
+    def __len__(self):
+        return len(self.tags)
+
+    def add(self, tag):
+        """Returns the id of a tag, adding the tag to the vocabulary if it
+        is new.
+
+        :param tag: tag
+        :type tag: str
+        :return: tag id
+        :rtype: int
+        """
+        idx = self._index.get(tag)
+        if idx is None:
+            idx = len(self.tags)
+            self.tags.append(tag)
+            self._index[tag] = idx
+            self._props = None
+        return idx
+
+    def encode(self, tags):
+        """Encodes a sequence of tags as an array of tag ids. Unseen tags are
+        added to the vocabulary.
+
+        :param tags: tag sequence
+        :type tags: list or np.ndarray or pd.Series
+        :return: tag ids
+        :rtype: np.ndarray
+        """
+        tags = np.asarray(tags)
+        if tags.dtype == object:
+            tags = tags.astype(str)
+        uniq, inv = np.unique(tags, return_inverse=True)
+        lut = np.array([self.add(t) for t in uniq], dtype=np.int64)
+        return lut[inv.reshape(-1)]
+
+    def _properties(self):
+        if self._props is None:
+            types = {}
+            type_ids = []
+            for tag in self.tags:
+                _, _, typ = tag.partition('-')
+                type_ids.append(types.setdefault(typ, len(types)))
+            self._props = (
+                np.array([t[:1] != '' and t[0] in START_PREFIXES
+                          for t in self.tags], dtype=bool),
+                np.array([t == OUTSIDE_TAG for t in self.tags], dtype=bool),
+                np.array(type_ids, dtype=np.int64),
+                sorted(types, key=types.get)
+            )
+        return self._props
+
+    @property
+    def starts(self):
+        """Boolean array marking the tags that open a new chunk.
+        :rtype: np.ndarray
+        """
+        return self._properties()[0]
+
+    @property
+    def outside(self):
+        """Boolean array marking the outside tags.
+        :rtype: np.ndarray
+        """
+        return self._properties()[1]
+
+    @property
+    def type_ids(self):
+        """Chunk type id of every tag, e.g. `B-NP` and `I-NP` map to the id
+        of `NP`.
+        :rtype: np.ndarray
+        """
+        return self._properties()[2]
+
+    @property
+    def types(self):
+        """Chunk type names indexed by type id.
+        :rtype: list
+        """
+        return self._properties()[3]
+
+    def chunk_starts(self, ids, breaks=None):
+        """Marks the tokens that open a new chunk.
+
+        :param ids: tag ids
+        :type ids: np.ndarray
+        :param breaks: mask of tokens that always open a chunk, e.g. the
+            first tokens of sentences
+        :type breaks: np.ndarray
+        :return: boolean mask over the tokens
+        :rtype: np.ndarray
+        """
+        starts = self.starts[ids]
+        if breaks is not None:
+            starts |= breaks
+        return starts
+
+    def spans(self, ids, breaks=None):
+        """Extracts the chunks of an encoded tag sequence as an array of
+        `(start, end, type)` rows, where `end` is exclusive. Chunks starting
+        with an outside tag are not included.
+
+        :param ids: tag ids
+        :type ids: np.ndarray
+        :param breaks: mask of tokens that always open a chunk, e.g. the
+            first tokens of sentences
+        :type breaks: np.ndarray
+        :return: span array of shape (n, 3)
+        :rtype: np.ndarray
+        """
+        starts = np.flatnonzero(self.chunk_starts(ids, breaks))
+        ends = np.append(starts[1:], len(ids))
+        first = ids[starts]
+        keep = ~self.outside[first]
+        return np.column_stack(
+            (starts[keep], ends[keep], self.type_ids[first[keep]])
+        )
+
+
+def pack_spans(*span_arrays):
+    """Packs span arrays into one integer key per span. All arrays are packed
+    with the same radix, so equal keys mean equal `(start, end, type)` rows.
+    When the keys would not fit in 64 bits the rows are viewed as opaque
+    byte strings instead.
+
+    :param span_arrays: span arrays of shape (n, 3)
+    :type span_arrays: np.ndarray
+    :return: one key array per span array
+    :rtype: list
+    """
+    span_arrays = [np.asarray(x, dtype=np.int64).reshape(-1, 3)
+                   for x in span_arrays]
+    rows = np.concatenate(span_arrays)
+    if not len(rows):
+        return [np.zeros(0, dtype=np.int64) for _ in span_arrays]
+    nstart = int(rows[:, 0].max()) + 1
+    nlen = int((rows[:, 1] - rows[:, 0]).max()) + 1
+    ntype = int(rows[:, 2].max()) + 1
+    if nstart * nlen * ntype < 2 ** 63:
+        return [((x[:, 0] * nlen) + (x[:, 1] - x[:, 0])) * ntype + x[:, 2]
+                for x in span_arrays]
+    void = np.dtype((np.void, 3 * rows.dtype.itemsize))
+    return [np.ascontiguousarray(x).view(void).ravel() for x in span_arrays]
+
+
+def match_spans(gold_spans, guess_spans):
+    """Marks the gold spans that also appear in the guess spans. Spans are
+    compared as packed integer keys, so the cost depends on the number of
+    chunks only.
+
+    :param gold_spans: gold span array
+    :type gold_spans: np.ndarray
+    :param guess_spans: guess span array
+    :type guess_spans: np.ndarray
+    :return: boolean mask over the gold spans
+    :rtype: np.ndarray
+    """
+    gold_keys, guess_keys = pack_spans(gold_spans, guess_spans)
+    return np.isin(gold_keys, guess_keys)
+
+
+def aligned_matches(gold_ids, guess_ids, gold_spans, tagset, breaks=None):
+    """Marks the gold chunks that are reproduced exactly in an aligned guess
+    sequence, i.e. the guess has the same tags over the whole chunk and
+    starts a new chunk (or ends) right after it.
+
+    :param gold_ids: gold tag ids
+    :type gold_ids: np.ndarray
+    :param guess_ids: guess tag ids
+    :type guess_ids: np.ndarray
+    :param gold_spans: gold span array
+    :type gold_spans: np.ndarray
+    :param tagset: tag vocabulary of both sequences
+    :type tagset: TagSet
+    :param breaks: mask of tokens that always open a chunk
+    :type breaks: np.ndarray
+    :return: boolean mask over the gold spans
+    :rtype: np.ndarray
+    """
+    boundary = np.append(tagset.chunk_starts(guess_ids, breaks), True)
+    diff = np.zeros(len(gold_ids) + 1, dtype=np.int64)
+    np.cumsum(gold_ids != guess_ids, out=diff[1:])
+    s, e = gold_spans[:, 0], gold_spans[:, 1]
+    return (diff[e] == diff[s]) & boundary[e]
+
+
+def encode_tags(gold_tags, guess_tags, breaks=None):
+    """Encodes aligned gold and guess tag sequences with a shared `TagSet`.
+
+    :param gold_tags: gold tag sequence
+    :type gold_tags: list or np.ndarray
+    :param guess_tags: guess tag sequence
+    :type guess_tags: list or np.ndarray
+    :param breaks: mask of tokens that always open a chunk; a break on the
+        first token allows any tag there
+    :type breaks: np.ndarray
+    :return: gold tag ids, guess tag ids and tag vocabulary
+    :rtype: tuple
+    """
+    tagset = TagSet()
+    gold = tagset.encode(gold_tags)
+    guess = tagset.encode(guess_tags)
+    if len(gold) != len(guess):
+        raise ValueError('Non-matching number of tags %s!=%s.' %
+                         (len(gold), len(guess)))
+    if not len(gold) or breaks is not None and breaks[:1].all():
+        return gold, guess, tagset
+    if not tagset.starts[gold[0]]:
+        raise ValueError('Invalid chunktag on first token.')
+    if not tagset.starts[guess[0]]:
+        raise ValueError('Invalid guesstag on first token.')
+    return gold, guess, tagset
+
+
+def group_breaks(columns):
+    """Marks the first tokens of the groups given by id columns, e.g. a
+    document and a sentence id column. A group starts where its id or the id
+    of any outer group changes, so sentence ids may restart in every
+    document.
+
+    :param columns: id columns, outermost first
+    :type columns: list
+    :return: one boolean mask over the tokens per column
+    :rtype: list
+    """
+    masks = []
+    mask = None
+    for col in columns:
+        col = np.asarray(col)
+        change = np.ones(len(col), dtype=bool)
+        change[1:] = col[1:] != col[:-1]
+        mask = change if mask is None else mask | change
+        masks.append(mask)
+    return masks
+
+
+def encode_df(df, chunktag='chunktag', guesstag='guesstag'):
+    """Encodes the gold and guess tag columns of a pandas `DataFrame` with a
+    shared `TagSet`.
+
+    :param df: input DataFrame
+    :type df: pd.DataFrame
+    :param chunktag: name of the original chunk tag column
+    :type chunktag: str
+    :param guesstag: name of the guess chunk tag column
+    :type guesstag: str
+    :return: gold tag ids, guess tag ids and tag vocabulary
+    :rtype: tuple
+    """
+    return encode_tags(df[chunktag].values, df[guesstag].values)
+
+
+def df2spans(df, chunktag='chunktag', guesstag='guesstag', scheme=None,
+             groupcols=None):
+    """Converts a pandas `DataFrame` into gold and guess span arrays.
+
+    :param df: input DataFrame
+    :type df: pd.DataFrame
+    :param chunktag: name of the original chunk tag column
+    :type chunktag: str
+    :param guesstag: name of the guess chunk tag column
+    :type guesstag: str
+    :param scheme: tagging scheme name or object (see `bioeval.schemes`)
+    :type scheme: str or Scheme
+    :param groupcols: id columns of token groups, e.g. documents and
+        sentences, outermost first; chunks never cross group boundaries
+    :type groupcols: str or list
+    :return: gold spans, guess spans and tag vocabulary
+    :rtype: tuple
+    """
+    breaks = None
+    if groupcols is not None:
+        if isinstance(groupcols, str):
+            groupcols = [groupcols]
+        breaks = group_breaks([df[c].values for c in groupcols])[-1]
+    if scheme is None:
+        gold, guess, tagset = encode_tags(df[chunktag].values,
+                                          df[guesstag].values, breaks)
+        return tagset.spans(gold, breaks), tagset.spans(guess, breaks), \
+            tagset
+    from .schemes import decode_tags
+    gold, guess, tagset, gold_breaks, guess_breaks = \
+        decode_tags(df[chunktag].values, df[guesstag].values, scheme, breaks)
+    return tagset.spans(gold, gold_breaks), \
+        tagset.spans(guess, guess_breaks), tagset
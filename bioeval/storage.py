@@ -0,0 +1,273 @@
+import json
+import os
+
+from array import array
+
+import numpy as np
+
+from .conll import BOUNDARY, is_boundary
+from .counts import ChunkCounts
+from .spans import TagSet, aligned_matches
+
+__author__ = 'Aleksandar Savkov'
+
+# fixed width of the stored tag ids
+TAG_DTYPE = np.uint16
+# number of tokens scored at a time
+BLOCK_SIZE = 2 ** 20
+# number of tokens buffered while converting a CoNLL file
+BUFFER_SIZE = 2 ** 16
+
+GOLD_FILE = 'gold.npy'
+GUESS_FILE = 'guess.npy'
+SENTENCES_FILE = 'sentences.npy'
+TAGS_FILE = 'tags.json'
+
+
+def _check_tags(tagset):
+    if len(tagset) > np.iinfo(TAG_DTYPE).max + 1:
+        raise ValueError('Too many distinct tags %s.' % len(tagset))
+
+
+def _write_tags(path, tagset):
+    _check_tags(tagset)
+    with open(os.path.join(path, TAGS_FILE), 'w') as fh:
+        json.dump(tagset.tags, fh)
+
+
+def save_tags(path, gold_tags, guess_tags, sentences=None):
+    """Stores aligned gold and guess tag sequences in a directory as integer
+    tag id arrays (`gold.npy`, `guess.npy`) and a tag vocabulary
+    (`tags.json`).
+
+    :param path: output directory, created if missing
+    :type path: str
+    :param gold_tags: gold tag sequence
+    :type gold_tags: list or np.ndarray
+    :param guess_tags: guess tag sequence
+    :type guess_tags: list or np.ndarray
+    :param sentences: token offsets of the sentence starts, if chunks should
+        not continue across sentences
+    :type sentences: list or np.ndarray
+    :return: the stored tags
+    :rtype: TagStore
+    """
+    tagset = TagSet()
+    gold = tagset.encode(gold_tags)
+    guess = tagset.encode(guess_tags)
+    if len(gold) != len(guess):
+        raise ValueError('Non-matching number of tags %s!=%s.' %
+                         (len(gold), len(guess)))
+    _check_tags(tagset)
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    np.save(os.path.join(path, GOLD_FILE), gold.astype(TAG_DTYPE))
+    np.save(os.path.join(path, GUESS_FILE), guess.astype(TAG_DTYPE))
+    if sentences is not None:
+        np.save(os.path.join(path, SENTENCES_FILE),
+                np.asarray(sentences, dtype=np.int64))
+    _write_tags(path, tagset)
+    return TagStore(path)
+
+
+def convert_conll(fp, path, chunkcol=-2, guesscol=-1, delimiter=None,
+                  boundary=BOUNDARY):
+    """Converts a CoNLL-formatted file into a tag store without reading the
+    whole file into memory. The tag arrays are written through memory maps
+    and the sentence starts are kept, so the store scores like
+    `evaluate_conll`.
+
+    :param fp: file path
+    :type fp: str
+    :param path: output directory, created if missing
+    :type path: str
+    :param chunkcol: gold tag column index
+    :type chunkcol: int
+    :param guesscol: guess tag column index
+    :type guesscol: int
+    :param delimiter: column delimiter, any whitespace by default
+    :type delimiter: str
+    :param boundary: sentence boundary marker in the first column
+    :type boundary: str
+    :return: the stored tags
+    :rtype: TagStore
+    """
+    with open(fp, 'r') as fh:
+        n = sum(not is_boundary(line.rstrip('\r\n').split(delimiter),
+                                boundary) for line in fh)
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    gold = np.lib.format.open_memmap(os.path.join(path, GOLD_FILE), 'w+',
+                                     TAG_DTYPE, (n,))
+    guess = np.lib.format.open_memmap(os.path.join(path, GUESS_FILE), 'w+',
+                                      TAG_DTYPE, (n,))
+    tagset = TagSet()
+    sentences = array('q')
+    buf = array('q')
+    pos = 0
+    fresh = True
+    with open(fp, 'r') as fh:
+        for line in fh:
+            row = line.rstrip('\r\n').split(delimiter)
+            if is_boundary(row, boundary):
+                fresh = True
+                continue
+            if fresh:
+                sentences.append(pos + len(buf) // 2)
+                fresh = False
+            buf.append(tagset.add(row[chunkcol]))
+            buf.append(tagset.add(row[guesscol]))
+            if len(buf) == 2 * BUFFER_SIZE:
+                _check_tags(tagset)
+                ids = np.frombuffer(buf, dtype=np.int64)
+                gold[pos:pos + BUFFER_SIZE] = ids[0::2]
+                guess[pos:pos + BUFFER_SIZE] = ids[1::2]
+                pos += BUFFER_SIZE
+                buf = array('q')
+    if buf:
+        _check_tags(tagset)
+        ids = np.frombuffer(buf, dtype=np.int64)
+        gold[pos:] = ids[0::2]
+        guess[pos:] = ids[1::2]
+    gold.flush()
+    guess.flush()
+    del gold, guess
+    np.save(os.path.join(path, SENTENCES_FILE),
+            np.frombuffer(sentences, dtype=np.int64))
+    _write_tags(path, tagset)
+    return TagStore(path)
+
+
+class TagStore(object):
+    """Gold and guess tag ids stored on disk and opened as read-only memory
+    maps. Chunks are extracted and scored one block of tokens at a time, so
+    the memory needed for scoring depends on the block size and not on the
+    size of the corpus.
+
+    Blocks are cut at sentence starts or at tokens where both the gold and
+    the guess side open a new chunk, so the counts are identical to scoring
+    the whole corpus at once.
+
+    :param path: store directory
+    :type path: str
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, TAGS_FILE), 'r') as fh:
+            self.tagset = TagSet(json.load(fh))
+        self.gold = np.load(os.path.join(path, GOLD_FILE), mmap_mode='r')
+        self.guess = np.load(os.path.join(path, GUESS_FILE), mmap_mode='r')
+        if len(self.gold) != len(self.guess):
+            raise ValueError('Non-matching number of tags %s!=%s.' %
+                             (len(self.gold), len(self.guess)))
+        sentences = os.path.join(path, SENTENCES_FILE)
+        if os.path.exists(sentences):
+            self.sentences = np.load(sentences, mmap_mode='r')
+        else:
+            self.sentences = None
+
+    def __len__(self):
+        return len(self.gold)
+
+    def _breaks(self, start, end):
+        if self.sentences is None:
+            return None
+        lo, hi = np.searchsorted(self.sentences, [start, end])
+        breaks = np.zeros(end - start, dtype=bool)
+        breaks[self.sentences[lo:hi] - start] = True
+        return breaks
+
+    def _splits(self, start, end):
+        starts = self.tagset.starts
+        split = starts[self.gold[start:end]] & starts[self.guess[start:end]]
+        breaks = self._breaks(start, end)
+        if breaks is not None:
+            split |= breaks
+        return split
+
+    def _next_split(self, i, window):
+        n = len(self)
+        while i < n:
+            end = min(n, i + window)
+            hits = np.flatnonzero(self._splits(i, end))
+            if len(hits):
+                return i + int(hits[0])
+            i = end
+        return n
+
+    def blocks(self, block_size=BLOCK_SIZE):
+        """Splits the store into blocks of about `block_size` tokens that no
+        chunk crosses.
+
+        :param block_size: number of tokens in a block
+        :type block_size: int
+        :return: (start, end) token offsets of the blocks
+        :rtype: generator
+        """
+        n = len(self)
+        start = 0
+        while start < n:
+            end = self._next_split(start + block_size, max(1, block_size))
+            yield start, end
+            start = end
+
+    def count(self, block_size=BLOCK_SIZE):
+        """Counts the correct, gold and guess chunks block by block.
+
+        :param block_size: number of tokens in a block
+        :type block_size: int
+        :return: chunk counts
+        :rtype: ChunkCounts
+        """
+        tagset = self.tagset
+        if len(self) and not self._splits(0, 1)[0]:
+            if not tagset.starts[self.gold[0]]:
+                raise ValueError('Invalid chunktag on first token.')
+            raise ValueError('Invalid guesstag on first token.')
+        types = tagset.types
+        totals = np.zeros((3, len(types)), dtype=np.int64)
+        tags = np.zeros((2, len(tagset)), dtype=np.int64)
+        for start, end in self.blocks(block_size):
+            gold = self.gold[start:end]
+            guess = self.guess[start:end]
+            breaks = self._breaks(start, end)
+            gold_spans = tagset.spans(gold, breaks)
+            guess_spans = tagset.spans(guess, breaks)
+            correct = aligned_matches(gold, guess, gold_spans, tagset, breaks)
+            for i, x in enumerate((gold_spans[correct, 2], gold_spans[:, 2],
+                                   guess_spans[:, 2])):
+                totals[i] += np.bincount(x, minlength=len(types))
+            tags[0] += np.bincount(gold[gold == guess], minlength=len(tagset))
+            tags[1] += np.bincount(gold, minlength=len(tagset))
+        return ChunkCounts(*[{t: c for t, c in zip(types, x) if c}
+                             for x in totals.tolist()] +
+                           [{t: c for t, c in zip(tagset.tags, x) if c}
+                            for x in tags.tolist()])
+
+    def evaluate(self, do_round=True, block_size=BLOCK_SIZE):
+        """Calculates the overall f-score, precision and recall.
+
+        :param do_round: round the result to the second digit
+        :type do_round: bool
+        :param block_size: number of tokens in a block
+        :type block_size: int
+        :return: f-score, precision, recall
+        :rtype: tuple
+        """
+        return self.count(block_size).scores(do_round)
+
+
+def evaluate_store(path, do_round=True, block_size=BLOCK_SIZE):
+    """Evaluates a tag store written by `save_tags` or `convert_conll`.
+
+    :param path: store directory
+    :type path: str
+    :param do_round: round the result to the second digit
+    :type do_round: bool
+    :param block_size: number of tokens in a block
+    :type block_size: int
+    :return: f-score, precision, recall
+    :rtype: tuple
+    """
+    return TagStore(path).evaluate(do_round, block_size)
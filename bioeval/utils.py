@@ -1,19 +1,28 @@
-import re
-import string
-import numpy as np
-
 from io import StringIO
 
 __author__ = 'Aleksandar Savkov'
 
+# numpy, pandas and re are imported in the functions that need them, so that
+# `import bioeval` stays cheap for the pure Python scoring paths
+
+# tag prefixes that open a new chunk (BIO and BEISO)
+START_PREFIXES = 'BOS'
+OUTSIDE_TAG = 'O'
+
+ALPHANUMERIC = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+
 
 def random_summed_pair(summed):
+    import numpy as np
+
     x = np.random.randint(1, summed)
     y = summed - x
     return x, y
 
 
 def random_token(idx):
+    import numpy as np
+
     return (
         idx,
         random_str(np.random.randint(2, 20)),
@@ -40,8 +49,8 @@ def make_chunk_pair(idx):
     return ch, ch2
 
 
-def random_str(size=10,
-               chars=string.ascii_uppercase + string.digits):
+def random_str(size=10, chars=ALPHANUMERIC):
+    import numpy as np
 
     idxs = list(np.random.randint(0, len(chars), size))
 
@@ -49,6 +58,8 @@ def random_str(size=10,
 
 
 def mock_chunks(n=10000, ncor=.8):
+    import numpy as np
+
     diff_pos = np.random.randint(-1, 1, 1)
     n_guess = 0
     while n_guess < ncor:
@@ -87,10 +98,175 @@ def mock_chunks(n=10000, ncor=.8):
     return gold, guess
 
 
+def random_strs(rng, n, min_size=2, max_size=20,
+                chars=ALPHANUMERIC):
+    """Draws `n` random strings with sizes in [min_size, max_size) at once.
+
+    :param rng: random generator
+    :type rng: np.random.Generator
+    :param n: number of strings
+    :type n: int
+    :param min_size: minimum string size
+    :type min_size: int
+    :param max_size: maximum string size (exclusive)
+    :type max_size: int
+    :param chars: alphabet
+    :type chars: str
+    :return: array of strings
+    :rtype: np.ndarray
+    """
+    import numpy as np
+
+    width = max_size - 1
+    alphabet = np.frombuffer(chars.encode('ascii'), dtype=np.uint8)
+    codes = alphabet[rng.integers(0, len(alphabet), (n, width))]
+    sizes = rng.integers(min_size, max_size, n)
+    # trailing null bytes are dropped by the fixed-width string dtype
+    codes[np.arange(width) >= sizes[:, None]] = 0
+    return codes.view('S%d' % width).ravel().astype('U%d' % width)
+
+
+def mock_corpus(n=10000, ncor=8000, n_labels=4, chunk_len=4, p_outside=.3,
+                seed=None, fmt='chunks'):
+    """Generates a gold and a guess annotation of `n` gold chunks, exactly
+    `ncor` of which are correct in the guess. All random values are drawn in
+    bulk from one seeded generator, so large corpora are generated quickly
+    and reproducibly.
+
+    The guess differs from the gold in the type of the wrong chunks or, for
+    chunks of two or more tokens, in a boundary splitting the chunk in two.
+
+    Output formats:
+        - `chunks`: native sets of token tuple chunks (see `evaluate`)
+        - `tags`: gold and guess tag arrays
+        - `spans`: gold and guess span arrays and chunk type names
+        - `df`: DataFrame with `form`, `pos`, `chunktag` and `guesstag`
+
+    :param n: number of gold chunks
+    :type n: int
+    :param ncor: number of correct chunks
+    :type ncor: int
+    :param n_labels: number of chunk types
+    :type n_labels: int
+    :param chunk_len: maximum chunk length or a `sampler(rng, n)` of lengths
+    :type chunk_len: int or callable
+    :param p_outside: probability of an outside token after a chunk
+    :type p_outside: float
+    :param seed: random seed
+    :type seed: int
+    :param fmt: output format
+    :type fmt: str
+    :return: gold and guess annotation in the requested format
+    :rtype: tuple
+    """
+    import numpy as np
+
+    from .spans import TagSet
+
+    if not 0 <= ncor <= n:
+        raise ValueError('Number of correct chunks out of range: %s' % ncor)
+    if ncor < n and n_labels < 2:
+        raise ValueError('Wrong chunks need at least two chunk types.')
+    rng = np.random.default_rng(seed)
+    if callable(chunk_len):
+        sizes = np.asarray(chunk_len(rng, n), dtype=np.int64)
+    else:
+        sizes = rng.integers(1, chunk_len + 1, n)
+    types = rng.integers(0, n_labels, n)
+    gaps = rng.random(n) < p_outside
+    starts = np.zeros(n, dtype=np.int64)
+    np.cumsum((sizes + gaps)[:-1], out=starts[1:])
+    ntok = int(sizes.sum() + gaps.sum())
+
+    owner = np.repeat(np.arange(n), sizes)
+    pos = starts[owner] + np.arange(len(owner)) - \
+        np.repeat(np.cumsum(sizes) - sizes, sizes)
+
+    wrong = rng.choice(n, n - ncor, replace=False)
+    split = wrong[(sizes[wrong] > 1) & (rng.random(len(wrong)) < .5)]
+    relabel = np.setdiff1d(wrong, split)
+    guess_types = types.copy()
+    guess_types[relabel] = (types[relabel] +
+                            rng.integers(1, max(n_labels, 2), len(relabel))
+                            ) % n_labels
+
+    # tag ids: 0 is O, 2t + 1 is B-Lt and 2t + 2 is I-Lt
+    tags = ['O']
+    for t in range(n_labels):
+        tags.extend(['B-L%d' % t, 'I-L%d' % t])
+    tags = np.array(tags)
+    gold = np.zeros(ntok, dtype=np.int64)
+    guess = np.zeros(ntok, dtype=np.int64)
+    gold[pos] = 2 * types[owner] + 2
+    guess[pos] = 2 * guess_types[owner] + 2
+    gold[starts] -= 1
+    guess[starts] -= 1
+    guess[starts[split] + 1] -= 1
+
+    if fmt == 'tags':
+        return tags[gold], tags[guess]
+    if fmt == 'spans':
+        tagset = TagSet(tags.tolist())
+        return tagset.spans(gold), tagset.spans(guess), tagset.types
+
+    forms = random_strs(rng, ntok)
+    poses = random_strs(rng, ntok, 1, 2)
+    if fmt == 'df':
+        import pandas as pd
+        return pd.DataFrame({'form': forms, 'pos': poses,
+                             'chunktag': tags[gold],
+                             'guesstag': tags[guess]})
+    if fmt == 'chunks':
+        tagset = TagSet(tags.tolist())
+        forms, poses = forms.tolist(), poses.tolist()
+        res = []
+        for ids in (gold, guess):
+            tokens = list(zip(range(ntok), forms, poses, tags[ids].tolist()))
+            bounds = np.flatnonzero(tagset.starts[ids]).tolist() + [ntok]
+            res.append({tuple(tokens[s:e])
+                        for s, e in zip(bounds[:-1], bounds[1:])})
+        return tuple(res)
+    raise ValueError('Unknown format: %s' % fmt)
+
+
 def fscore(precision, recall):
     return 100 * 2 * precision * recall / (precision + recall)
 
 
+def chunk_scores(ncor, ngold, nguess, do_round=True, ncor_guess=None):
+    """Calculates f-score, precision and recall from chunk counts.
+
+    :param ncor: number of correct chunks
+    :type ncor: int
+    :param ngold: number of gold chunks
+    :type ngold: int
+    :param nguess: number of guess chunks
+    :type nguess: int
+    :param do_round: round the result to the second digit
+    :type do_round: bool
+    :param ncor_guess: number of correct guess chunks if it differs from
+        the number of correct gold chunks, e.g. with relaxed matching
+    :type ncor_guess: int
+    :return: f-score, precision, recall
+    :rtype: tuple
+    """
+    if ncor_guess is None:
+        ncor_guess = ncor
+    precision = int(ncor_guess) / float(nguess) if nguess else 0.0
+    recall = int(ncor) / float(ngold) if ngold else 0.0
+
+    if precision + recall > 0:
+        f1 = 2 * precision * recall / (precision + recall)
+    else:
+        f1 = 0.0
+
+    if do_round:
+        return round(100 * f1, 2), round(100 * precision, 2), \
+               round(100 * recall, 2)
+    else:
+        return 100 * f1, 100 * precision, 100 * recall
+
+
 class AccuracyResults(dict):
     """POS tagger accuracy results container class.
     """
@@ -135,6 +311,50 @@ class AccuracyResults(dict):
                 self[k]['precision'] /= len(results)
                 self[k]['recall'] /= len(results)
 
+    def from_counts(self, correct, gold, guess, do_round=True):
+        """Fills this object with the precision, recall and f-score of every
+        chunk type and the total.
+        :param correct: number of correct chunks by type
+        :type correct: dict
+        :param gold: number of gold chunks by type
+        :type gold: dict
+        :param guess: number of guess chunks by type
+        :type guess: dict
+        :param do_round: round the results to the second digit
+        :type do_round: bool
+        """
+        for k in sorted(set(gold) | set(guess)):
+            f1, pre, rec = chunk_scores(correct.get(k, 0), gold.get(k, 0),
+                                        guess.get(k, 0), do_round)
+            self[k] = {'precision': pre, 'recall': rec, 'fscore': f1}
+        f1, pre, rec = chunk_scores(sum(correct.values()),
+                                    sum(gold.values()),
+                                    sum(guess.values()), do_round)
+        self[self._total_name] = {
+            'precision': pre, 'recall': rec, 'fscore': f1
+        }
+
+    def from_tag_counts(self, correct, total, do_round=True):
+        """Fills this object with the token accuracy of every tag and the
+        total.
+        :param correct: number of correctly tagged tokens by gold tag
+        :type correct: dict
+        :param total: number of tokens by gold tag
+        :type total: dict
+        :param do_round: round the results to the second digit
+        :type do_round: bool
+        """
+        items = [(k, correct.get(k, 0), total[k]) for k in sorted(total)]
+        items.append((self._total_name, sum(correct.values()),
+                      sum(total.values())))
+        for k, cor, n in items:
+            acc = 100 * cor / float(n) if n else 0.0
+            self[k] = {
+                'accuracy': round(acc, 2) if do_round else acc,
+                'all': n,
+                'correct': cor
+            }
+
     def parse_conll_eval_table(self, fp):
         """Parses the LaTeX table output of the CoNLL-2000 evaluation script
         into this object.
@@ -143,6 +363,8 @@ class AccuracyResults(dict):
         :return: results by category
         :rtype: dict
         """
+        import re
+
         with open(fp, 'r') as tbl:
             tbl.readline()
             for row in tbl:
@@ -208,6 +430,8 @@ def df2chunkset(df, chunktag='chunktag', guesstag='guesstag'):
     :rtype: tuple
     """
     go, ge = set(), set()
+    if not len(df):
+        return go, ge
     if df.iloc[0][chunktag][0] not in 'BOS':
         raise ValueError('Invalid chunktag on first token.')
     if df.iloc[0][guesstag][0] not in 'BOS':
@@ -222,7 +446,7 @@ def df2chunkset(df, chunktag='chunktag', guesstag='guesstag'):
         else:
             # continue chunk
             chunk_go.append((tid, r[chunktag]))
-        if r.guesstag[0] in 'BOS':
+        if r[guesstag][0] in 'BOS':
             # start new
             ge.add(tuple(chunk_ge))
             chunk_ge = [(tid, r[guesstag])]
@@ -1,8 +1,7 @@
 #!/usr/bin/env python
 import os
 
-from distutils.core import setup
-from setuptools import find_packages
+from setuptools import find_packages, setup
 
 __author__ = 'Aleksandar Savkov'
 
@@ -31,6 +30,12 @@ setup(
     long_description=description,
     long_description_content_type='text/markdown',
     install_requires=install_requires,
+    entry_points={
+        'console_scripts': [
+            'bioeval = bioeval.cli:main',
+            'conlleval = bioeval.conlleval:main',
+        ],
+    },
     classifiers=[
         'Intended Audience :: Science/Research',
         'Operating System :: Unix',
@@ -1,13 +1,46 @@
 import os
+import re
+import csv
+import json
+import shutil
 import sys
 import math
 import warnings
 import traceback
+import asyncio
+import subprocess
+import numpy as np
 import pandas as pd
 
+from tempfile import mkdtemp
 from unittest import TestCase
 from bioeval import evaluate, evaluate_df, get_ncor
+from bioeval import evaluate_spans, get_ncor_spans, count_df
+from bioeval import count_groups
+from bioeval.core import count_tags
 from bioeval.utils import *
+from bioeval import conlleval
+from bioeval.counts import ChunkCounts
+from bioeval.spans import TagSet, df2spans
+from bioeval.conll import count_conll, evaluate_conll
+from bioeval.parallel import count_conll_parallel, count_df_parallel
+from bioeval.parallel import file_shards
+from bioeval.online import ChunkEvaluator, WindowedEvaluator
+from bioeval.multi import GoldIndex, evaluate_systems, read_tags
+from bioeval.significance import bootstrap, conll_sentence_counts
+from bioeval.significance import sentence_counts
+from bioeval.significance import paired_test
+from bioeval.analysis import MATCH_MODES, analyze_df, analyze_tags
+from bioeval.analysis import overlaps, relaxed_matches
+from bioeval.cache import GoldCache, gold_key
+from bioeval import cli
+from bioeval.profiling import Profile, stage
+from bioeval.results import CompactResults, merge_results
+from bioeval.runs import RunCounts
+from bioeval.schemes import Scheme
+from bioeval.service import EvalClient, EvalServer, EvalService
+from bioeval.service import LocalClient, count_batch
+from bioeval.storage import TagStore, convert_conll, save_tags
 from iterpipes3 import check_call, cmd
 
 __author__ = 'Aleksandar Savkov'
@@ -179,6 +212,17 @@ class TestBIOEval(TestCase):
         self.assertEqual(f1, round(fscore(6.0/7, 6.0/7), 2))
         self.assertAlmostEqual(f1_exact, fscore(6.0/7, 6.0/7))
 
+    def test_list_duplicates(self):
+        # repeated chunks of list input count once per occurrence
+        np_chunk = ((1, 'Gold', 'N', 'B-NP'),)
+        gold = [np_chunk, np_chunk, ((2, 'is', 'V', 'B-MV'),)]
+        guess = [np_chunk, np_chunk, ((2, 'is', 'V', 'B-NP'),)]
+        f1, pr, re = evaluate(gold, guess, do_round=False)
+        self.assertAlmostEqual(pr, 100 / 3)
+        self.assertAlmostEqual(re, 100 / 3)
+        f1, pr, re = evaluate(set(gold), set(guess), do_round=False)
+        self.assertAlmostEqual(pr, 50.0)
+
     def test_ncor(self):
         # change that to 1000+ if you want real testing
         rep = 10
@@ -239,6 +283,1205 @@ class TestBIOEval(TestCase):
         self.assertEqual(f1, real_f1)
 
 
+class TestMockCorpus(TestCase):
+
+    def test_exact_correct(self):
+        n, ncor = 2000, 1234
+        gold, guess = mock_corpus(n, ncor, seed=3)
+        gold = {x for x in gold if x[0][3] != 'O'}
+        guess = {x for x in guess if x[0][3] != 'O'}
+        self.assertEqual((len(get_ncor(gold, guess)), len(gold)), (ncor, n))
+        gold, guess, types = mock_corpus(n, ncor, seed=3, fmt='spans')
+        self.assertEqual((get_ncor_spans(gold, guess), len(gold)), (ncor, n))
+        df = mock_corpus(n, ncor, seed=3, fmt='df')
+        self.assertEqual(count_df(df).total[:2], (ncor, n))
+        self.assertEqual(evaluate_df(df), evaluate_spans(gold, guess))
+
+    def test_seed(self):
+        first = mock_corpus(100, 50, seed=11, fmt='tags')
+        second = mock_corpus(100, 50, seed=11, fmt='tags')
+        self.assertEqual(first[0].tolist(), second[0].tolist())
+        self.assertEqual(first[1].tolist(), second[1].tolist())
+
+    def test_random_strs(self):
+        strs = random_strs(np.random.default_rng(0), 1000)
+        self.assertEqual(min(map(len, strs)), 2)
+        self.assertEqual(max(map(len, strs)), 19)
+
+
+class TestSpans(TestCase):
+
+    def test_spans(self):
+        df = pd.DataFrame({
+            'chunktag': ['B-NP', 'I-NP', 'O', 'B-VP', 'S-NP', 'O', 'I-NP'],
+            'guesstag': ['B-NP', 'B-NP', 'O', 'B-VP', 'B-NP', 'I-NP', 'O']
+        })
+        gold, guess, tagset = df2spans(df)
+        types = tagset.types
+        self.assertEqual(
+            [(s, e, types[t]) for s, e, t in gold.tolist()],
+            [(0, 2, 'NP'), (3, 4, 'VP'), (4, 5, 'NP')]
+        )
+        self.assertEqual(
+            [(s, e, types[t]) for s, e, t in guess.tolist()],
+            [(0, 1, 'NP'), (1, 2, 'NP'), (3, 4, 'VP'), (4, 6, 'NP')]
+        )
+
+    def test_tagset_add(self):
+        tagset = TagSet(['O', 'B-NP'])
+        self.assertEqual(tagset.add('B-NP'), 1)
+        self.assertEqual(tagset.add('I-NP'), 2)
+        self.assertEqual(tagset.tags, ['O', 'B-NP', 'I-NP'])
+        self.assertEqual(tagset.encode(['I-NP', 'B-VP']).tolist(), [2, 3])
+
+    def test_vectorized_equals_legacy(self):
+        tags = ['B-NP', 'I-NP', 'B-VP', 'I-VP', 'E-NP', 'S-VP', 'O']
+        for _ in range(20):
+            n = np.random.randint(2, 200)
+            df = pd.DataFrame({
+                'chunktag': np.random.choice(tags, n),
+                'guesstag': np.random.choice(tags, n)
+            })
+            df.loc[0, 'chunktag'] = 'B-NP'
+            df.loc[0, 'guesstag'] = 'B-NP'
+            legacy = evaluate_df(df, do_round=False, vectorized=False)
+            self.assertEqual(evaluate_df(df, do_round=False), legacy)
+
+    def test_invalid_first(self):
+        df = pd.DataFrame({'chunktag': ['I-NP', 'O'],
+                           'guesstag': ['B-NP', 'O']})
+        with self.assertRaises(ValueError):
+            evaluate_df(df)
+
+    def test_empty(self):
+        df = pd.DataFrame({'chunktag': [], 'guesstag': []})
+        for kwargs in ({}, {'vectorized': False}, {'n_jobs': 2},
+                       {'scheme': 'bio'}, {'mode': 'partial'}):
+            self.assertEqual(evaluate_df(df, **kwargs), (0.0, 0.0, 0.0))
+
+    def test_evaluate_spans(self):
+        gold = np.array([[0, 2, 0], [3, 4, 1], [4, 5, 0]])
+        guess = np.array([[0, 1, 0], [1, 2, 0], [3, 4, 1], [4, 6, 0]])
+        self.assertEqual(get_ncor_spans(gold, guess), 1)
+        f1, pr, re = evaluate_spans(gold, guess, do_round=False)
+        self.assertAlmostEqual(f1, fscore(1 / 4, 1 / 3))
+
+        # keys that do not fit in 64 bits
+        big = 2 ** 40
+        gold = np.array([[big, big + 2 ** 20, 2 ** 10], [0, 1, 0]])
+        guess = np.array([[big, big + 2 ** 20, 2 ** 10], [0, 1, 1]])
+        self.assertEqual(get_ncor_spans(gold, guess), 1)
+
+    def test_tagset(self):
+        tagset = TagSet(['O'])
+        ids = tagset.encode(['B-NP', 'O', 'I-NP', 'B-NP'])
+        self.assertEqual(ids.tolist(), [1, 0, 2, 1])
+        self.assertEqual(tagset.tags, ['O', 'B-NP', 'I-NP'])
+        self.assertEqual(tagset.starts.tolist(), [True, True, False])
+
+
+class TestConll(TestCase):
+
+    def test_stream_equals_df(self):
+        tags = ['B-NP', 'I-NP', 'B-VP', 'I-VP', 'E-NP', 'S-VP', 'O']
+        for _ in range(20):
+            n = np.random.randint(2, 200)
+            gold = ['B-NP'] + list(np.random.choice(tags, n))
+            guess = ['B-NP'] + list(np.random.choice(tags, n))
+            lines = ['w %s %s\n' % x for x in zip(gold, guess)]
+            df = pd.DataFrame({'chunktag': gold, 'guesstag': guess})
+            stream = count_conll(lines)
+            expected = evaluate_df(df, do_round=False, vectorized=False)
+            self.assertEqual(stream.scores(do_round=False), expected)
+
+    def test_labels(self):
+        gold = ['B-NP', 'I-NP', 'O', 'B-VP', 'B-NP', 'B-PP', 'O']
+        guess = ['B-NP', 'I-NP', 'O', 'B-NP', 'B-NP', 'B-PP', 'B-PP']
+        df = pd.DataFrame({'chunktag': gold, 'guesstag': guess})
+        counts = count_df(df)
+        self.assertEqual(counts.correct, {'NP': 2, 'PP': 1})
+        self.assertEqual(counts.gold, {'NP': 2, 'VP': 1, 'PP': 1})
+        self.assertEqual(counts.guess, {'NP': 3, 'PP': 2})
+        self.assertEqual(count_conll(['w %s %s' % x
+                                      for x in zip(gold, guess)]), counts)
+        res = counts.results(do_round=False)
+        self.assertEqual(res['VP']['recall'], 0.0)
+        self.assertAlmostEqual(res['NP']['fscore'], fscore(2 / 3, 1.0))
+        self.assertEqual(res['Total']['fscore'], counts.scores(False)[0])
+        self.assertEqual(evaluate_df(df, do_round=False), counts.scores(False))
+
+    def test_tag_accuracy(self):
+        fp = 'res/conll_sample.data'
+        cols = ['form', 'pos', 'chunktag', 'guesstag']
+        df = pd.read_csv(fp, sep=' ', names=cols)
+        counts = count_df(df)
+        res = counts.tag_results(do_round=False)
+        eq = df.chunktag == df.guesstag
+        self.assertEqual(res['Total']['all'], len(df))
+        self.assertEqual(res['Total']['correct'], eq.sum())
+        self.assertAlmostEqual(res['Total']['accuracy'],
+                               100 * eq.sum() / len(df))
+        self.assertEqual(res['B-NP']['correct'],
+                         eq[df.chunktag == 'B-NP'].sum())
+        with open(fp) as fh:
+            stream = count_conll(fh)
+        self.assertEqual(stream.tag_results(), counts.tag_results())
+        with open(fp) as fh:
+            ref = conlleval.count_conlleval(fh)
+        self.assertEqual(res['Total']['accuracy'], ref.accuracy)
+        merged = count_df(df[:100]) + count_df(df[100:])
+        self.assertEqual(merged.tag_results(), counts.tag_results())
+
+    def test_sentence_boundary(self):
+        lines = ['a B-NP B-NP', 'b I-NP I-NP', '', 'c I-NP I-NP', 'd O O']
+        stream = count_conll(lines)
+        self.assertEqual(stream.total, (2, 2, 2))
+
+
+class TestParallel(TestCase):
+
+    fp = 'res/conll_sample.data'
+
+    def test_file_shards(self):
+        shards = file_shards(self.fp, 50)
+        self.assertGreater(len(shards), 10)
+        with open(self.fp) as fh:
+            serial = count_conll(fh)
+        parts = ChunkCounts()
+        for start, end in shards:
+            with open(self.fp, 'rb') as fh:
+                fh.seek(start)
+                lines = fh.read(end - start).decode().splitlines()
+            parts.update(count_conll(lines))
+        self.assertEqual(parts, serial)
+
+    def test_conll_parallel(self):
+        with open(self.fp) as fh:
+            serial = count_conll(fh)
+        self.assertEqual(count_conll_parallel(self.fp, n_jobs=2), serial)
+        self.assertEqual(evaluate_conll(self.fp, n_jobs=2),
+                         serial.scores())
+
+    def test_df_parallel(self):
+        cols = ['form', 'pos', 'chunktag', 'guesstag']
+        df = pd.read_csv(self.fp, sep=' ', names=cols)
+        serial = count_df(df)
+        self.assertEqual(count_df_parallel(df, n_jobs=3), serial)
+        self.assertEqual(evaluate_df(df, n_jobs=3), serial.scores())
+
+
+class TestSignificance(TestCase):
+
+    fp = 'res/conll_sample.data'
+
+    def test_sentence_counts(self):
+        with open(self.fp) as fh:
+            counts = conll_sentence_counts(fh)
+        with open(self.fp) as fh:
+            total = count_conll(fh).total
+        self.assertEqual(len(counts), 89)
+        self.assertEqual(tuple(counts.sum(axis=0)), total)
+        sents = TestOnline._sentences(self.fp)
+        self.assertEqual(counts.tolist(), sentence_counts(sents).tolist())
+        # empty sentences are skipped on both paths
+        with_empty = [([], [])] + sents[:3] + [([], [])]
+        self.assertEqual(sentence_counts(with_empty).tolist(),
+                         counts[:3].tolist())
+        self.assertEqual(conll_sentence_counts([]).shape, (0, 3))
+
+    def test_bootstrap(self):
+        with open(self.fp) as fh:
+            counts = conll_sentence_counts(fh)
+        f1, low, high = bootstrap(counts, n_resamples=1500, seed=7)
+        self.assertAlmostEqual(f1, evaluate_conll(self.fp, do_round=False)[0])
+        self.assertLess(low, f1)
+        self.assertGreater(high, f1)
+        self.assertEqual(
+            bootstrap(counts, n_resamples=1500, seed=7, n_jobs=2),
+            (f1, low, high)
+        )
+        with self.assertRaises(ValueError):
+            bootstrap(counts[:0])
+
+    def test_paired_test(self):
+        with open(self.fp) as fh:
+            counts = conll_sentence_counts(fh)
+        diff, p = paired_test(counts, counts, n_resamples=500, seed=1)
+        self.assertEqual((diff, p), (0.0, 1.0))
+        worse = counts.copy()
+        worse[:, 0] = worse[:, 0] // 2
+        diff, p = paired_test(worse, counts, n_resamples=500, seed=1)
+        self.assertGreater(diff, 0)
+        self.assertLess(p, 0.01)
+
+
+class TestOnline(TestCase):
+
+    @staticmethod
+    def _sentences(fp):
+        sents = [([], [])]
+        with open(fp) as fh:
+            for line in fh:
+                row = line.split()
+                if not row:
+                    sents.append(([], []))
+                    continue
+                sents[-1][0].append(row[-2])
+                sents[-1][1].append(row[-1])
+        return [x for x in sents if x[0]]
+
+    def test_update(self):
+        fp = 'res/conll_sample.data'
+        sents = self._sentences(fp)
+        ev = ChunkEvaluator()
+        for gold, guess in sents[:10]:
+            ev.update(gold, guess)
+        ev.update([x[0] for x in sents[10:]], [x[1] for x in sents[10:]])
+        ev.update([], [])
+        self.assertEqual(ev.sentences, len(sents))
+        before = ev.counts + ChunkCounts()
+        with self.assertRaises(ValueError):
+            ev.update([['B-NP'], ['B-NP', 'O']], [['B-NP'], ['O']])
+        self.assertEqual(ev.sentences, len(sents))
+        self.assertEqual(ev.counts, before)
+        self.assertEqual(ev.result(), evaluate_conll(fp))
+        with open(fp) as fh:
+            self.assertEqual(ev.results(), count_conll(fh).results())
+
+        ev.reset()
+        self.assertEqual(ev.result(), (0.0, 0.0, 0.0))
+        self.assertEqual(ev.tokens, 0)
+
+    def test_merge(self):
+        fp = 'res/conll_sample.data'
+        sents = self._sentences(fp)
+        first, second = ChunkEvaluator(), ChunkEvaluator()
+        first.update([x[0] for x in sents[:40]], [x[1] for x in sents[:40]])
+        second.update([x[0] for x in sents[40:]], [x[1] for x in sents[40:]])
+        self.assertEqual(first.merge(second).result(), evaluate_conll(fp))
+
+    def test_mismatch(self):
+        with self.assertRaises(ValueError):
+            ChunkEvaluator().update(['B-NP', 'O'], ['B-NP'])
+
+
+class TestWindowed(TestCase):
+
+    fp = 'res/conll_sample.data'
+
+    def setUp(self):
+        self.sents = TestOnline._sentences(self.fp)
+
+    def test_size(self):
+        ev = WindowedEvaluator(size=10)
+        for i, (gold, guess) in enumerate(self.sents):
+            ev.update(gold, guess)
+            ref = ChunkEvaluator()
+            window = self.sents[max(0, i - 9):i + 1]
+            ref.update([x[0] for x in window], [x[1] for x in window])
+            self.assertEqual(len(ev), len(window))
+            self.assertEqual(ev.counts, ref.counts)
+            self.assertEqual(ev.result(False), ref.result(False))
+            self.assertEqual(ev.tokens, ref.tokens)
+        for label in ('NP', 'VP', 'PP', 'XX'):
+            self.assertEqual(ev.label_result(label),
+                             chunk_scores(ref.counts.correct.get(label, 0),
+                                          ref.counts.gold.get(label, 0),
+                                          ref.counts.guess.get(label, 0)))
+        self.assertEqual(ev.results(), ref.results())
+        ev.update([], [])
+        self.assertEqual(len(ev), 10)
+        with self.assertRaises(ValueError):
+            ev.update([['B-NP'], ['B-NP', 'O']], [['B-NP'], ['O']])
+        self.assertEqual(len(ev), 10)
+        self.assertEqual(ev.counts, ref.counts)
+        self.assertEqual(ev.counts, ref.counts)
+
+    def test_seconds(self):
+        now = [0.0]
+        ev = WindowedEvaluator(seconds=5, clock=lambda: now[0])
+        for i, (gold, guess) in enumerate(self.sents[:30]):
+            now[0] = float(i)
+            ev.update(gold, guess)
+            self.assertEqual(len(ev), min(i + 1, 5))
+        now[0] = 100.0
+        self.assertEqual(ev.result(), (0.0, 0.0, 0.0))
+        self.assertEqual(len(ev), 0)
+        self.assertEqual(ev.counts, ChunkCounts())
+        ev.update([x[0] for x in self.sents[:3]],
+                  [x[1] for x in self.sents[:3]], timestamp=200.0)
+        self.assertEqual(len(ev), 3)
+        with self.assertRaises(ValueError):
+            WindowedEvaluator()
+
+
+class TestMulti(TestCase):
+
+    def test_systems(self):
+        fp = 'res/conll_sample.data'
+        cols = ['form', 'pos', 'chunktag', 'guesstag']
+        df = pd.read_csv(fp, sep=' ', names=cols)
+        df['shifted'] = df.guesstag.shift(1).fillna('O')
+        df['gold'] = df.chunktag
+        tbl = evaluate_systems(df, 'chunktag',
+                               ['guesstag', 'shifted', 'gold', fp])
+        self.assertEqual(list(tbl.system.unique()),
+                         ['guesstag', 'shifted', 'gold', fp])
+        for system, col in (('guesstag', 'guesstag'), ('shifted', 'shifted'),
+                            ('gold', 'gold'), (fp, 'guesstag')):
+            rows = tbl[tbl.system == system].set_index('label')
+            counts = count_df(df, 'chunktag', col)
+            self.assertEqual(
+                tuple(rows.loc['Total', ['correct', 'gold', 'guess']]),
+                counts.total
+            )
+            self.assertEqual(rows.loc['NP', 'fscore'],
+                             counts.results()['NP']['fscore'])
+        self.assertEqual(
+            tbl[(tbl.system == 'gold') & (tbl.label == 'Total')].fscore.item(),
+            100.0
+        )
+
+    def test_boundary_lines(self):
+        gold = ['B-NP', 'I-NP', 'O', 'B-VP']
+        df = pd.DataFrame({'chunktag': gold})
+        path = mkdtemp()
+        fp = os.path.join(path, 'guess.conll')
+        try:
+            with open(fp, 'w') as fh:
+                fh.write('-X- -X- O\na x B-NP\nb x I-NP\n\n'
+                         '-X- -X- O\nc x O\nd x B-VP\n')
+            self.assertEqual(read_tags(fp), gold)
+            tbl = evaluate_systems(df, 'chunktag', [fp])
+        finally:
+            shutil.rmtree(path)
+        self.assertEqual(tbl[tbl.label == 'Total'].fscore.item(), 100.0)
+
+    def test_gold_index(self):
+        index = GoldIndex(['B-NP', 'I-NP', 'O'])
+        self.assertEqual(index.count(['B-NP', 'I-NP', 'O']).total, (1, 1, 1))
+        self.assertEqual(index.count(['B-NP', 'B-X', 'O']).total, (0, 1, 2))
+        with self.assertRaises(ValueError):
+            index.count(['B-NP', 'O'])
+
+
+class TestAnalysis(TestCase):
+
+    def test_error_classes(self):
+        gold = ['B-PER', 'I-PER', 'O', 'B-LOC', 'O', 'B-ORG', 'I-ORG', 'O',
+                'O', 'B-MISC', 'B-X', 'I-X']
+        guess = ['B-PER', 'I-PER', 'O', 'B-ORG', 'O', 'B-ORG', 'O', 'O',
+                 'B-LOC', 'O', 'O', 'B-Y']
+        errors = analyze_tags(gold, guess)
+        self.assertEqual(errors.counts(), {
+            'correct': 1, 'type': 1, 'boundary': 1, 'type+boundary': 1,
+            'missed': 1, 'spurious': 1
+        })
+        self.assertEqual(errors.labels,
+                         ['LOC', 'MISC', 'ORG', 'PER', 'X', 'Y', 'O'])
+        self.assertEqual(errors.gold_errors.tolist(), [0, 1, 2, 4, 3])
+        self.assertEqual(errors.guess_errors.tolist(), [0, 1, 2, 5, 3])
+        confusion = errors.confusion
+        self.assertEqual(confusion.sum(), 6)
+        self.assertEqual(confusion[0, 2], 1)
+        self.assertEqual(confusion[1, 6], 1)
+        self.assertEqual(confusion[6, 0], 1)
+        self.assertEqual(confusion[4, 5], 1)
+
+    def test_bioes_correct(self):
+        gold = ['B-NP', 'E-NP', 'S-VP', 'B-NP', 'I-NP', 'E-NP', 'O', 'S-PP']
+        guess = ['B-NP', 'I-NP', 'S-VP', 'B-NP', 'I-NP', 'E-NP', 'O', 'S-PP']
+        df = pd.DataFrame({'chunktag': gold, 'guesstag': guess})
+        counts = analyze_tags(gold, guess).counts()
+        self.assertEqual(counts['correct'], count_df(df).total[0])
+        self.assertEqual(counts['correct'], 3)
+        self.assertEqual(counts['boundary'], 1)
+        self.assertEqual(analyze_df(df).counts(), counts)
+
+    def test_overlaps(self):
+        gold, guess, _ = mock_corpus(300, 200, chunk_len=3, seed=5,
+                                     fmt='spans')
+        pairs = {(i, j) for i, x in enumerate(gold.tolist())
+                 for j, y in enumerate(guess.tolist())
+                 if x[0] < y[1] and y[0] < x[1]}
+        gi, gj = overlaps(gold, guess)
+        self.assertEqual(set(zip(gi.tolist(), gj.tolist())), pairs)
+        self.assertEqual(len(gi), len(pairs))
+
+    def test_relaxed_matches(self):
+        gold, guess, _ = mock_corpus(300, 150, chunk_len=3, seed=7,
+                                     fmt='spans')
+        for mode, cols in MATCH_MODES.items():
+            gold_matched, guess_matched = relaxed_matches(gold, guess, mode)
+            pairs = [(i, j) for i, x in enumerate(gold.tolist())
+                     for j, y in enumerate(guess.tolist())
+                     if x[0] < y[1] and y[0] < x[1] and
+                     all(x[c] == y[c] for c in cols)]
+            self.assertEqual(set(np.flatnonzero(gold_matched).tolist()),
+                             {i for i, _ in pairs})
+            self.assertEqual(set(np.flatnonzero(guess_matched).tolist()),
+                             {j for _, j in pairs})
+        self.assertEqual(evaluate_spans(gold, guess),
+                         evaluate_spans(gold, guess, mode='exact'))
+        with self.assertRaises(ValueError):
+            relaxed_matches(gold, guess, 'fuzzy')
+
+    def test_modes(self):
+        gold = ['B-PER', 'I-PER', 'O', 'B-LOC', 'I-LOC', 'O', 'B-ORG']
+        guess = ['B-PER', 'I-PER', 'O', 'B-LOC', 'B-LOC', 'O', 'B-LOC']
+        df = pd.DataFrame({'chunktag': gold, 'guesstag': guess})
+        # matched gold and guess chunks out of 3 and 4
+        expected = {
+            'exact': (1, 1), 'boundary': (2, 2), 'type': (2, 3),
+            'partial': (3, 4), 'left': (2, 2), 'right': (2, 2)
+        }
+        gold_spans, guess_spans, _ = df2spans(df)
+        for mode, (ngold, nguess) in expected.items():
+            gold_matched, guess_matched = relaxed_matches(
+                gold_spans, guess_spans, mode
+            )
+            self.assertEqual(gold_matched.sum(), ngold, mode)
+            self.assertEqual(guess_matched.sum(), nguess, mode)
+            self.assertEqual(evaluate_df(df, mode=mode, do_round=False),
+                             chunk_scores(ngold, 3, 4, False, nguess))
+        for kwargs in ({'n_jobs': 2}, {'vectorized': False}, {'cache': '.'}):
+            with self.assertRaises(ValueError):
+                evaluate_df(df, mode='partial', **kwargs)
+
+    def test_df(self):
+        gold, guess = mock_corpus(1000, 700, seed=2, fmt='tags')
+        df = pd.DataFrame({'chunktag': gold, 'guesstag': guess})
+        errors = analyze_df(df)
+        counts = errors.counts()
+        self.assertEqual(counts['correct'], count_df(df).total[0])
+        self.assertEqual(errors.confusion[:-1].sum(), len(errors.gold_spans))
+        self.assertEqual(errors.confusion[-1].sum(), counts['spurious'])
+
+
+class TestSchemes(TestCase):
+
+    @staticmethod
+    def _spans(tags, scheme):
+        df = pd.DataFrame({'chunktag': tags, 'guesstag': tags})
+        spans, _, tagset = df2spans(df, scheme=scheme)
+        return [(s, e, tagset.types[t]) for s, e, t in spans.tolist()]
+
+    def test_bio(self):
+        tags = ['O', 'I-NP', 'I-NP', 'B-VP', 'I-NP']
+        self.assertEqual(self._spans(tags, 'bio'),
+                         [(1, 3, 'NP'), (3, 4, 'VP'), (4, 5, 'NP')])
+        with self.assertRaises(ValueError):
+            self._spans(tags, Scheme('bio', strict=True))
+        self.assertEqual(self._spans(['B-NP', 'I-NP', 'O'],
+                                     Scheme('iob2', strict=True)),
+                         [(0, 2, 'NP')])
+
+    def test_iob1(self):
+        tags = ['I-NP', 'I-NP', 'B-NP', 'O', 'I-VP']
+        expected = [(0, 2, 'NP'), (2, 3, 'NP'), (4, 5, 'VP')]
+        self.assertEqual(self._spans(tags, Scheme('iob1', strict=True)),
+                         expected)
+        with self.assertRaises(ValueError):
+            self._spans(['O', 'B-NP'], Scheme('iob1', strict=True))
+
+    def test_bioes(self):
+        tags = ['B-NP', 'E-NP', 'S-VP', 'O', 'B-PP', 'I-PP', 'E-PP']
+        expected = [(0, 2, 'NP'), (2, 3, 'VP'), (4, 7, 'PP')]
+        self.assertEqual(self._spans(tags, Scheme('beiso', strict=True)),
+                         expected)
+        bilou = [t.replace('E-', 'L-').replace('S-', 'U-') for t in tags]
+        self.assertEqual(self._spans(bilou, Scheme('bilou', strict=True)),
+                         expected)
+        for tags in (['B-NP', 'O'], ['B-NP'], ['E-NP'], ['B-NP', 'E-VP']):
+            with self.assertRaises(ValueError):
+                self._spans(tags, Scheme('bioes', strict=True))
+        self.assertEqual(self._spans(['B-NP', 'O', 'I-NP'], 'bioes'),
+                         [(0, 1, 'NP'), (2, 3, 'NP')])
+        with self.assertRaises(ValueError):
+            Scheme('xyz')
+
+    def test_stream_equals_df(self):
+        tags = ['B-NP', 'I-NP', 'B-VP', 'I-VP', 'E-NP', 'S-VP', 'L-NP',
+                'U-VP', 'O']
+        rng = np.random.RandomState(0)
+        for scheme in ('bio', 'iob1', 'bioes', 'bilou'):
+            for _ in range(10):
+                n = rng.randint(1, 100)
+                gold = list(rng.choice(tags, n))
+                guess = list(rng.choice(tags, n))
+                df = pd.DataFrame({'chunktag': gold, 'guesstag': guess})
+                lines = ['w %s %s' % x for x in zip(gold, guess)]
+                self.assertEqual(count_conll(lines, scheme=scheme),
+                                 count_df(df, scheme=scheme))
+            self.assertEqual(count_conll(lines + ['', 'w B-NP B-NP'],
+                                         scheme=scheme).total[1],
+                             count_df(df, scheme=scheme).total[1] + 1)
+
+    def test_evaluate_df_options(self):
+        df = pd.DataFrame({'chunktag': ['B-NP', 'I-NP', 'O'],
+                           'guesstag': ['B-NP', 'I-NP', 'O']})
+        self.assertEqual(evaluate_df(df, scheme='bio'), (100.0, 100.0, 100.0))
+        for kwargs in ({'n_jobs': 2}, {'vectorized': False}):
+            with self.assertRaises(ValueError):
+                evaluate_df(df, scheme='bio', **kwargs)
+
+    def test_bio_equals_conlleval(self):
+        tags = ['B-NP', 'I-NP', 'B-VP', 'I-VP', 'O']
+        rng = np.random.RandomState(1)
+        for _ in range(50):
+            n = rng.randint(1, 60)
+            pairs = zip(rng.choice(tags, n), rng.choice(tags, n))
+            lines = ['w %s %s' % x for x in pairs]
+            lines.insert(n // 2, '')
+            counts = conlleval.count_conlleval(lines)
+            self.assertEqual(count_conll(lines, scheme='bio'), counts)
+
+    def test_strict_file(self):
+        with self.assertRaises(ValueError):
+            count_conll(['a B-NP B-NP', 'b E-NP B-NP'],
+                        scheme=Scheme('bioes', strict=True))
+        counts = count_conll(['a B-NP B-NP', 'b E-NP E-NP', '', 'c S-X S-X'],
+                             scheme=Scheme('bioes', strict=True))
+        self.assertEqual(counts.total, (2, 2, 2))
+
+
+class TestRuns(TestCase):
+
+    def setUp(self):
+        self.counts = []
+        for seed in range(6):
+            gold, guess = mock_corpus(200, 150, n_labels=3 + seed % 2,
+                                      seed=seed, fmt='tags')
+            self.counts.append(count_tags(gold, guess))
+        self.runs = RunCounts.from_counts(self.counts)
+
+    def test_micro(self):
+        self.assertEqual(self.runs.counts.shape, (6, 4, 3))
+        self.assertEqual(self.runs.labels, ['L0', 'L1', 'L2', 'L3'])
+        with self.assertRaises(ValueError):
+            RunCounts.from_counts([])
+        empty = RunCounts.from_counts([ChunkCounts(), ChunkCounts()])
+        self.assertEqual(empty.counts.shape, (2, 0, 3))
+        self.assertEqual(empty.micro()[0].tolist(), [0.0, 0.0])
+        f1, pr, re = self.runs.micro()
+        for i, counts in enumerate(self.counts):
+            self.assertAlmostEqual(f1[i], counts.scores(False)[0])
+            self.assertAlmostEqual(re[i], counts.scores(False)[2])
+        total = ChunkCounts()
+        for counts in self.counts:
+            total.update(counts)
+        self.assertEqual(self.runs.total(), total)
+        self.assertEqual(self.runs.results(), total.results())
+        for x, y in zip(self.runs.pooled(), total.scores(False)):
+            self.assertAlmostEqual(x, y)
+
+    def test_macro(self):
+        f1 = self.runs.macro()[0]
+        for i, counts in enumerate(self.counts):
+            res = counts.results(False)
+            scores = [v['fscore'] for k, v in res.items() if k != res.total]
+            self.assertAlmostEqual(f1[i], np.mean(scores))
+
+    def test_stats(self):
+        stats = self.runs.stats()
+        f1 = [c.scores(False)[0] for c in self.counts]
+        self.assertAlmostEqual(stats['fscore']['mean'], np.mean(f1))
+        self.assertAlmostEqual(stats['fscore']['std'], np.std(f1))
+        self.assertAlmostEqual(stats['fscore']['min'], min(f1))
+        self.assertEqual(set(stats), {'fscore', 'precision', 'recall'})
+        self.assertAlmostEqual(self.runs.stats('macro', ddof=1)['recall']
+                               ['std'], np.std(self.runs.macro()[2], ddof=1))
+        with self.assertRaises(ValueError):
+            self.runs.stats('weighted')
+
+
+class TestCli(TestCase):
+
+    fp = 'res/conll_sample.data'
+
+    def setUp(self):
+        self.path = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _run(self, *args):
+        out = os.path.join(self.path, 'out')
+        self.assertEqual(cli.main(list(args) + ['-o', out]), 0)
+        with open(out) as fh:
+            return fh.read()
+
+    def test_json(self):
+        with open(self.fp) as fh:
+            counts = count_conll(fh)
+        rows = json.loads(self._run(self.fp, '-t'))
+        total = [r for r in rows if r['label'] == 'Total'][0]
+        self.assertEqual((total['correct'], total['gold'], total['guess']),
+                         counts.total)
+        self.assertEqual(total['fscore'], counts.scores()[0])
+        self.assertEqual(len(rows), len(counts.results()))
+
+    def test_csv_many_files(self):
+        for i in range(3):
+            shutil.copy(self.fp, os.path.join(self.path, '%d.conll' % i))
+        pattern = os.path.join(self.path, '*.conll')
+        out = self._run(pattern, '-f', 'csv', '-j', '2', '-g', '2', '-p', '3')
+        rows = list(csv.DictReader(out.splitlines()))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[-1]['file'], cli.ALL_FILES)
+        self.assertEqual(int(rows[-1]['gold']), 3 * int(rows[0]['gold']))
+        self.assertEqual(rows[0]['fscore'], rows[-1]['fscore'])
+
+    def test_missing(self):
+        missing = os.path.join(self.path, 'missing.conll')
+        self.assertEqual(cli.main([missing, '-o', os.devnull]), 1)
+
+    def test_strict_needs_scheme(self):
+        stderr = sys.stderr
+        sys.stderr = StringIO()
+        try:
+            with self.assertRaises(SystemExit) as ctx:
+                cli.main([self.fp, '--strict'])
+        finally:
+            sys.stderr = stderr
+        self.assertEqual(ctx.exception.code, 2)
+
+
+class TestImportTime(TestCase):
+
+    heavy = ('numpy', 'pandas', 're')
+
+    def _imported(self, code):
+        res = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                             stderr=subprocess.PIPE, check=True,
+                             universal_newlines=True)
+        rows = [x.split('|') for x in res.stderr.splitlines()
+                if x.startswith('import time:') and 'cumulative' not in x]
+        return {x[2].strip(): int(x[1]) for x in rows}
+
+    def _added(self, code):
+        # modules imported at interpreter startup are not counted
+        modules = self._imported(code)
+        for name in self._imported('pass'):
+            modules.pop(name, None)
+        return modules
+
+    def test_import(self):
+        modules = self._added('import bioeval')
+        self.assertIn('bioeval', modules)
+        for name in self.heavy:
+            self.assertNotIn(name, modules)
+
+    def test_lazy_exports(self):
+        import bioeval
+        from bioeval.analysis import analyze_df
+        self.assertIs(bioeval.analyze_df, analyze_df)
+        self.assertIs(bioeval.analyze_tags, analyze_tags)
+        self.assertIs(bioeval.RunCounts, RunCounts)
+        self.assertIn('RunCounts', dir(bioeval))
+        with self.assertRaises(AttributeError):
+            bioeval.analyse_df
+
+    def test_pure_python_paths(self):
+        modules = self._added(
+            'import bioeval\n'
+            'with open("res/conll_sample.data") as fh:\n'
+            '    bioeval.count_conll(fh).results()\n'
+            'bioeval.ChunkEvaluator().update(["B-NP", "I-NP"],\n'
+            '                                ["B-NP", "O"])\n'
+            'bioeval.evaluate({((0, "B-NP"),)}, {((0, "B-NP"),)}, 1)'
+        )
+        self.assertIn('bioeval.conll', modules)
+        for name in self.heavy:
+            self.assertNotIn(name, modules)
+
+
+class TestStorage(TestCase):
+
+    fp = 'res/conll_sample.data'
+
+    def setUp(self):
+        self.path = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_save_tags(self):
+        gold, guess = mock_corpus(5000, 4000, chunk_len=3, seed=3,
+                                  fmt='tags')
+        df = pd.DataFrame({'chunktag': gold, 'guesstag': guess})
+        store = save_tags(self.path, gold, guess)
+        self.assertEqual(len(store), len(gold))
+        self.assertIsInstance(store.gold, np.memmap)
+        counts = count_df(df)
+        for block_size in (1, 7, 100, 10 ** 6):
+            self.assertEqual(store.count(block_size), counts)
+        blocks = list(store.blocks(100))
+        self.assertGreater(len(blocks), 10)
+        self.assertEqual(blocks[0][0], 0)
+        self.assertEqual(blocks[-1][1], len(gold))
+
+    def test_convert_conll(self):
+        store = convert_conll(self.fp, self.path)
+        with open(self.fp) as fh:
+            serial = count_conll(fh)
+        self.assertEqual(len(store.sentences), 89)
+        self.assertEqual(store.count(50), serial)
+        self.assertEqual(store.count(50).tag_results(),
+                         serial.tag_results())
+        self.assertEqual(TagStore(self.path).evaluate(), serial.scores())
+
+    def test_sentences(self):
+        gold = ['B-NP', 'I-NP', 'I-NP', 'O']
+        store = save_tags(self.path, gold, gold, sentences=[0, 2])
+        self.assertEqual(store.count(1).total, (2, 2, 2))
+
+    def test_invalid_first(self):
+        store = save_tags(self.path, ['I-NP', 'O'], ['B-NP', 'O'])
+        with self.assertRaises(ValueError):
+            store.count()
+
+
+class TestCache(TestCase):
+
+    def setUp(self):
+        self.path = mkdtemp()
+        gold, guess = mock_corpus(5000, 4000, chunk_len=3, seed=5,
+                                  fmt='tags')
+        self.df = pd.DataFrame({'chunktag': gold, 'guesstag': guess})
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_warm_index(self):
+        cache = GoldCache(self.path)
+        gold = self.df.chunktag.values
+        for scheme in (None, 'bio', Scheme('bio', strict=False)):
+            counts = count_df(self.df, scheme=scheme)
+            cold = cache.index(gold, scheme)
+            warm = cache.index(list(gold), scheme)
+            self.assertIsInstance(warm.spans, np.memmap)
+            self.assertEqual(cold.count(self.df.guesstag.values), counts)
+            self.assertEqual(warm.count(self.df.guesstag.values), counts)
+        # keyed by the tags and the scheme options
+        self.assertEqual(len(cache), 2)
+        self.assertIn(gold_key(gold, 'iob2'), cache)
+        self.assertNotEqual(gold_key(gold), gold_key(gold[::-1]))
+
+    def test_home_path(self):
+        home = os.environ.get('HOME')
+        os.environ['HOME'] = self.path
+        try:
+            cache = GoldCache('~/.cache/bioeval')
+        finally:
+            if home is None:
+                del os.environ['HOME']
+            else:
+                os.environ['HOME'] = home
+        self.assertEqual(cache.path,
+                         os.path.join(self.path, '.cache', 'bioeval'))
+        self.assertTrue(os.path.isdir(cache.path))
+        self.assertFalse(os.path.exists('~'))
+        cache.index(self.df.chunktag.values)
+        self.assertEqual(len(cache), 1)
+
+    def test_evaluate_df(self):
+        res = evaluate_df(self.df, do_round=False)
+        self.assertEqual(evaluate_df(self.df, do_round=False,
+                                     cache=self.path), res)
+        self.assertEqual(evaluate_df(self.df, do_round=False,
+                                     cache=self.path), res)
+        self.assertEqual(len(GoldCache(self.path)), 1)
+        for kwargs in ({'n_jobs': 2}, {'vectorized': False}):
+            with self.assertRaises(ValueError):
+                evaluate_df(self.df, cache=self.path, **kwargs)
+
+    def test_eviction(self):
+        cache = GoldCache(self.path)
+        gold = self.df.chunktag.values
+        keys = [gold_key(gold[:len(gold) - i]) for i in range(3)]
+        for i in range(3):
+            cache.index(gold[:len(gold) - i])
+        self.assertEqual(cache.keys(), keys)
+        # a hit makes an entry the most recently used
+        cache.index(gold)
+        self.assertEqual(cache.keys(), keys[1:] + keys[:1])
+        cache.max_bytes = cache.size() - 1
+        self.assertEqual(cache.evict(), keys[1:2])
+        cache.max_bytes = 0
+        cache.index(gold[:100])
+        self.assertEqual(cache.keys(), [gold_key(gold[:100])])
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+class TestService(TestCase):
+
+    def setUp(self):
+        gold, guess = mock_corpus(3000, 2400, seed=4, fmt='tags')
+        cuts = np.arange(7, len(gold), 11)
+        self.gold = [list(x) for x in np.split(np.asarray(gold), cuts)]
+        self.guess = [list(x) for x in np.split(np.asarray(guess), cuts)]
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_count_batch(self):
+        counts = count_batch(self.gold, self.guess)
+        for gold, guess, c in zip(self.gold, self.guess, counts):
+            ev = ChunkEvaluator()
+            ev.update(gold, guess)
+            self.assertEqual(c, ev.counts)
+            self.assertEqual(c.tag_total, ev.counts.tag_total)
+        scheme = Scheme('bio')
+        gold, guess = ['I-NP', 'I-NP', 'B-VP'], ['B-NP', 'I-NP', 'I-VP']
+        c, = count_batch([gold], [guess], scheme)
+        self.assertEqual(c.total, (2, 2, 2))
+        with self.assertRaises(ValueError):
+            count_batch([gold], [guess[:2]])
+
+    def test_local(self):
+        ev = ChunkEvaluator()
+        ev.update(self.gold, self.guess)
+
+        async def main():
+            async with EvalService(max_batch=64,
+                                   window_size=20) as service:
+                client = LocalClient(service)
+                res = await asyncio.gather(*[
+                    client.score('s%d' % (i % 2), g, p)
+                    for i, (g, p) in enumerate(zip(self.gold, self.guess))
+                ])
+                self.assertEqual(await client.counts(), ev.counts)
+                self.assertEqual(sum(res, ChunkCounts()), ev.counts)
+                self.assertEqual(
+                    (await client.counts('s0')) + service.counts('s1'),
+                    ev.counts)
+                metrics = await client.metrics()
+                self.assertGreaterEqual(metrics['batches'],
+                                        len(self.gold) // 64)
+                self.assertLess(metrics['batches'], len(self.gold))
+                self.assertEqual(metrics['sentences'], len(self.gold))
+                self.assertEqual(metrics['streams']['s0']['sentences'],
+                                 (len(self.gold) + 1) // 2)
+                window = metrics['streams']['s1']['window']
+                self.assertEqual(window['sentences'], 20)
+            self.assertEqual(service.health()['status'], 'stopped')
+
+        self.run_async(main())
+
+    def test_bad_sentence(self):
+
+        async def main():
+            async with EvalService(Scheme('bio', strict=True)) as service:
+                client = LocalClient(service)
+                res = await asyncio.gather(
+                    client.score('a', ['B-NP', 'I-NP'], ['B-NP', 'I-NP']),
+                    client.score('a', ['B-NP', 'I-NP'], ['O', 'I-NP']),
+                    client.score('a', ['O'], ['O']),
+                    return_exceptions=True
+                )
+                self.assertIsInstance(res[1], ValueError)
+                self.assertEqual(service.errors, 1)
+                self.assertEqual(service.counts('a').total, (1, 1, 1))
+                with self.assertRaises(ValueError):
+                    await client.score('a', ['O'], [])
+
+        self.run_async(main())
+
+    def test_bad_request(self):
+
+        async def main():
+            async with EvalServer(EvalService(), port=0) as server:
+                reader, writer = await asyncio.open_connection(
+                    '127.0.0.1', server.port)
+                writer.write(b'{"id": 1, "op": "score", "stream": [1], '
+                             b'"gold": ["O"], "guess": ["O"]}\n')
+                res = json.loads((await reader.readline()).decode())
+                writer.close()
+                self.assertEqual(res['id'], 1)
+                self.assertIn('error', res)
+                service = server.service
+                # a failing item does not stop the batching loop
+                future = asyncio.Future()
+                service._queue.put_nowait(([1], ['O'], ['O'], future))
+                with self.assertRaises(TypeError):
+                    await future
+                self.assertTrue(service.running)
+                async with EvalClient(port=server.port) as client:
+                    counts = await client.score('a', ['B-NP'], ['B-NP'])
+                    self.assertEqual(counts.total, (1, 1, 1))
+                    self.assertEqual((await client.health())['status'], 'ok')
+                self.assertEqual(service.errors, 1)
+
+        self.run_async(main())
+
+    def test_long_line(self):
+        import bioeval.service
+
+        async def main():
+            async with EvalServer(EvalService(), port=0) as server:
+                reader, writer = await asyncio.open_connection(
+                    '127.0.0.1', server.port)
+                writer.write(b'{"op": "health"}\n' + b' ' * 4096 + b'\n')
+                ok = json.loads((await reader.readline()).decode())
+                res = json.loads((await reader.readline()).decode())
+                self.assertEqual(await reader.read(), b'')
+                writer.close()
+                self.assertEqual(ok['result']['status'], 'ok')
+                self.assertIsNone(res['id'])
+                self.assertIn('error', res)
+
+        limit = bioeval.service.LINE_LIMIT
+        bioeval.service.LINE_LIMIT = 1024
+        try:
+            self.run_async(main())
+        finally:
+            bioeval.service.LINE_LIMIT = limit
+
+    def test_malformed_response(self):
+
+        async def reply(reader, writer):
+            await reader.readline()
+            writer.write(b'not json\n')
+            await writer.drain()
+            await reader.read()
+            writer.close()
+
+        async def main():
+            server = await asyncio.start_server(reply, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                async with EvalClient(port=port) as client:
+                    with self.assertRaises(ValueError):
+                        await asyncio.wait_for(client.health(), 5)
+                    with self.assertRaises(ConnectionError):
+                        await client.health()
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        self.run_async(main())
+
+    def test_server(self):
+        ev = ChunkEvaluator()
+        ev.update(self.gold, self.guess)
+
+        async def main():
+            async with EvalServer(EvalService(), port=0) as server:
+                async with EvalClient(port=server.port) as client:
+                    await asyncio.gather(*[
+                        client.score('tcp', g, p)
+                        for g, p in zip(self.gold, self.guess)
+                    ])
+                    self.assertEqual(await client.counts('tcp'), ev.counts)
+                    self.assertEqual((await client.health())['status'], 'ok')
+                    metrics = await client.metrics()
+                    self.assertEqual(metrics['streams']['tcp']['fscore'],
+                                     ev.result()[0])
+                    with self.assertRaises(ValueError):
+                        await client.score('tcp', ['O'], [])
+                reader, writer = await asyncio.open_connection(
+                    '127.0.0.1', server.port)
+                writer.write(b'GET /metrics HTTP/1.0\r\n\r\n')
+                head, body = (await reader.read()).split(b'\r\n\r\n')
+                writer.close()
+                self.assertTrue(head.startswith(b'HTTP/1.0 200 OK'))
+                self.assertEqual(json.loads(body.decode())['sentences'],
+                                 len(self.gold))
+
+        self.run_async(main())
+
+
+class TestProfiling(TestCase):
+
+    def setUp(self):
+        self.df = mock_corpus(300, 250, seed=6, fmt='df')
+
+    def test_disabled(self):
+        self.assertIs(stage('a'), stage('b', tokens=1))
+        with stage('a') as st:
+            st.update(tokens=1)
+
+    def test_stages(self):
+        forwarded = []
+        with Profile(hook=forwarded.append) as prof:
+            evaluate_df(self.df, vectorized=False)
+            evaluate_df(self.df)
+            with open('res/conll_sample.data') as fh:
+                count_conll(fh)
+        self.assertEqual(prof.records, forwarded)
+        stages = [r['stage'] for r in prof.records]
+        self.assertEqual(stages, ['df2chunkset', 'flatten', 'filter_outside',
+                                  'get_ncor', 'encode', 'spans', 'match',
+                                  'count', 'count_conll'])
+        summary = prof.summary()
+        self.assertEqual(summary['get_ncor']['tokens'], len(self.df))
+        self.assertEqual(summary['count_conll']['tokens'], 2575)
+        self.assertGreater(summary['spans']['tokens_per_second'], 0)
+        self.assertNotIn('peak_memory', summary['match'])
+        self.assertGreater(prof.seconds, summary['df2chunkset']['seconds'])
+        # hooks are removed on exit
+        self.assertIs(stage('a'), stage('b'))
+        buf = StringIO()
+        prof.write(buf)
+        lines = buf.getvalue().splitlines()
+        self.assertEqual(json.loads(lines[3])['stage'], 'get_ncor')
+
+    def test_memory(self):
+        with Profile(memory=True) as prof:
+            with stage('outer'):
+                with stage('inner', tokens=10 ** 5):
+                    x = np.ones(10 ** 5)
+                del x
+            with self.assertRaises(ValueError):
+                with stage('bad'):
+                    raise ValueError()
+        inner, outer, bad = prof.records
+        self.assertEqual((inner['depth'], outer['depth']), (1, 0))
+        self.assertGreaterEqual(inner['peak_memory'], 8 * 10 ** 5)
+        self.assertGreaterEqual(outer['peak_memory'], inner['peak_memory'])
+        self.assertEqual(bad['error'], 'ValueError')
+
+
+class TestGroups(TestCase):
+
+    fp = 'res/conll_sample.data'
+
+    def setUp(self):
+        rows = []
+        sent = 0
+        with open(self.fp) as fh:
+            for line in fh:
+                row = line.split()
+                if not row:
+                    sent += 1
+                    continue
+                rows.append((sent // 10, sent % 10, row[-2], row[-1]))
+        self.df = pd.DataFrame(rows, columns=['doc', 'sent', 'chunktag',
+                                              'guesstag'])
+
+    def test_count_groups(self):
+        counts, groups = count_groups(self.df, groupcols=['doc', 'sent'])
+        with open(self.fp) as fh:
+            self.assertEqual(counts, count_conll(fh))
+        with open(self.fp) as fh:
+            sents = conll_sentence_counts(fh)
+        docs, sents_ = groups['doc'], groups['sent']
+        np.testing.assert_array_equal(sents_.counts, sents)
+        self.assertEqual(len(docs), 9)
+        self.assertEqual(docs.labels.tolist(), list(range(9)))
+        self.assertEqual(sents_.labels.tolist()[:12],
+                         list(range(10)) + [0, 1])
+        np.testing.assert_array_equal(
+            docs.counts, np.add.reduceat(sents, np.arange(0, len(sents), 10)))
+        self.assertEqual(docs.total, counts.total)
+        self.assertEqual(count_df(self.df, groupcols='sent'), counts)
+        self.assertEqual(evaluate_df(self.df, groupcols=['doc', 'sent']),
+                         counts.scores())
+
+    def test_sentence_start(self):
+        df = pd.DataFrame({
+            'sentence': [0, 0, 1, 1],
+            'chunktag': ['B-NP', 'I-NP', 'I-NP', 'I-NP'],
+            'guesstag': ['B-NP', 'I-NP', 'B-NP', 'I-NP']
+        })
+        # the I-NP chunk of the second sentence is not merged into the first
+        counts, groups = count_groups(df)
+        self.assertEqual(counts.total, (1, 2, 2))
+        self.assertEqual(groups['sentence'].counts.tolist(),
+                         [[1, 1, 1], [0, 1, 1]])
+        sents = [(['B-NP', 'I-NP'], ['B-NP', 'I-NP']),
+                 (['I-NP', 'I-NP'], ['B-NP', 'I-NP'])]
+        np.testing.assert_array_equal(groups['sentence'].counts,
+                                      sentence_counts(sents))
+        # with a scheme the repaired I-NP chunk equals the B-NP chunk
+        self.assertEqual(count_df(df, groupcols='sentence',
+                                  scheme='bio').total, (2, 2, 2))
+        # without the sentence ids the gold chunk spans both sentences
+        self.assertEqual(count_df(df).total, (0, 1, 2))
+
+    def test_worst(self):
+        _, groups = count_groups(self.df, groupcols=['doc', 'sent'])
+        sents = groups['sent']
+        f1 = sents.scores()[0]
+        worst = sents.worst(5)
+        self.assertEqual(len(worst), 5)
+        self.assertTrue((np.diff(f1[worst]) >= 0).all())
+        self.assertEqual(f1[worst[0]], f1[sents.counts[:, 1:].sum(1) > 0]
+                         .min())
+        tbl = groups['doc'].to_frame()
+        self.assertEqual(list(tbl.columns), ['group', 'correct', 'gold',
+                                             'guess', 'precision', 'recall',
+                                             'fscore'])
+        self.assertEqual(len(tbl), 9)
+
+
+class TestCompactResults(TestCase):
+
+    fp = 'res/conll_sample.data'
+
+    def setUp(self):
+        with open(self.fp) as fh:
+            self.counts = count_conll(fh)
+        self.res = self.counts.compact_results()
+
+    def test_reads(self):
+        res, expected = self.res, self.counts.results()
+        self.assertEqual(res.to_dict(), expected)
+        self.assertEqual(res['NP'], expected['NP'])
+        self.assertEqual(res[res.total], expected[expected.total])
+        self.assertEqual(list(res.keys()), list(expected.keys()))
+        self.assertEqual(dict(res.items()), expected)
+        self.assertEqual(len(res), len(expected))
+        self.assertIn('MV', res)
+        self.assertNotIn('XX', res)
+        self.assertIsNone(res.get('XX'))
+        with self.assertRaises(KeyError):
+            res['XX']
+        self.assertEqual(str(res), str(expected))
+        self.assertEqual(res.counts.dtype.names, ('correct', 'gold', 'guess'))
+        self.assertEqual(res.to_counts(), self.counts)
+        unrounded = self.counts.compact_results(do_round=False)
+        self.assertEqual(unrounded[unrounded.total]['fscore'],
+                         self.counts.scores(False)[0])
+
+    def test_merge(self):
+        other = CompactResults(['NP', 'ZZ', 'AP'], [[1, 2, 3], [4, 5, 6],
+                                                    [0, 1, 0]])
+        self.assertEqual(other.keys(), ['AP', 'NP', 'ZZ', 'Total'])
+        merged = self.res + other
+        self.assertEqual(merged.to_counts(), self.counts + other.to_counts())
+        self.assertEqual(merge_results([self.res, other, self.res]),
+                         merged + self.res)
+        self.assertEqual(sum([self.res, self.res]).totals(),
+                         tuple(2 * x for x in self.counts.total))
+        labels = np.array(['a', 'b'])
+        runs = [CompactResults(labels, [[i, 2 * i, 3 * i], [1, 1, 1]])
+                for i in range(10)]
+        self.assertIs(runs[0].labels, runs[1].labels)
+        self.assertEqual(merge_results(runs).counts.tolist(),
+                         [(45, 90, 135), (10, 10, 10)])
+
+    def test_serialization(self):
+        res = self.res
+        self.assertEqual(CompactResults.from_json(res.to_json()), res)
+        self.assertEqual(json.loads(res.to_json())['Total']['gold'],
+                         self.counts.total[1])
+        buf = StringIO()
+        res.to_csv(buf)
+        rows = list(csv.DictReader(StringIO(buf.getvalue())))
+        self.assertEqual(rows[-1]['label'], 'Total')
+        self.assertEqual(float(rows[0]['fscore']), res['AP']['fscore'])
+        with open(self.fp) as fh:
+            counts = conlleval.count_conlleval(fh)
+        self.assertEqual(res.to_latex(), conlleval.report(counts, True))
+
+
 class TestBIOEvalSpecial(TestCase):
 
     # make sure it runs from project root directory
@@ -250,6 +1493,17 @@ class TestBIOEvalSpecial(TestCase):
         :param fp: file path
         :return: f1-score, precision, recall
         """
+        res = TestBIOEvalSpecial._conll_eval_table(fp)
+        return res['Total']['fscore'], res['Total']['precision'], \
+            res['Total']['recall']
+
+    @staticmethod
+    def _conll_eval_table(fp):
+        """Evaluates a conll-style data file using the conll-2000 perl script.
+
+        :param fp: file path
+        :return: results by chunk type
+        """
 
         cwd = '.'
         try:
@@ -277,8 +1531,55 @@ class TestBIOEvalSpecial(TestCase):
         res = AccuracyResults()
         res.parse_conll_eval_table(fpres)
         os.remove(fpres)
-        return res['Total']['fscore'], res['Total']['precision'], \
-            res['Total']['recall']
+        return res
+
+    @staticmethod
+    def _conll_eval_output(fp, opts=''):
+        """Runs the conll-2000 perl script and returns its output.
+
+        :param fp: file path
+        :param opts: command line options
+        :return: script output
+        """
+        fpres = 'tmp/results.%s' % random_str()
+        try:
+            os.mkdir('tmp')
+        except OSError:
+            pass
+        with open(fpres, 'w') as fh_out:
+            check_call(cmd('perl prl/conll_eval.pl %s < {}' % opts, fp,
+                           cwd='.', stdout=fh_out))
+        with open(fpres) as fh:
+            out = fh.read()
+        os.remove(fpres)
+        return out
+
+    def test_conlleval_against_conll2(self):
+
+        fp = 'res/conll_sample.data'
+
+        for latex in (False, True):
+            with open(fp) as fh:
+                out = conlleval.report(conlleval.count_conlleval(fh), latex)
+            self.assertEqual(out, self._conll_eval_output(
+                fp, '-l' if latex else ''))
+
+    def test_conlleval_raw_against_conll2(self):
+
+        fp = 'tmp/raw.%s' % random_str()
+        try:
+            os.mkdir('tmp')
+        except OSError:
+            pass
+        with open('res/conll_sample.data') as fh, open(fp, 'w') as out:
+            for line in fh:
+                out.write(re.sub(r'\b[BI]-', '', line))
+
+        with open(fp) as fh:
+            counts = conlleval.count_conlleval(fh, raw=True)
+        out = self._conll_eval_output(fp, '-r')
+        os.remove(fp)
+        self.assertEqual(conlleval.report(counts), out)
 
     @staticmethod
     def _ssv2set(ssv):
@@ -331,3 +1632,20 @@ class TestBIOEvalSpecial(TestCase):
         self.assertEqual(f1, f1_conll)
         self.assertEqual(pre, pre_conll)
         self.assertEqual(rec, rec_conll)
+
+        self.assertEqual(evaluate_df(df, vectorized=False), (f1, pre, rec))
+
+    def test_conll_stream_against_conll2(self):
+
+        fp = 'res/conll_sample.data'
+
+        self.assertEqual(evaluate_conll(fp), self._conll_eval(fp))
+
+    def test_labels_against_conll2(self):
+
+        fp = 'res/conll_sample.data'
+
+        with open(fp) as fh:
+            res = count_conll(fh).results()
+
+        self.assertEqual(res, self._conll_eval_table(fp))